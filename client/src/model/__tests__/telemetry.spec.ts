@@ -0,0 +1,29 @@
+import { describe, expect, it } from 'vitest'
+import { decodeTelemetry, TELEMETRY_RECORD_SIZE } from '../telemetry'
+// packed by the server's outboundService.pack; server/tests/test_outboundService.py checks it still packs the same
+import fixture from './telemetry-frame.json'
+
+function fromHex(hex: string): ArrayBuffer {
+  const bytes = new Uint8Array(hex.length / 2)
+  for (let i = 0; i < bytes.length; i++) {
+    bytes[i] = parseInt(hex.slice(i * 2, i * 2 + 2), 16)
+  }
+  return bytes.buffer
+}
+
+describe('decodeTelemetry', () => {
+  it('turns a server frame back into the JSON events it replaced', () => {
+    const frame = fromHex(fixture.hex)
+    expect(frame.byteLength).toBe(1 + 7 * TELEMETRY_RECORD_SIZE) // temp_update packs as two records
+    expect(decodeTelemetry(frame)).toEqual(fixture.frames)
+  })
+
+  it('ignores frames of another version and trailing partial records', () => {
+    const frame = new Uint8Array(fromHex(fixture.hex))
+    expect(decodeTelemetry(frame.slice(0, 1 + TELEMETRY_RECORD_SIZE + 5).buffer)).toEqual([
+      fixture.frames[0]
+    ])
+    frame[0] = 2
+    expect(decodeTelemetry(frame.buffer)).toEqual([])
+  })
+})
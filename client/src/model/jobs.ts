@@ -280,6 +280,25 @@ export function useAddJobToQueue() {
   }
 }
 
+export function useBatchQueue() {
+  return {
+    async batchQueue(job: FormData) {
+      try {
+        const response = await api('batchqueue', job)
+        if (response) {
+          return response
+        } else {
+          console.error('Response is undefined or null')
+          return { success: false, message: 'Response is undefined or null.' }
+        }
+      } catch (error) {
+        console.error(error)
+        toast.error('An error occurred while adding the jobs to the queue')
+      }
+    }
+  }
+}
+
 export function useAutoQueue() {
   return {
     async auto(job: FormData) {
@@ -4,6 +4,7 @@ import * as myFetch from './myFetch'
 import { toast } from './toast'
 import { type Job } from './jobs'
 import { socket } from './myFetch'
+import { applyStateDelta } from './sockets'
 
 export function api(action: string, body?: unknown, method?: string, headers?: any) {
   headers = headers ?? {}
@@ -82,13 +83,42 @@ export function useRetrievePrinters() {
   }
 }
 
-// gets the printers that have threads information from the server
+// state version of the printers we hold, and the etag of the snapshot it came from
+let stateVersion: number | null = null
+let stateEtag: string | null = null
+
+// the /getprinterinfo snapshot, or the printers we already hold when it hasn't changed (304)
+async function fetchPrinterSnapshot() {
+  const headers: Record<string, string> = stateEtag ? { 'If-None-Match': stateEtag } : {}
+  const response = await fetch(`${myFetch.API_ROOT.value}/getprinterinfo`, { headers })
+  if (response.status === 304) {
+    return printers.value
+  }
+  if (!response.ok) {
+    throw await response.json()
+  }
+  stateEtag = response.headers.get('ETag')
+  stateVersion = Number(response.headers.get('X-State-Version'))
+  return await response.json()
+}
+
+// gets the printers that have threads information from the server. once we hold a snapshot, only the changes
+// since its version are fetched and applied; a full snapshot is fetched when they can't be (410, printers changed)
 export function useRetrievePrintersInfo() {
   return {
     async retrieveInfo() {
       try {
-        const response = await api('getprinterinfo')
-        return response // return the response directly
+        if (stateVersion !== null && printers.value.length > 0) {
+          const response = await fetch(`${myFetch.API_ROOT.value}/statedeltas?since=${stateVersion}`)
+          if (response.ok) {
+            const data = await response.json()
+            if (data.deltas.every((delta: any) => applyStateDelta(printers, delta))) {
+              stateVersion = data.version
+              return printers.value
+            }
+          }
+        }
+        return await fetchPrinterSnapshot()
       } catch (error) {
         console.error(error)
       }
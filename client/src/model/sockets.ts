@@ -1,6 +1,56 @@
 import { socket } from './myFetch'
 import type { Device } from './ports'
 import { jobTime } from './jobs'
+import { decodeTelemetry } from './telemetry'
+
+// the server only sends events to rooms a client has subscribed to: { farm: true } for the farm summary,
+// { printers: 'all' | [ids] } for printer and job events, { jobs: [ids] } for single jobs.
+// rooms are dropped on disconnect, so subscribe again whenever the socket reconnects
+// binary: true asks for telemetry as packed 'telemetry' frames, unpacked by setupTelemetrySocket
+export type Rooms = { farm?: boolean; printers?: 'all' | number[]; jobs?: number[]; binary?: boolean }
+
+let subscribed: Rooms = {}
+let resubscribing = false
+
+// replaces the current subscription: rooms the new one doesn't include are left, so each view only gets the
+// events of what it shows
+export function subscribeRooms(rooms: Rooms) {
+  if (!resubscribing) {
+    socket.value.on('connect', () => socket.value.emit('subscribe', subscribed))
+    resubscribing = true
+  }
+  const previous = subscribed
+  subscribed = rooms
+  if (!socket.value.connected) {
+    return
+  }
+  const leaving: Rooms = {
+    farm: previous.farm && !rooms.farm,
+    printers: previous.printers === 'all'
+      ? (rooms.printers === 'all' ? [] : 'all')
+      : (previous.printers ?? []).filter(id => rooms.printers === 'all' || !rooms.printers?.includes(id)),
+    jobs: (previous.jobs ?? []).filter(id => !rooms.jobs?.includes(id)),
+  }
+  if (leaving.farm || leaving.printers?.length || leaving.jobs?.length) {
+    socket.value.emit('unsubscribe', leaving)
+  }
+  socket.value.emit('subscribe', rooms)
+}
+
+function dispatch(event: string, data: any) {
+  for (const listener of socket.value.listeners(event)) {
+    listener(data)
+  }
+}
+
+// each record of a packed 'telemetry' frame is handed to the listeners of the JSON event it replaces
+export function setupTelemetrySocket() {
+  socket.value.on('telemetry', (frame: ArrayBuffer) => {
+    for (const [event, data] of decodeTelemetry(frame)) {
+      dispatch(event, data)
+    }
+  })
+}
 
 // *** PORTS ***
 export function setupTempSocket(printers: any) {
@@ -27,12 +77,55 @@ export function setupStatusSocket(printers: any) {
   })
 }
 
+// queue changes arrive as deltas: the jobs that are new to this printer's queue plus the full order of job ids
+export function applyQueueDelta(printers: any, delta: any) {
+  const printer = printers.value.find((p: Device) => p.id === delta.printerid)
+  if (printer) {
+    const jobs = new Map((printer.queue ?? []).map((job: any) => [job.id, job]))
+    for (const job of delta.added) {
+      jobs.set(job.id, job)
+    }
+    printer.queue = delta.order.map((id: number) => jobs.get(id)).filter((job: any) => job)
+  }
+}
+
+// one entry of /statedeltas. returns false for a change the client can't apply (printers added, removed or reset),
+// which needs a new snapshot
+export function applyStateDelta(printers: any, delta: any) {
+  if (delta.op === 'queue') {
+    applyQueueDelta(printers, delta)
+  } else if (delta.op === 'printer') {
+    const printer = printers.value.find((p: Device) => p.id === delta.printerid)
+    if (printer) {
+      Object.assign(printer, delta.fields)
+    }
+  } else if (delta.op === 'job') {
+    const job = printers.value
+      .flatMap((printer: { queue: any }) => printer.queue ?? [])
+      .find((job: { id: any }) => job?.id === delta.jobid)
+    if (job) {
+      Object.assign(job, delta.fields)
+    }
+  } else {
+    return false
+  }
+  return true
+}
+
 export function setupQueueSocket(printers: any) {
-  socket.value.on('queue_update', (data: any) => {
+  socket.value.on('queue_delta', (data: any) => {
     if (printers) {
-      const printer = printers.value.find((p: Device) => p.id === data.printerid)
-      if (printer) {
-        printer.queue = data.queue
+      applyQueueDelta(printers, data)
+    } else {
+      console.error('printers or printers.value is undefined')
+    }
+  })
+
+  // jobs moved off a faulted printer: one event carries the delta for every queue that changed
+  socket.value.on('queue_failover', (data: any) => {
+    if (printers) {
+      for (const delta of data.deltas) {
+        applyQueueDelta(printers, delta)
       }
     } else {
       console.error('printers or printers.value is undefined')
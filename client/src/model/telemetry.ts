@@ -0,0 +1,39 @@
+// packed telemetry: a version byte, then 13-byte records of (code uint8, job/printer id uint32, value float64),
+// little endian. kept free of the socket so the format can be checked against what the server packs
+export const TELEMETRY_FRAME_VERSION = 1
+export const TELEMETRY_RECORD_SIZE = 13
+const TELEMETRY_EVENTS: Record<number, [string, (id: number, value: number) => any]> = {
+  1: ['progress_update', (id, value) => ({ job_id: id, progress: value })],
+  2: ['gcode_viewer', (id, value) => ({ job_id: id, gcode_num: value })],
+  3: ['extruded_update', (id, value) => ({ job_id: id, extruded: value })],
+  4: ['current_layer_height', (id, value) => ({ job_id: id, current_layer_height: value })],
+  5: ['max_layer_height', (id, value) => ({ job_id: id, max_layer_height: value })]
+}
+
+// the JSON events a frame replaces, as [event, data] in record order, with the temp_updates last
+export function decodeTelemetry(frame: ArrayBuffer): [string, any][] {
+  const view = new DataView(frame)
+  if (view.getUint8(0) !== TELEMETRY_FRAME_VERSION) {
+    console.error('unknown telemetry frame version', view.getUint8(0))
+    return []
+  }
+  const events: [string, any][] = []
+  const temps = new Map<number, any>() // extruder (6) and bed (7) records are merged back into one temp_update
+  for (let offset = 1; offset + TELEMETRY_RECORD_SIZE <= view.byteLength; offset += TELEMETRY_RECORD_SIZE) {
+    const code = view.getUint8(offset)
+    const id = view.getUint32(offset + 1, true)
+    const value = view.getFloat64(offset + 5, true)
+    if (code === 6 || code === 7) {
+      const temp = temps.get(id) ?? { printerid: id }
+      temp[code === 6 ? 'extruder_temp' : 'bed_temp'] = value
+      temps.set(id, temp)
+    } else if (TELEMETRY_EVENTS[code]) {
+      const [event, build] = TELEMETRY_EVENTS[code]
+      events.push([event, build(id, value)])
+    }
+  }
+  for (const temp of temps.values()) {
+    events.push(['temp_update', temp])
+  }
+  return events
+}
@@ -14,7 +14,13 @@ build_client() {
 run_prod() {
     echo "Starting the production server..."
     cd server
-    gunicorn --bind="$IP:$PORT" --worker-class eventlet -w 1 app:app
+    WORKERS=1
+    if grep -q '"printerDaemon": *true' config/config.json; then
+        # printers run in their own process, so the API can run several workers
+        python printerdaemon.py &
+        WORKERS=${API_WORKERS:-4}
+    fi
+    gunicorn --bind="$IP:$PORT" --worker-class eventlet -w $WORKERS app:app
 }
 
 # Build the client
@@ -0,0 +1,217 @@
+import math
+import re
+from decimal import Decimal
+
+# ArcWelder-style arc fitting: runs of short G1 moves that lie on a circle (within a tolerance) are replaced by one
+# G2/G3, so a curved perimeter costs the serial link a handful of commands instead of hundreds.
+# only plain XY moves in absolute positioning are merged; everything else (comments and layer markers, Z moves,
+# retractions, travel, feedrate changes) ends a run and is passed through untouched. the merged arc ends exactly
+# where its last segment did and extrudes exactly what the segments did together
+DEFAULT_TOLERANCE = 0.05  # mm a point or segment midpoint may sit off the fitted arc
+MIN_SEGMENTS = 3  # fewer moves than this aren't worth an arc
+MAX_SEGMENTS = 200  # keeps the fitting cost per arc bounded
+MAX_RADIUS = 1000.0  # mm; flatter runs are near-straight and stay as lines
+RATE_VARIANCE = 0.05  # extrusion per mm may differ this much between merged moves
+
+CODE = re.compile(r'([GM])\s*(\d+)')
+WORD = re.compile(r'([A-Z])\s*([-+]?\d*\.?\d+)')
+SEGMENT_WORDS = {'X', 'Y', 'E', 'F'}
+
+
+class Segment:
+    __slots__ = ('line', 'x', 'y', 'e_text', 'f_text', 'length', 'extruded')
+
+    def __init__(self, line, x, y, words, length, extruded):
+        self.line = line
+        self.x = x
+        self.y = y
+        self.e_text = words.get('E')
+        self.f_text = words.get('F')
+        self.length = length
+        self.extruded = extruded
+
+
+def number(value):
+    # shortest text for a coordinate that came from the file (at most 6 decimals there)
+    return f"{value:.6f}".rstrip('0').rstrip('.')
+
+
+def circle(a, b, c):
+    # center and radius of the circle through three points, None when they're (nearly) collinear
+    d = 2 * (a[0] * (b[1] - c[1]) + b[0] * (c[1] - a[1]) + c[0] * (a[1] - b[1]))
+    if abs(d) < 1e-9:
+        return None
+    a2, b2, c2 = a[0] ** 2 + a[1] ** 2, b[0] ** 2 + b[1] ** 2, c[0] ** 2 + c[1] ** 2
+    cx = (a2 * (b[1] - c[1]) + b2 * (c[1] - a[1]) + c2 * (a[1] - b[1])) / d
+    cy = (a2 * (c[0] - b[0]) + b2 * (a[0] - c[0]) + c2 * (b[0] - a[0])) / d
+    return (cx, cy), math.hypot(a[0] - cx, a[1] - cy)
+
+
+def fitArc(points, tolerance):
+    # (center, clockwise) when every point and every segment midpoint is within tolerance of one arc that turns
+    # the same way all along, else None
+    fitted = circle(points[0], points[len(points) // 2], points[-1])
+    if fitted is None:
+        return None
+    (cx, cy), radius = fitted
+    if radius > MAX_RADIUS:
+        return None
+    sweep = 0.0
+    direction = 0
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        for x, y in ((x1, y1), ((x0 + x1) / 2, (y0 + y1) / 2)):
+            if abs(math.hypot(x - cx, y - cy) - radius) > tolerance:
+                return None
+        turn = math.atan2((x0 - cx) * (y1 - cy) - (y0 - cy) * (x1 - cx), (x0 - cx) * (x1 - cx) + (y0 - cy) * (y1 - cy))
+        step = 1 if turn > 0 else -1
+        if turn == 0 or (direction and step != direction):
+            return None
+        direction = step
+        sweep += abs(turn)
+    if sweep >= 2 * math.pi - 1e-3:
+        return None  # a full circle would end where it starts, which G2/G3 reads differently
+    return (cx, cy), direction < 0
+
+
+class ArcFitter:
+    def __init__(self, tolerance=DEFAULT_TOLERANCE):
+        self.tolerance = tolerance
+        self.x = self.y = None  # None until a move or G92 makes the position known
+        self.e = 0.0
+        self.f = None
+        self.absolute = True
+        self.relative_e = False
+        self.run = []
+        self.run_start = None  # (x, y) the run's first segment starts from
+        self.lines_in = 0
+        self.lines_out = 0
+
+    def feed(self, line):
+        # output lines (with their newlines) for one input line; held moves come out once their run ends
+        self.lines_in += 1
+        command = line.split(';')[0].strip().upper()
+        match = CODE.match(command)
+        words = dict(WORD.findall(command[match.end():])) if match else {}
+        code = match.group(1) + str(int(match.group(2))) if match else None
+        out = []
+        if code == 'G1' and self.absolute and self.x is not None and set(words) <= SEGMENT_WORDS and ('X' in words or 'Y' in words):
+            segment = self.segment(line, words)
+            if segment is not None:
+                if not self.joins(segment):
+                    out += self.flush()
+                    self.run_start = (self.x, self.y)
+                self.run.append(segment)
+                self.f = float(segment.f_text) if segment.f_text else self.f
+                self.x, self.y = segment.x, segment.y
+                return out
+        out += self.flush()
+        self.track(code, words)
+        self.lines_out += 1
+        out.append(line if line.endswith('\n') else line + '\n')
+        return out
+
+    def segment(self, line, words):
+        # the move as a Segment, or None if it can't be part of an arc (no XY motion, retraction)
+        x = float(words.get('X', self.x))
+        y = float(words.get('Y', self.y))
+        length = math.hypot(x - self.x, y - self.y)
+        extruded = 0.0
+        if 'E' in words:
+            value = float(words['E'])
+            extruded = value if self.relative_e else value - self.e
+            if not self.relative_e:
+                self.e = value
+        if length < 1e-6 or extruded < 0:
+            return None
+        return Segment(line, x, y, words, length, extruded)
+
+    def joins(self, segment):
+        # whether the move can extend the current run
+        if not self.run or len(self.run) >= MAX_SEGMENTS:
+            return False
+        first = self.run[0]
+        if segment.f_text and (self.f is None or float(segment.f_text) != self.f):
+            return False
+        if (first.extruded > 0) != (segment.extruded > 0):
+            return False
+        if first.extruded > 0:
+            rate, first_rate = segment.extruded / segment.length, first.extruded / first.length
+            if abs(rate - first_rate) > RATE_VARIANCE * first_rate:
+                return False
+        return True
+
+    def track(self, code, words):
+        # keeps position and modes current across lines that aren't merged
+        if code in ('G0', 'G1', 'G2', 'G3'):
+            if 'F' in words:
+                self.f = float(words['F'])
+            if self.absolute:
+                self.x = float(words['X']) if 'X' in words else self.x
+                self.y = float(words['Y']) if 'Y' in words else self.y
+            elif 'X' in words or 'Y' in words:
+                self.x = self.y = None  # relative moves: we stop merging until the position is absolute again
+            if 'E' in words and not self.relative_e:
+                self.e = float(words['E'])
+        elif code == 'G28':
+            self.x = self.y = None
+        elif code == 'G90':
+            self.absolute, self.relative_e = True, False
+        elif code == 'G91':
+            self.absolute, self.relative_e = False, True
+        elif code == 'M82':
+            self.relative_e = False
+        elif code == 'M83':
+            self.relative_e = True
+        elif code == 'G92':
+            self.x = float(words['X']) if 'X' in words else self.x
+            self.y = float(words['Y']) if 'Y' in words else self.y
+            self.e = float(words['E']) if 'E' in words else self.e
+
+    def flush(self):
+        # fits the held run greedily: the longest arc from each point, or the original line where none fits
+        out = []
+        run, start = self.run, self.run_start
+        self.run = []
+        points = [start] + [(segment.x, segment.y) for segment in run]
+        i = 0
+        while i < len(run):
+            best = None
+            for j in range(i + MIN_SEGMENTS, len(run) + 1):
+                fitted = fitArc(points[i:j + 1], self.tolerance)
+                if fitted is None:
+                    break
+                best = (j, fitted)
+            if best is None:
+                out.append(run[i].line if run[i].line.endswith('\n') else run[i].line + '\n')
+                i += 1
+            else:
+                j, (center, clockwise) = best
+                out.append(self.arc(run[i:j], points[i], center, clockwise))
+                i = j
+            self.lines_out += 1
+        return out
+
+    def arc(self, segments, start, center, clockwise):
+        last = segments[-1]
+        words = [f"G{2 if clockwise else 3}", f"X{number(last.x)}", f"Y{number(last.y)}", f"I{center[0] - start[0]:.3f}", f"J{center[1] - start[1]:.3f}"]
+        if segments[0].extruded > 0:
+            if self.relative_e:
+                words.append(f"E{sum(Decimal(s.e_text) for s in segments):f}")
+            else:
+                words.append(f"E{last.e_text}")
+        if segments[0].f_text:
+            words.append(f"F{segments[0].f_text}")
+        return " ".join(words) + "\n"
+
+    def removed(self):
+        return self.lines_in - self.lines_out
+
+
+def fitFile(source, destination, tolerance=DEFAULT_TOLERANCE):
+    # writes the arc-fitted copy of a gcode file; returns how many lines it removed
+    fitter = ArcFitter(tolerance)
+    with open(source, 'r', encoding='utf-8', errors='replace') as src, open(destination, 'w', encoding='utf-8') as dst:
+        for line in src:
+            dst.writelines(fitter.feed(line))
+        dst.writelines(fitter.flush())
+    return fitter.removed()
@@ -0,0 +1,217 @@
+import re
+import struct
+import zlib
+
+from Classes import MeatPack
+
+try:
+    import heatshrink2  # C decoder; without it heatshrink blocks are decoded in Python
+except ImportError:
+    heatshrink2 = None
+
+# Prusa binary G-code (.bgcode, libbgcode format v1): a file header, then blocks of file/printer/print/slicer
+# metadata (INI text), thumbnails and G-code. each block is deflate or heatshrink compressed and G-code blocks are
+# usually MeatPack encoded as well. uploads are stored as they come; metadata is read straight from the blocks and
+# the G-code is decoded one block at a time as it's read, so the whole text never has to exist at once
+MAGIC = b"GCDE"
+FILE_HEADER = struct.Struct("<4sIH")  # magic, version, checksum type
+BLOCK_HEADER = struct.Struct("<HHI")  # type, compression, uncompressed size
+SIZE = struct.Struct("<I")  # compressed size, present when the block is compressed
+CRC32 = 1
+
+FILE_METADATA, GCODE, SLICER_METADATA, PRINTER_METADATA, PRINT_METADATA, THUMBNAIL = range(6)
+METADATA_BLOCKS = {FILE_METADATA: 'file', SLICER_METADATA: 'slicer', PRINTER_METADATA: 'printer', PRINT_METADATA: 'print'}
+NO_COMPRESSION, DEFLATE, HEATSHRINK_11_4, HEATSHRINK_12_4 = range(4)
+HEATSHRINK = {HEATSHRINK_11_4: (11, 4), HEATSHRINK_12_4: (12, 4)}
+RAW, MEATPACK, MEATPACK_COMMENTS = range(3)
+
+# a parameter letter straight after a number, where the decoder puts back the space no-spaces MeatPack dropped
+PARAMETER = re.compile(r"(?<=[0-9.])([A-Z])")
+
+
+def isBGCode(head):
+    return head[:4] == MAGIC
+
+
+def isFile(path):
+    with open(path, "rb") as f:
+        return isBGCode(f.read(4))
+
+
+def readBlocks(f, skip=()):
+    # (type, encoding, data) for each block, data decompressed; block types in skip come back with data None
+    magic, version, checksum = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a binary G-code file")
+    if version != 1:
+        raise ValueError(f"Unsupported binary G-code version {version}")
+    while True:
+        header = f.read(BLOCK_HEADER.size)
+        if not header:
+            return
+        block_type, compression, size = BLOCK_HEADER.unpack(header)
+        raw_size = b""
+        stored = size
+        if compression != NO_COMPRESSION:
+            raw_size = f.read(SIZE.size)
+            stored = SIZE.unpack(raw_size)[0]
+        params = f.read(6 if block_type == THUMBNAIL else 2)
+        if block_type in skip:
+            f.seek(stored + (4 if checksum == CRC32 else 0), 1)
+            yield block_type, None, None
+            continue
+        data = f.read(stored)
+        if len(data) != stored:
+            raise ValueError("Binary G-code file is truncated")
+        if checksum == CRC32:
+            expected = SIZE.unpack(f.read(4))[0]
+            if zlib.crc32(header + raw_size + params + data) != expected:
+                raise ValueError(f"Checksum mismatch in binary G-code block of type {block_type}")
+        encoding = struct.unpack("<H", params[:2])[0]
+        yield block_type, encoding, decompress(compression, data, size)
+
+
+def decompress(compression, data, size):
+    if compression == NO_COMPRESSION:
+        return data
+    if compression == DEFLATE:
+        return zlib.decompress(data)
+    if compression in HEATSHRINK:
+        window, lookahead = HEATSHRINK[compression]
+        if heatshrink2 is not None:
+            return heatshrink2.decompress(data, window_sz2=window, lookahead_sz2=lookahead)
+        return heatshrinkDecode(data, window, lookahead, size)
+    raise ValueError(f"Unsupported binary G-code compression {compression}")
+
+
+class BitReader:
+    # MSB-first bit fields read straight from the bytes
+    def __init__(self, data):
+        self.data = data
+        self.position = 0  # in bits
+        self.end = len(data) * 8
+
+    def read(self, count):
+        # the next count bits as an int, or None if fewer are left
+        if self.position + count > self.end:
+            return None
+        value = 0
+        while count:
+            used = self.position & 7
+            take = min(8 - used, count)
+            bits = (self.data[self.position >> 3] >> (8 - used - take)) & ((1 << take) - 1)
+            value = (value << take) | bits
+            self.position += take
+            count -= take
+        return value
+
+
+def heatshrinkDecode(data, window, lookahead, size):
+    # LZSS bit stream, MSB first: 1 + 8 bits is a literal byte, 0 + window bits + lookahead bits copies
+    # (count + 1) bytes from (index + 1) bytes back. the last byte is padded with zeros
+    reader = BitReader(data)
+    out = bytearray()
+    while len(out) < size:
+        tag = reader.read(1)
+        if tag is None:
+            break
+        if tag:
+            literal = reader.read(8)
+            if literal is None:
+                break
+            out.append(literal)
+            continue
+        offset = reader.read(window)
+        count = reader.read(lookahead)
+        if offset is None or count is None:
+            break
+        offset += 1
+        if offset > len(out):
+            raise ValueError("Corrupt heatshrink data")
+        for _ in range(count + 1):
+            out.append(out[-offset])
+    return bytes(out)
+
+
+def decodeGcode(encoding, data):
+    # a G-code block's text
+    if encoding == RAW:
+        return data.decode("utf-8", "replace")
+    if encoding in (MEATPACK, MEATPACK_COMMENTS):
+        text = MeatPack.Unpacker().feed(data)
+        return "\n".join(spaced(line) for line in text.split("\n"))
+    raise ValueError(f"Unsupported binary G-code encoding {encoding}")
+
+
+def spaced(line):
+    # no-spaces MeatPack drops the spaces between G and M words; put them back so the line reads as usual.
+    # text commands keep theirs, and quoted strings (M862.3 P "MK4") are left as they are
+    line = line.rstrip(" ")  # the packer pads odd lines with a space
+    if line[:1] not in ("G", "M") or line.split(" ")[0] in MeatPack.KEEP_SPACES:
+        return line
+    command, semicolon, comment = line.partition(";")
+    words, quote, text = command.partition('"')
+    return PARAMETER.sub(r" \1", words) + quote + text + semicolon + comment
+
+
+def parseIni(text):
+    values = {}
+    for line in text.splitlines():
+        key, separator, value = line.partition("=")
+        if separator:
+            values[key.strip()] = value.strip()
+    return values
+
+
+def readMetadata(f):
+    # {'file': {...}, 'printer': {...}, 'print': {...}, 'slicer': {...}} from the blocks ahead of the G-code in
+    # a binary file object
+    metadata = {}
+    for block_type, encoding, data in readBlocks(f, skip=(THUMBNAIL,)):
+        if block_type == GCODE:
+            break
+        if block_type in METADATA_BLOCKS:
+            metadata[METADATA_BLOCKS[block_type]] = parseIni(data.decode("utf-8", "replace"))
+    return metadata
+
+
+def readGcode(f):
+    # the G-code of a binary file object as text lines, decoded block by block
+    partial = ""
+    for block_type, encoding, data in readBlocks(f, skip=(THUMBNAIL,)):
+        if block_type != GCODE:
+            continue
+        lines = (partial + decodeGcode(encoding, data)).split("\n")
+        partial = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    if partial:
+        yield partial + "\n"
+
+
+def gcodeLines(path):
+    with open(path, "rb") as f:
+        yield from readGcode(f)
+
+
+class Lines:
+    # the lines of a binary G-code file, decoded again on each pass instead of being held in memory
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        return gcodeLines(self.path)
+
+
+def readLines(path):
+    # lines of a gcode file as the print loops read them: lazily for binary G-code, else the text file's lines
+    if isFile(path):
+        return Lines(path)
+    with open(path, "r") as g:
+        return g.readlines()
+
+
+def writeText(path, destination):
+    # the binary G-code file as plain text, for printers that only take text
+    with open(destination, "w", encoding="utf-8") as out:
+        out.writelines(gcodeLines(path))
@@ -0,0 +1,118 @@
+import re
+
+# MeatPack, the G-code packing Marlin and Prusa firmware decode on the serial link: the 15 most common characters
+# travel as 4-bit codes, two to a byte, and anything else follows its byte in full (a nibble of 0b1111 marks it).
+# with "no spaces" on, spaces are dropped from the line and their code stands for 'E' instead.
+# the host switches it on and off with 0xFF 0xFF <command>; the firmware answers each with a "[MP] ..." line
+SIGNAL = b"\xff\xff"
+ENABLE = SIGNAL + b"\xfb"
+DISABLE = SIGNAL + b"\xfa"
+RESET = SIGNAL + b"\xf9"
+QUERY = SIGNAL + b"\xf8"
+NO_SPACES = SIGNAL + b"\xf7"
+SPACES = SIGNAL + b"\xf6"
+COMMANDS = {ENABLE[2]: 'enable', DISABLE[2]: 'disable', RESET[2]: 'reset', QUERY[2]: 'query', NO_SPACES[2]: 'nospaces', SPACES[2]: 'spaces'}
+
+FULL = 0b1111
+CODES = {ord(char): code for code, char in enumerate("0123456789. \nGX")}
+CODES_NO_SPACES = {**{char: code for char, code in CODES.items() if char != ord(' ')}, ord('E'): CODES[ord(' ')]}
+CHARS = {code: chr(char) for char, code in CODES.items()}
+CHARS_NO_SPACES = {code: chr(char) for char, code in CODES_NO_SPACES.items()}
+
+# commands whose arguments are text (messages, file names), sent with their spaces
+KEEP_SPACES = {'M0', 'M1', 'M23', 'M28', 'M29', 'M30', 'M32', 'M117', 'M118', 'M928'}
+
+
+def report(line):
+    # (on, no spaces) from a firmware "[MP] ..." line, or None if it isn't one
+    if not line.startswith("[MP]"):
+        return None
+    words = line.split()
+    return "ON" in words, "NSP" in words
+
+
+def compact(line, no_spaces=True):
+    # the command without its comment, and without spaces when they aren't needed
+    line = line.split(";")[0].strip()
+    if no_spaces and line.split(" ")[0].upper() not in KEEP_SPACES:
+        line = re.sub(r"\s+", "", line)
+    return line
+
+
+def pack(line, no_spaces=True):
+    # one command line as MeatPack bytes, newline included
+    data = compact(line, no_spaces).encode("utf-8") + b"\n"
+    if len(data) % 2:
+        data = data[:-1] + b" \n"  # whole bytes per line, so the newline isn't held back waiting for a partner
+    codes = CODES_NO_SPACES if no_spaces else CODES
+    packed = bytearray()
+    for i in range(0, len(data), 2):
+        first, second = codes.get(data[i], FULL), codes.get(data[i + 1], FULL)
+        packed.append(second << 4 | first)
+        if first == FULL:
+            packed.append(data[i])
+        if second == FULL:
+            packed.append(data[i + 1])
+    return bytes(packed)
+
+
+class Unpacker:
+    # the firmware side, for the simulator and binary G-code blocks: turns packed bytes back into text and tracks the
+    # packing state
+    def __init__(self):
+        self.on = False
+        self.no_spaces = False
+        self.signal = False  # an 0xFF is waiting to see if the next byte makes a signal
+        self.command = False  # the next byte is a command
+        self.pending = []  # decoded characters, None where a full character is still to come
+
+    def feed(self, data, onCommand=None):
+        text = []
+        for byte in data:
+            if self.command:
+                self.command = False
+                self.apply(byte)
+                if onCommand:
+                    onCommand(COMMANDS.get(byte))
+                continue
+            if byte == 0xFF and None not in self.pending:
+                if self.signal:
+                    self.signal, self.command = False, True
+                    continue
+                self.signal = True
+                continue
+            if self.signal:
+                self.signal = False
+                self.take(0xFF, text)
+            self.take(byte, text)
+        return "".join(text)
+
+    def take(self, byte, text):
+        if None in self.pending:
+            self.pending[self.pending.index(None)] = chr(byte)
+        elif not self.on:
+            text.append(chr(byte))
+            return
+        else:
+            chars = CHARS_NO_SPACES if self.no_spaces else CHARS
+            first = chars.get(byte & 0xF)
+            # a newline in the low nibble ends the byte, the high nibble is only padding (as in Marlin and libbgcode)
+            self.pending = [first] if first == "\n" else [first, chars.get(byte >> 4)]
+        while self.pending and self.pending[0] is not None:
+            text.append(self.pending.pop(0))
+
+    def apply(self, byte):
+        name = COMMANDS.get(byte)
+        if name == 'enable':
+            self.on = True
+        elif name == 'disable':
+            self.on = False
+        elif name == 'reset':
+            self.on = self.no_spaces = False
+        elif name == 'nospaces':
+            self.no_spaces = True
+        elif name == 'spaces':
+            self.no_spaces = False
+
+    def state(self):
+        return f"[MP] PV01 {'ON' if self.on else 'OFF'} {'NSP' if self.no_spaces else 'ESP'}"
@@ -0,0 +1,222 @@
+import re
+import numpy as np
+
+# Kinematic print time estimate for a gcode file. Runs once per file and produces the cumulative
+# time (seconds, float32) after each command the print loop sends, so progress and ETA are a lookup by sent line.
+
+# (acceleration mm/s^2, jerk mm/s) per printer family, used until the file sets its own with M204/M205
+FAMILY_LIMITS = {
+    'MK3': (1250.0, 8.0),
+    'MK4': (2500.0, 8.0),
+    'Ender': (500.0, 8.0),
+}
+DEFAULT_LIMITS = (1000.0, 8.0)
+
+HOMING_TIME = 15.0  # G28 takes roughly this long regardless of position
+DEFAULT_FEEDRATE = 1500.0  # mm/min until the file sets one
+
+# the file is parsed as arrays over its bytes rather than command by command
+COMMENT = re.compile(r';[^\n]*')
+SPACES = re.compile(r'[^\S \t\n\r]')  # other whitespace str.strip() drops (\v, \f, non-breaking spaces, ...)
+PARAMETERS = 'XYZEFIJPS'  # the words parse reads
+CODE_LETTERS = [ord(letter) for letter in 'GMT']
+
+
+def limitsFor(family):
+    # family is a printer family ('MK4', 'Ender', ...) or a slicer model string ('MK4S', 'ENDER3')
+    if family:
+        for name, limits in FAMILY_LIMITS.items():
+            if family.upper().startswith(name.upper()):
+                return limits
+    return DEFAULT_LIMITS
+
+
+def nextIndex(mask):
+    # for each position, the first index at or after it where mask is set
+    index = np.where(mask, np.arange(len(mask), dtype=np.int32), np.int32(len(mask)))
+    return np.minimum.accumulate(index[::-1])[::-1]
+
+
+def tokenize(text):
+    # the commands Printer.parseGcode sends (comments stripped, empty lines skipped) as arrays, one entry per command:
+    # returns the count, each command's code letter (ord 'G'/'M'/'T', 0 without one) and number, and
+    # {letter: (values, present)} for the PARAMETERS. a word is a letter, optional spaces and a number; on repeats
+    # the last one counts
+    data = SPACES.sub(' ', COMMENT.sub('', text)).upper().encode('utf-8', 'replace') + b'\n  '
+    c = np.frombuffer(data, dtype=np.uint8)
+    space = (c == 32) | (c == 9) | (c == 13)
+    visible = nextIndex(~space)  # the next character that isn't a space (newlines count)
+    lines = np.concatenate(([0], np.flatnonzero(c == 10)[:-1] + 1))
+    firsts = visible[lines]
+    firsts = firsts[c[firsts] != 10]  # the first character of each command
+    n = len(firsts)
+
+    # words: where each number starts (after the letter and any spaces) and ends, as the pattern -?\d*\.?\d+ would
+    digit = (c >= 48) & (c <= 57)
+    letters = np.flatnonzero((c >= 65) & (c <= 90))
+    start = visible[letters + 1]
+    signed = start + (c[start] == 45)
+    nondigit = nextIndex(~digit)
+    whole = nondigit[signed]
+    fraction = (c[whole] == 46) & digit[whole + 1]
+    end = np.where(fraction, nondigit[whole + 1], whole)
+    valid = fraction | (whole > signed)
+    letters, start, signed, whole, end = letters[valid], start[valid], signed[valid], whole[valid], end[valid]
+
+    # every number at once: blank out everything but the words' numbers and let numpy read them
+    edges = np.zeros(len(c) + 1, np.int8)
+    edges[start] = 1
+    edges[end] -= 1
+    kept = np.cumsum(edges[:-1], dtype=np.int8).view(bool)
+    values = np.fromstring(np.where(kept, c, np.uint8(32)).tobytes().decode('ascii'), sep=' ')
+
+    owner = np.searchsorted(firsts, letters, side='right') - 1  # the command each word is in
+    letter = c[letters]
+    is_code = (letters == firsts[owner]) & (signed == start) & (whole > start) & np.isin(letter, CODE_LETTERS)
+    code_letter = np.zeros(n, np.uint8)
+    code_number = np.zeros(n)
+    code_letter[owner[is_code]] = letter[is_code]
+    code_number[owner[is_code]] = np.floor(values[is_code])  # G29.1 is G29, as the printer reads it
+
+    words = {}
+    for name in PARAMETERS:
+        selected = ~is_code & (letter == ord(name))
+        numbers = np.zeros(n)
+        present = np.zeros(n, bool)
+        numbers[owner[selected]] = values[selected]
+        present[owner[selected]] = True
+        words[name] = (numbers, present)
+    return n, code_letter, code_number, words
+
+
+def carried(mask, values, initial):
+    # modal state: at each command, the value set by the last command where mask is set, initial before any
+    last = np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+    return np.where(last >= 0, values[last], initial)
+
+
+def running(increment, reset, value):
+    # an axis position: the value it was last set to (absolute move, G92, G28), plus the relative moves since
+    total = np.cumsum(np.where(reset, 0, increment))
+    last = np.maximum.accumulate(np.where(reset, np.arange(len(reset)), -1))
+    return np.where(last >= 0, value[last] - total[last], 0) + total
+
+
+def parse(text, accel, jerk):
+    # per-command motion arrays for the commands in text, with the modal state (positioning mode, feedrate,
+    # acceleration, G92/G28 positions) carried forward as array operations rather than command by command
+    n, letter, number, words = tokenize(text)
+    if n == 0:
+        return (np.zeros((0, 3)),) + tuple(np.zeros(0) for _ in range(6))
+    g = letter == ord('G')
+    m = letter == ord('M')
+    move = g & (number <= 3)
+    arcs = g & ((number == 2) | (number == 3))
+    g28 = g & (number == 28)
+    g92 = g & (number == 92)
+
+    relative = carried(g & ((number == 90) | (number == 91)), number == 91, False)
+    relative_e = relative | carried(m & ((number == 82) | (number == 83)), number == 83, False)
+
+    # positions after each command; a move's delta is the change from the command before
+    position = np.zeros((n, 3))
+    for axis, letter in enumerate('XYZ'):
+        value, present = words[letter]
+        given = move & present
+        position[:, axis] = running(
+            np.where(given & relative, value, 0),
+            (given & ~relative) | (g92 & present) | g28,
+            np.where(g28, 0, value),
+        )
+    start = np.vstack((np.zeros((1, 3)), position[:-1]))
+    delta = np.where(move[:, None], position - start, 0)
+
+    value, present = words['E']
+    given = move & present
+    e_position = running(np.where(given & relative_e, value, 0), (given & ~relative_e) | (g92 & present), value)
+    extrude = np.where(given, np.diff(e_position, prepend=0), 0)
+
+    arc = np.zeros(n)
+    if arcs.any():
+        (i, has_i), (j, has_j) = words['I'], words['J']
+        arc[arcs] = arcLengths(start[arcs], position[arcs], i[arcs], j[arcs], (has_i | has_j)[arcs], number[arcs] == 2)
+
+    f, has_f = words['F']
+    feed = np.where(move, carried(move & has_f, f, DEFAULT_FEEDRATE), 0)
+    (p, has_p), (s, has_s) = words['P'], words['S']
+    accels = carried(m & (number == 204) & (has_p | has_s), np.where(has_p, p, s), accel)
+    x, has_x = words['X']
+    jerks = carried(m & (number == 205) & has_x, x, jerk)
+    fixed = np.where(g & (number == 4), p / 1000 + s, 0) + np.where(g28, HOMING_TIME, 0)
+
+    return delta, arc, extrude, feed, accels, jerks, fixed
+
+
+def arcLengths(start, end, i, j, centered, clockwise):
+    # lengths of G2/G3 arcs given I/J center offsets (the R form, without them, falls back to the chord)
+    cx = start[:, 0] + i
+    cy = start[:, 1] + j
+    radius = np.hypot(start[:, 0] - cx, start[:, 1] - cy)
+    a0 = np.arctan2(start[:, 1] - cy, start[:, 0] - cx)
+    a1 = np.arctan2(end[:, 1] - cy, end[:, 0] - cx)
+    sweep = np.where(clockwise, a0 - a1, a1 - a0)
+    sweep = np.where(sweep <= 0, sweep + 2 * np.pi, sweep)
+    chord = np.hypot(end[:, 0] - start[:, 0], end[:, 1] - start[:, 1])
+    return np.where(centered, np.hypot(radius * sweep, end[:, 2] - start[:, 2]), chord)
+
+
+def cumulativeTime(delta, arc, extrude, feed, accels, jerks, fixed):
+    # trapezoidal profile per move, junction speeds limited by jerk across the corner angle
+    length = np.where(arc > 0, arc, np.linalg.norm(delta, axis=1))
+    length = np.where(length > 0, length, np.abs(extrude))  # extruder-only moves (retract/unretract)
+    times = fixed.copy()
+
+    moving = np.nonzero(length > 0)[0]
+    if len(moving):
+        L = length[moving]
+        v = np.maximum(feed[moving] / 60, 1e-3)
+        a = np.maximum(accels[moving], 1e-3)
+        jerk = jerks[moving]
+
+        # unit direction of each move (extruder-only moves have none, so their corners are treated as 90 degrees)
+        norms = np.linalg.norm(delta[moving], axis=1)
+        unit = np.divide(delta[moving], norms[:, None], out=np.zeros_like(delta[moving]), where=norms[:, None] > 0)
+        cos = np.clip(np.sum(unit[:-1] * unit[1:], axis=1), -1, 1)
+        # speed change across a corner at speed s is s*sqrt(2(1-cos)); keep it within jerk
+        corner = np.sqrt(np.maximum(2 * (1 - cos), 1e-12))
+        junction = np.minimum(np.minimum(v[:-1], v[1:]), jerk[1:] / corner)
+        entry = np.concatenate(([0.0], junction))
+        exit = np.concatenate((junction, [0.0]))
+
+        accel_distance = (v ** 2 - entry ** 2) / (2 * a)
+        decel_distance = (v ** 2 - exit ** 2) / (2 * a)
+        cruise = L - accel_distance - decel_distance
+        trapezoid = (v - entry) / a + (v - exit) / a + np.maximum(cruise, 0) / v
+        # too short to reach cruise speed: accelerate to the peak and straight back down
+        peak = np.sqrt(np.maximum((2 * a * L + entry ** 2 + exit ** 2) / 2, np.maximum(entry, exit) ** 2))
+        triangle = (peak - entry) / a + (peak - exit) / a
+        times[moving] += np.where(cruise >= 0, trapezoid, triangle)
+
+    return np.cumsum(times).astype(np.float32)
+
+
+def analyze(lines, family=''):
+    # lines is the gcode text, or its lines (a list, an open file, BGCode.Lines)
+    accel, jerk = limitsFor(family)
+    text = lines if isinstance(lines, str) else ''.join(lines)
+    return cumulativeTime(*parse(text, accel, jerk))
+
+
+def analyzeFile(path, family=''):
+    with open(path, 'r', errors='ignore') as g:
+        return analyze(g.read(), family)
+
+
+def toBytes(cumulative):
+    return np.asarray(cumulative, dtype=np.float32).tobytes()
+
+
+def fromBytes(data):
+    if not data:
+        return None
+    return np.frombuffer(data, dtype=np.float32)
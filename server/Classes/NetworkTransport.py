@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, quote, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import simple_websocket  # comes with flask-socketio; without it status is polled over HTTP
+except ImportError:
+    simple_websocket = None
+
+# transport for printers reached over the network (Moonraker-style HTTP API) instead of a serial port: registered
+# with an "http://host[:port]" device, optionally "?api_key=..." for servers that want an X-Api-Key.
+# the whole file is uploaded and printed by the printer, status is pushed over the API's websocket
+# (notify_status_update), and single commands (connect's M155, the ending sequence) go through the gcode endpoint,
+# answered with "ok" through readline so sendGcode/gcodeEnding work the same as on serial
+SCHEMES = ('http://', 'https://')
+REQUEST_TIMEOUT = 10
+UPLOAD_TIMEOUT = 600
+POLL_INTERVAL = 1  # seconds between status polls when there's no websocket feed
+RECONNECT_DELAY = 5
+POOL_SIZE = 4  # keep-alive connections per printer host
+STATUS_OBJECTS = {
+    'print_stats': ['state', 'filename', 'message'],
+    'virtual_sdcard': ['file_position', 'file_size', 'progress', 'is_active'],
+    'extruder': ['temperature'],
+    'heater_bed': ['temperature'],
+}
+
+_sessions = {}  # base url -> requests.Session, shared by every transport to that host
+_sessions_lock = threading.Lock()
+
+
+def isNetwork(device):
+    return bool(device) and device.startswith(SCHEMES)
+
+
+def getSession(base_url):
+    # one pooled keep-alive session per printer host
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[base_url] = session
+        return session
+
+
+class NetworkTransport:
+    uploads = True  # prints whole files (PrinterRuntime.printOverNetwork) instead of streaming lines
+    poll_interval = POLL_INTERVAL
+
+    def __init__(self, device, timeout=10):
+        parts = urlsplit(device)
+        query = parse_qs(parts.query)
+        self.base_url = urlunsplit((parts.scheme, parts.netloc, parts.path.rstrip('/'), '', ''))
+        self.headers = {'X-Api-Key': query['api_key'][0]} if 'api_key' in query else {}
+        self.timeout = timeout
+        self.session = getSession(self.base_url)
+        self.replies = deque()
+        self.state = {}  # latest status objects, merged from the feed or polls
+        self.state_lock = threading.Lock()
+        self.pushed = 0  # when the websocket feed last confirmed the state; polled over HTTP while this is stale
+        self.feed = None
+        self.closed = False
+        self.started = False  # whether the uploaded file has been seen printing yet
+        self.request('GET', '/server/info')  # fails here, like opening a missing serial port, if it's unreachable
+        if simple_websocket is not None:
+            self.feed = threading.Thread(target=self.listen, daemon=True)
+            self.feed.start()
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+        response = self.session.request(method, f"{self.base_url}{path}", headers=self.headers, **kwargs)
+        response.raise_for_status()
+        return response.json().get('result') if response.content else None
+
+    # serial-like side, for single commands
+
+    def write(self, data):
+        for line in data.decode('utf-8').split('\n'):
+            if line.strip():
+                self.request('POST', '/printer/gcode/script', params={'script': line.strip()})
+                self.replies.append('ok')
+        return len(data)
+
+    def readline(self):
+        return f"{self.replies.popleft()}\n".encode('utf-8') if self.replies else b''
+
+    def reset_input_buffer(self):
+        self.replies.clear()
+
+    def close(self):
+        self.closed = True
+
+    # whole-file printing
+
+    def printFile(self, path, name):
+        self.started = False
+        with open(path, 'rb') as f:
+            self.request('POST', '/server/files/upload', files={'file': (name, f)}, data={'root': 'gcodes', 'print': 'true'}, timeout=UPLOAD_TIMEOUT)
+
+    def deleteFile(self, name):
+        self.request('DELETE', f"/server/files/gcodes/{quote(name)}")
+
+    def pause(self):
+        self.request('POST', '/printer/print/pause')
+
+    def resume(self):
+        self.request('POST', '/printer/print/resume')
+
+    def cancel(self):
+        self.request('POST', '/printer/print/cancel')
+
+    def colorChange(self):
+        self.request('POST', '/printer/gcode/script', params={'script': 'M600'})
+
+    def position(self):
+        # (bytes printed, file size) while the file is printing, None once it's done; raises if the printer failed
+        state = self.status()
+        stats, card = state.get('print_stats', {}), state.get('virtual_sdcard', {})
+        if stats.get('state') == 'error':
+            raise Exception(stats.get('message') or "Printer reported an error")
+        if stats.get('state') in ('printing', 'paused'):
+            self.started = True
+        elif self.started and not card.get('is_active'):
+            return None
+        return card.get('file_position', 0), card.get('file_size', 0)
+
+    def temps(self):
+        state = self.status()
+        extruder, bed = state.get('extruder', {}).get('temperature'), state.get('heater_bed', {}).get('temperature')
+        return (extruder, bed) if extruder is not None and bed is not None else None
+
+    # status feed
+
+    def status(self):
+        # pushed state when the feed is live, otherwise a fresh poll
+        if self.feed is None or time.time() - self.pushed > RECONNECT_DELAY * 2:
+            result = self.request('GET', '/printer/objects/query', params={name: ','.join(fields) for name, fields in STATUS_OBJECTS.items()})
+            self.merge(result.get('status', {}))
+        with self.state_lock:
+            return {name: dict(fields) for name, fields in self.state.items()}
+
+    def merge(self, status):
+        with self.state_lock:
+            for name, fields in status.items():
+                self.state.setdefault(name, {}).update(fields)
+
+    def listen(self):
+        # subscribes to the status objects over the websocket and merges every update; reconnects until closed
+        url = f"{'wss' if self.base_url.startswith('https') else 'ws'}{self.base_url[self.base_url.index(':'):]}/websocket"
+        while not self.closed:
+            ws = None
+            try:
+                ws = simple_websocket.Client.connect(url, headers=self.headers)
+                ws.send(json.dumps({'jsonrpc': '2.0', 'method': 'printer.objects.subscribe', 'params': {'objects': STATUS_OBJECTS}, 'id': 1}))
+                while not self.closed:
+                    message = ws.receive(timeout=RECONNECT_DELAY)
+                    if message is None:
+                        self.pushed = time.time()  # quiet but connected: the state we have is current
+                        continue
+                    message = json.loads(message)
+                    if message.get('id') == 1:
+                        self.merge(message.get('result', {}).get('status', {}))
+                        self.pushed = time.time()
+                    elif message.get('method') == 'notify_status_update':
+                        self.merge(message['params'][0])
+                        self.pushed = time.time()
+            except Exception as e:
+                if not self.closed:
+                    print(f"Printer status feed {url} unavailable: {e}")
+            finally:
+                self.pushed = 0  # polled until the feed is back
+                if ws is not None:
+                    try:
+                        ws.close()
+                    except simple_websocket.ConnectionClosed:
+                        pass  # closed from the other end
+            time.sleep(RECONNECT_DELAY)
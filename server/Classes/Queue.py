@@ -1,15 +1,38 @@
-from collections import deque
+from threading import RLock
 from flask import jsonify, current_app
+from services import stateService
 
 
 class Queue:
-    # Only adding ID to the queue
+    # Only adding ID to the queue.
+    # the jobs are kept in an immutable tuple that writers replace under the lock (copy-on-write), so
+    # readers (status routes, snapshots, the print loop) just take the current tuple and never block or
+    # see a half-done change. the queue delta is published inside the lock so deltas go out in order
     def __init__(self):
-        self.__queue = deque()  # use Python double-ended queue
+        self.__lock = RLock()
+        self.__jobs = ()
+
+    def __iter__(self):  # iterate over a snapshot of the queue
+        return iter(self.__jobs)
+
+    def __publish(self, jobs, printerid, emit=True):
+        # swap in the new queue; callers hold the lock
+        self.__jobs = tuple(jobs)
+        if printerid is not None:
+            return stateService.queueChanged(printerid, self.__jobs, emit)
+        return None
+
+    @staticmethod
+    def __insertPriority(jobs, job):
+        # If the queue has at least one job and the first job is printing,
+        # insert at the second position because we don't want to interrupt it.
+        if len(jobs) >= 1 and jobs[0].status == "printing":
+            jobs.insert(1, job)
+        # If the queue is empty or the first job is not printing,
+        # add the job to the front
+        else:
+            jobs.insert(0, job)
 
-    def __iter__(self):  # iterate over queue
-        return iter(self.__queue)
-    
     # def setToInQueue(self): 
     #     for job in self.__queue: 
     #         job.status = "inqueue"
@@ -19,154 +42,131 @@ class Queue:
         print("Adding job to back of queue ", job.id)
         print("Adding job to back of queue ", printerid)
 
-        if self.__queue.count(job) > 0:
-            raise Exception("Job ID already in queue.")
-        self.__queue.append(
-            job
-        )  # appending on the right is the "front" because popping takes out from right d
-        current_app.socketio.emit(
-            "queue_update", {"queue": self.convertQueueToJson(), "printerid": printerid}
-        )
+        with self.__lock:
+            if job in self.__jobs:
+                raise Exception("Job ID already in queue.")
+            self.__publish(self.__jobs + (job,), printerid)
 
     def addToFront(self, job, printerid):
-        if self.__queue.count(job) > 0:
-            raise Exception("Job ID already in queue.")
-        # If the queue has at least one job and the first job is printing,
-        # insert at the second position because we don't want to interrupt it.
-        if len(self.__queue) >= 1 and self.__queue[0].status == "printing":
-            self.__queue.insert(1, job)
-        # If the queue is empty or the first job is not printing,
-        # add the job to the front
-        else:
-            self.__queue.appendleft(job)
-        current_app.socketio.emit(
-            "queue_update", {"queue": self.convertQueueToJson(), "printerid": printerid}
-        )
-
-    def bump(self, up, jobid):  # up = boolean. if up = true bump up, else bump down
-        index = next(
-            (
-                index
-                for index, queued_job in enumerate(self.__queue)
-                if queued_job.id == jobid
-            ),
-            -1,
-        )
-        if index == -1:
-            print("Job not found in queue.")
-            return
-        job_to_move = self.__queue[index]
-        self.__queue.remove(job_to_move)
-        if up == True and index > 0:
-            self.__queue.insert(index - 1, job_to_move)
-        elif not up and index < len(self.__queue):
-            self.__queue.insert(index + 1, job_to_move)
-        
-    def reorder(self, arr): 
+        with self.__lock:
+            if job in self.__jobs:
+                raise Exception("Job ID already in queue.")
+            jobs = list(self.__jobs)
+            self.__insertPriority(jobs, job)
+            self.__publish(jobs, printerid)
+
+    def addJobs(self, jobs, printerid, emit=True):
+        # jobs is a list of (job, priority) tuples; add them all, then emit a single queue delta
+        # (emit=False when the caller sends its own consolidated update). returns the delta
+        with self.__lock:
+            queue = list(self.__jobs)
+            for job, priority in jobs:
+                if job in queue:
+                    raise Exception("Job ID already in queue.")
+                if not priority:
+                    queue.append(job)
+                else:
+                    self.__insertPriority(queue, job)
+            return self.__publish(queue, printerid, emit)
+
+    def removeJobs(self, jobids):
+        # remove several jobs without emitting (the caller publishes the queue delta); returns the removed jobs in queue order
+        with self.__lock:
+            removed = [job for job in self.__jobs if job.getJobId() in jobids]
+            if removed:
+                self.__jobs = tuple(job for job in self.__jobs if job not in removed)
+            return removed
+
+    def bump(self, up, jobid, printerid=None):  # up = boolean. if up = true bump up, else bump down
+        with self.__lock:
+            jobs = list(self.__jobs)
+            index = next(
+                (
+                    index
+                    for index, queued_job in enumerate(jobs)
+                    if queued_job.id == jobid
+                ),
+                -1,
+            )
+            if index == -1:
+                print("Job not found in queue.")
+                return
+            job_to_move = jobs.pop(index)
+            if up == True and index > 0:
+                jobs.insert(index - 1, job_to_move)
+            elif not up and index < len(jobs):
+                jobs.insert(index + 1, job_to_move)
+            else:
+                jobs.insert(index, job_to_move)  # already at the end it was bumped towards
+            self.__publish(jobs, printerid)
+
+    def reorder(self, arr, printerid=None): 
         # arr is an array of job ids in the order they should be in the queue
-        new_queue = deque()
-        for jobid in arr: 
-            for job in self.__queue: 
-                if job.getJobId() == jobid: 
-                    new_queue.append(job)
-                    break
-        self.__queue = new_queue
-    
+        with self.__lock:
+            by_id = {job.getJobId(): job for job in self.__jobs}
+            self.__publish([by_id[jobid] for jobid in arr if jobid in by_id], printerid)
+
     def deleteJob(self, jobid, printerid):
-        deletedjob = None
-        for job in self.__queue:
-            if job.getJobId() == jobid:
-                deletedjob = job
-                self.__queue.remove(job)
-                current_app.socketio.emit(
-                    "queue_update",
-                    {"queue": self.convertQueueToJson(), "printerid": printerid},
-                )
-                return deletedjob
+        with self.__lock:
+            for job in self.__jobs:
+                if job.getJobId() == jobid:
+                    self.__publish([queued for queued in self.__jobs if queued is not job], printerid)
+                    return job
         return "Job not found in queue."
 
     def convertQueueToJson(self):
-        queue = []
-        # job_info = {}
-        for job in self.__queue:
-            job_info = {
-                "id": job.id,
-                "name": job.name,
-                "status": job.status,
-                "date": job.date.strftime('%a, %d %b %Y %H:%M:%S'),
-                "printerid": job.printer_id, 
-                "errorid": job.error_id,
-                "file_name_original": job.file_name_original, 
-                "progress": job.progress,
-                "sent_lines": job.sent_lines,
-                "favorite": job.favorite,
-                "released": job.released,
-                "file_pause": job.filePause, 
-                "comments": job.comments, 
-                "extruded": job.extruded,
-                "td_id": job.td_id, 
-                "time_started": job.time_started, 
-                "printer_name": job.printer_name,
-                "max_layer_height": job.max_layer_height,
-                "current_layer_height": job.current_layer_height,
-                "filament": job.filament,
-            }
-            queue.append(job_info)
-        return queue
+        return [stateService.jobInfo(job) for job in self.__jobs]
 
     def bumpExtreme(self, front, jobid, printerid):  # bump to back/front of queue
-        index = next(
-            (
-                index
-                for index, queued_job in enumerate(self.__queue)
-                if queued_job.id == jobid
-            ),
-            -1,
-        )
-        if index == -1:
-            print("Job not found in queue.")
-            return
-        job_to_move = self.__queue[index]
-        self.__queue.remove(job_to_move)
-        if front == True:
-            # If the queue has at least one job and the first job is printing,
-            # insert at the second position because we don't want to interrupt it.
-            if len(self.__queue) >= 1 and self.__queue[0].status == "printing":
-                self.__queue.insert(1, job_to_move)
-            # If the queue is empty or the first job is not printing,
-            # add the job to the front
+        with self.__lock:
+            jobs = list(self.__jobs)
+            index = next(
+                (
+                    index
+                    for index, queued_job in enumerate(jobs)
+                    if queued_job.id == jobid
+                ),
+                -1,
+            )
+            if index == -1:
+                print("Job not found in queue.")
+                return
+            job_to_move = jobs.pop(index)
+            if front == True:
+                self.__insertPriority(jobs, job_to_move)
             else:
-                self.__queue.insert(0, job_to_move)
-        else:
-            self.addToBack(job_to_move, printerid)
+                jobs.append(job_to_move)
+            self.__publish(jobs, printerid)
 
     def getJob(self, job_to_find):
-        for job in self.__queue:
+        for job in self.__jobs:
             if job.getJobId() == job_to_find.getJobId():
                 return job
         return None  # Return None if job is not found in the queue
 
     def getJobById(self, job_to_find):
-        for job in self.__queue:
+        for job in self.__jobs:
             if job.getJobId() == job_to_find:
                 return job
         return None  # Return None if job is not found in the queue
 
     def jobExists(self, jobid):
-        for job in self.__queue:
+        for job in self.__jobs:
             if job.id == jobid:
                 return True
         return False
 
     def getQueue(self):
-        return self.__queue
+        # read-only snapshot; change the queue through the methods above
+        return self.__jobs
 
     def getNext(self):
-        return self.__queue[0]
+        return self.__jobs[0]
 
     def getSize(self):
-        return len(self.__queue)
+        return len(self.__jobs)
 
     def removeJob(self):
-        self.__queue.pop()
+        with self.__lock:
+            self.__jobs = self.__jobs[:-1]
         # current_app.socketio.emit('job_removed', {'queue': list(self.__queue)}, broadcast=True)
@@ -0,0 +1,132 @@
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlparse
+
+from Classes import MeatPack
+
+# stand-in for serial.Serial on printers registered with a "sim://<name>" device (optionally "sim://<name>?delay=0.05"):
+# every command is answered with "ok" after a short delay and temperature reports come back now and then, so a farm,
+# or several local instances of one, can be exercised without hardware.
+# it also has a small SD card: M28/M29 store a file, M23/M24 print it at one command per delay, M25 pauses,
+# M27 reports the byte position, M524 aborts and M30 deletes, as Marlin/Prusa firmware answer them.
+# it decodes MeatPack like the firmware does (meatpack=0 for firmware without it), and baud=115200 makes writes take
+# as long as they would on a serial link of that speed
+PREFIX = 'sim://'
+DEFAULT_DELAY = 0.01  # seconds per command
+TEMP_EVERY = 50  # commands between temperature reports
+
+
+def isSimulated(device):
+    return bool(device) and device.startswith(PREFIX)
+
+
+class SimulatedSerial:
+    def __init__(self, device, timeout=10):
+        query = parse_qs(urlparse(device).query)
+        self.delay = float(query.get('delay', [DEFAULT_DELAY])[0])
+        self.baud = int(query.get('baud', [0])[0])
+        self.unpacker = MeatPack.Unpacker() if query.get('meatpack', ['1'])[0] != '0' else None
+        self.received = ""  # text of the line being received
+        self.bytes_written = 0
+        self.timeout = timeout
+        self.replies = deque()  # (line, delay before it's read)
+        self.sent = 0
+        self.is_open = True
+        self.files = {}  # name -> stored command lines
+        self.writing = None  # file M28 is writing to
+        self.selected = None
+        self.started = None  # when the SD print started, moved forward by time spent paused
+        self.paused = None  # when the SD print was paused
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        if self.baud:
+            time.sleep(len(data) * 10 / self.baud)  # 8N1: ten bits on the wire per byte
+        if self.unpacker:
+            text = self.unpacker.feed(data, lambda command: self.reply(self.unpacker.state()))
+        else:
+            text = data.decode('latin-1')
+        self.received += text
+        *lines, self.received = self.received.split('\n')
+        for line in lines:
+            if line.strip():
+                self.command(line.strip())
+        return len(data)
+
+    def readline(self):
+        if not self.replies:
+            time.sleep(min(self.timeout, 1))
+            return b''
+        line, delay = self.replies.popleft()
+        time.sleep(delay)
+        return f"{line}\n".encode('utf-8')
+
+    def reset_input_buffer(self):
+        self.replies.clear()
+
+    def close(self):
+        self.is_open = False
+
+    def reply(self, *lines):
+        for line in lines:
+            self.replies.append((line, self.delay if line.startswith('ok') else 0))
+
+    def command(self, line):
+        code, _, argument = line.partition(' ')
+        if self.writing is not None and code != 'M29':
+            self.files[self.writing].append(line)
+            return self.reply('ok')
+        self.sent += 1
+        if not code.isascii():
+            self.reply(f"echo:Unknown command: \"{line}\"", 'ok')
+        elif code == 'M28':
+            self.writing = argument
+            self.files[argument] = []
+            self.reply(f"Writing to file: {argument}", 'ok')
+        elif code == 'M29':
+            self.writing = None
+            self.reply('Done saving file.', 'ok')
+        elif code == 'M23':
+            if argument in self.files:
+                self.selected = argument
+                self.reply(f"File opened: {argument} Size: {self.fileSize(argument)}", 'File selected', 'ok')
+            else:
+                self.reply(f"open failed, File: {argument}.", 'ok')
+        elif code == 'M24':
+            if self.paused is not None:
+                self.started += time.time() - self.paused
+                self.paused = None
+            elif self.selected is not None:
+                self.started = time.time()
+            self.reply('ok')
+        elif code == 'M25':
+            if self.started is not None and self.paused is None:
+                self.paused = time.time()
+            self.reply('ok')
+        elif code == 'M27':
+            self.reply(*self.printStatus(), 'ok')
+        elif code == 'M524':
+            self.started = self.paused = None
+            self.reply('ok')
+        elif code == 'M30':
+            self.files.pop(argument, None)
+            self.reply(f"File deleted:{argument}", 'ok')
+        elif code == 'M105' or self.sent % TEMP_EVERY == 0:
+            self.reply('ok T:215.0 /215.0 B:60.0 /60.0')
+        else:
+            self.reply('ok')
+
+    def fileSize(self, name):
+        return sum(len(line) + 1 for line in self.files[name])
+
+    def printStatus(self):
+        if self.started is None:
+            return ['Not SD printing']
+        lines = self.files[self.selected]
+        elapsed = (self.paused or time.time()) - self.started
+        done = min(int(elapsed / self.delay), len(lines)) if self.delay else len(lines)
+        if done >= len(lines):
+            self.started = None
+            return ['Done printing file', 'Not SD printing']
+        position = sum(len(line) + 1 for line in lines[:done])
+        return [f"SD printing byte {position}/{self.fileSize(self.selected)}"]
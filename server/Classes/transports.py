@@ -0,0 +1,54 @@
+import re
+
+import serial
+
+from Classes import NetworkTransport, SimulatedSerial
+
+# what a printer's device string connects to: "sim://..." the simulator, "http(s)://..." a network printer's API,
+# anything else a serial port. all of them take write/readline/reset_input_buffer/close like serial.Serial
+SD_POLL_INTERVAL = 5  # seconds between M27 progress polls while a printer prints from its own storage
+
+
+def openTransport(device, timeout=10):
+    if SimulatedSerial.isSimulated(device):
+        return SimulatedSerial.SimulatedSerial(device, timeout=timeout)
+    if NetworkTransport.isNetwork(device):
+        return NetworkTransport.NetworkTransport(device, timeout=timeout)
+    return serial.Serial(device, 115200, timeout=timeout)
+
+
+class CardControl:
+    # the card print of a serial printer (sdPrint), driven with gcode, in the shape PrinterRuntime.watchStoragePrint
+    # expects; NetworkTransport has the same methods over the printer's API
+    poll_interval = SD_POLL_INTERVAL
+
+    def __init__(self, printer):
+        self.printer = printer
+        self.last = (0, 0)
+
+    def pause(self):
+        self.printer.sendGcode("M25")
+
+    def resume(self):
+        self.printer.sendGcode("M24")
+
+    def cancel(self):
+        self.printer.sendGcode("M524")
+
+    def colorChange(self):
+        self.printer.sendGcode("M600")
+
+    def temps(self):
+        return None  # already picked up from the M27 replies by queryGcode
+
+    def position(self):
+        # (bytes printed, file size) while the card prints, None once it's done
+        responses = self.printer.queryGcode("M27")
+        for response in responses:
+            match = re.search(r"printing byte (\d+)/(\d+)", response)
+            if match:
+                self.last = (int(match.group(1)), int(match.group(2)))
+                return self.last
+        if any("Not SD printing" in response for response in responses):
+            return None
+        return self.last
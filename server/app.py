@@ -9,11 +9,12 @@ from flask_migrate import Migrate
 from dotenv import load_dotenv, set_key
 from controllers.ports import getRegisteredPrinters
 import shutil
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit
 from datetime import datetime, timedelta
 from sqlalchemy import text
 import json
 from models.config import Config
+from services import etaService, eventService, roomService, daemonService, telemetryService, federationService
 
 
 
@@ -23,7 +24,14 @@ app = Flask(__name__, static_folder='../client/dist')
 app.config.from_object(__name__) # update application instantly 
 
 # moved this before importing the blueprints so that it can be accessed by the PrinterStatusService
-printer_status_service = PrinterStatusService(app)
+# with printerDaemon on, the printers run in printerdaemon.py and this process only forwards to it.
+# print worker processes (printerworker.py) import the app for its database and models, and start nothing
+role = Config.get('process_role')
+owns_printers = role == 'daemon' or (role == 'api' and not Config.get('printer_daemon'))
+if role == 'api' and not owns_printers:
+    printer_status_service = daemonService.PrinterDaemonClient(app, Config.get('daemon_socket'))
+else:
+    printer_status_service = PrinterStatusService(app)
 
 # Initialize SocketIO, which will be used to send printer status updates to the frontend
 # and this specific socketit will be used throughout the backend
@@ -35,14 +43,19 @@ else:
 
 socketio = SocketIO(app, cors_allowed_origins="*", engineio_logger=False, socketio_logger=False, async_mode=async_mode) # make it eventlet on production!
 app.socketio = socketio  # Add the SocketIO object to the app object
+roomService.register(socketio)  # subscribe/unsubscribe handlers; model events are emitted to rooms, not broadcast
+if role == 'api' and not owns_printers:
+    daemonService.connect(socketio, printer_status_service)  # events to and from the printer daemon
 
 # IMPORTING BLUEPRINTS 
 from controllers.ports import ports_bp
 from controllers.jobs import jobs_bp
 from controllers.statusService import status_bp, getStatus 
 from controllers.issues import issue_bp
+from controllers.analytics import analytics_bp
+from controllers.federation import federation_bp
 
-CORS(app)
+CORS(app, expose_headers=['ETag', 'X-State-Version'])  # read by the client to revalidate /getprinterinfo
 
 @app.before_request
 def handle_preflight():
@@ -51,7 +64,7 @@ def handle_preflight():
         res.headers['X-Content-Type-Options'] = '*'
         res.headers['Access-Control-Allow-Origin'] = '*'
         res.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        res.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+        res.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, If-None-Match'
         return res
 
 # Serve static files
@@ -79,39 +92,56 @@ app.register_blueprint(ports_bp)
 app.register_blueprint(jobs_bp)
 app.register_blueprint(status_bp)
 app.register_blueprint(issue_bp)
+app.register_blueprint(analytics_bp)
+app.register_blueprint(federation_bp)
     
 @app.socketio.on('ping')
 def handle_ping():
-    app.socketio.emit('pong')
+    emit('pong') # reply to the client that pinged, not everyone
 
 # own thread
 with app.app_context():
     try:
-        # Creating printer threads from registered printers on server start 
-        res = getRegisteredPrinters() # gets registered printers from DB 
-        data = res[0].get_json() # converts to JSON 
-        printers_data = data.get("printers", []) # gets the values w/ printer data
-        printer_status_service.create_printer_threads(printers_data)
-        
+        eventService.start(app) # batched writer for the job event log and daily rollups
+
         # Create in-memory uploads folder 
         uploads_folder = os.path.join('../uploads')
         tempcsv = os.path.join('../tempcsv')
 
-        if os.path.exists(uploads_folder):
-            # Remove the uploads folder and all its contents
-            shutil.rmtree(uploads_folder)
-            shutil.rmtree(tempcsv)
-
-            # Recreate it as an empty directory
-            os.makedirs(uploads_folder)
-            os.makedirs(tempcsv)
-
-            print("Uploads folder recreated as an empty directory.")
+        if not owns_printers:
+            # API or print worker: the process running the printers clears the uploads folder when it starts
+            os.makedirs(uploads_folder, exist_ok=True)
+            os.makedirs(tempcsv, exist_ok=True)
         else:
-            # Create the uploads folder if it doesn't exist
-            os.makedirs(uploads_folder)
-            os.makedirs(tempcsv)
-            print("Uploads folder created successfully.")  
+            if telemetryService.enabled():
+                telemetryService.create() # shared status table, filled in as the printer threads start
+            # Creating printer threads from registered printers on server start 
+            res = getRegisteredPrinters() # gets registered printers from DB 
+            data = res[0].get_json() # converts to JSON 
+            printers_data = data.get("printers", []) # gets the values w/ printer data
+            printer_status_service.create_printer_threads(printers_data)
+            printer_status_service.restoreFarmQueue() # unbound jobs waiting in the DB from before the restart
+            if Config.get('failover'):
+                printer_status_service.start_failover_thread()
+            etaService.start(app) # periodically refit the learned ETA correction
+            if Config.get('federation_role') == 'node':
+                federationService.startNode(app, printer_status_service) # report printers to the coordinator
+
+            if os.path.exists(uploads_folder):
+                # Remove the uploads folder and all its contents
+                shutil.rmtree(uploads_folder)
+                shutil.rmtree(tempcsv)
+
+                # Recreate it as an empty directory
+                os.makedirs(uploads_folder)
+                os.makedirs(tempcsv)
+
+                print("Uploads folder recreated as an empty directory.")
+            else:
+                # Create the uploads folder if it doesn't exist
+                os.makedirs(uploads_folder)
+                os.makedirs(tempcsv)
+                print("Uploads folder created successfully.")  
     except Exception as e:
         print(f"Unexpected error: {e}")
             
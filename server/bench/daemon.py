@@ -0,0 +1,138 @@
+# API latency with the printers in the API process vs in the printer daemon (printerDaemon): N simulated printers
+# (sim://, 1 ms per command) each print a long job while T client threads call /getprinterinfo, /getprinters and
+# /getjobs through the Flask test client for a few seconds. with printerDaemon off the printer threads share the
+# API process (and its GIL); on, they run in printerdaemon.py and the API forwards to it over the unix socket.
+# each mode runs in a process of its own, since app.py reads the config once; prints requests per second and the
+# p50/p99 latency per mode
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import harness
+
+LINES = 60000
+GCODE = ";FLAVOR:Marlin\n;TIME:60\n" + "".join(f"G1 X{n % 200}.12 Y{(n * 7) % 200}.5 E{n * 0.01:.4f} F1800 ; move\n" for n in range(LINES))
+ENDPOINTS = ['/getprinterinfo', '/getprinters', '/getjobs?page=1&pageSize=10']
+
+
+def waitFor(condition, timeout, what):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if condition():
+                return
+        except Exception:
+            pass  # the daemon isn't listening yet
+        time.sleep(0.2)
+    raise RuntimeError(f"timed out waiting for {what}")
+
+
+def startPrinters(app, count, daemon):
+    # registers the printers and starts their threads here, or in a printer daemon process that's returned
+    from app import printer_status_service
+    from models.db import db
+    from models.printers import Printer
+
+    with app.app_context():
+        db.session.add_all([Printer(f"sim://bench{n}?delay=0.001", f"bench {n}", f"SIM:BENCH{n}", f"bench {n}") for n in range(count)])
+        db.session.commit()
+        data = Printer.get_registered_printers()[0].get_json()['printers']
+        db.session.remove()
+    if not daemon:
+        printer_status_service.create_printer_threads(data)
+        return None
+    process = subprocess.Popen([sys.executable, os.path.join(harness.SERVER_DIR, 'printerdaemon.py')],
+                               env={**os.environ, 'QVIEW3D_ROLE': 'daemon'}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    waitFor(lambda: len(printer_status_service.printerStatuses()) == count, 60, "the printer daemon")
+    return process
+
+
+def startPrints(app, count):
+    from app import printer_status_service
+
+    client = app.test_client()
+    for printer_id in range(1, count + 1):
+        client.post('/setstatus', json={'printerid': printer_id, 'status': 'ready'})
+        client.post('/addjobtoqueue', data={
+            'file': (io.BytesIO(GCODE.encode()), 'bench.gcode'), 'name': f"bench {printer_id}", 'printerid': printer_id,
+            'favorite': 'false', 'td_id': 0, 'filament': '', 'priority': 'false',
+        })
+    waitFor(lambda: [status for _, status in printer_status_service.printerStatuses()] == ['printing'] * count, 120, "the prints to start")
+
+
+def load(app, threads, duration):
+    latencies = []
+    stop = time.perf_counter() + duration
+
+    def run(offset):
+        client = app.test_client()
+        n = offset
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            response = client.get(ENDPOINTS[n % len(ENDPOINTS)])
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, f"{ENDPOINTS[n % len(ENDPOINTS)]}: {response.status_code}"
+            n += 1
+
+    workers = [threading.Thread(target=run, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    latencies.sort()
+    return {
+        'rps': len(latencies) / duration,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p99': latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def measure(args):
+    daemon = args.mode == 'on'
+    with contextlib.redirect_stdout(io.StringIO()):  # startup and the print loops' logging
+        settings = {'printerDaemon': True, 'daemonSocket': os.path.join(tempfile.mkdtemp(), 'daemon.sock')} if daemon else {}
+        app = harness.loadApp(**settings)
+        process = None
+        try:
+            process = startPrinters(app, args.printers, daemon)
+            startPrints(app, args.printers)
+            result = load(app, args.threads, args.duration)
+        finally:
+            if process:
+                process.terminate()
+            from services import uploadService
+            uploadService.getPool().shutdown()  # its processes would hold the parent's output pipe open
+    print(json.dumps(result), flush=True)
+    os._exit(0)  # the printer threads are mid-print; nothing here needs them to finish
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--printers', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=8, help="concurrent API clients")
+    parser.add_argument('--duration', type=float, default=10, help="seconds of load per mode")
+    parser.add_argument('--mode', choices=['on', 'off'], help="measure one mode in this process")
+    args = parser.parse_args()
+    if args.mode:
+        return measure(args)
+    print(f"{args.printers} printers printing, {args.threads} API clients for {args.duration:.0f} s")
+    print("printerDaemon   requests/s    p50 ms    p99 ms")
+    for mode in ('off', 'on'):
+        run = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode, '--printers', str(args.printers),
+                              '--threads', str(args.threads), '--duration', str(args.duration)], capture_output=True, text=True)
+        if run.returncode != 0:
+            print(f"{mode:13s}   failed: {(run.stderr.strip().splitlines() or ['no output'])[-1]}")
+            continue
+        result = json.loads(run.stdout.strip().splitlines()[-1])
+        print(f"{mode:13s}   {result['rps']:10.0f}  {result['p50']:8.1f}  {result['p99']:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
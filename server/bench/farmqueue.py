@@ -0,0 +1,130 @@
+# farm queue vs binding at submission: 10 printers of three families (4 MK4, 4 MK3, 2 Ender; 2 of them loaded
+# with PETG), 300 jobs submitted at once, each sliced for one family or any, some needing PETG. actual print
+# times are 0.75-1.35x the slicer estimate, and 5% of jobs take 3x. early binding queues every job up front with
+# schedulerService.pickPrinter (the ETA scheduler); late binding puts them in a queueService.FarmQueue and each
+# printer claims its next job when it finishes the last one. prints makespan and utilization per seed
+import argparse
+import heapq
+import math
+import random
+from datetime import datetime
+
+import harness  # noqa: F401  (puts the server modules on the path)
+from services import queueService, schedulerService
+
+HOUR = 60 * 60
+FAMILIES = [('2C99:000D', 'MK4')] * 4 + [('2C99:0002', 'MK3')] * 4 + [('1A86:7523', 'ENDER')] * 2
+PETG_PRINTERS = {4, 8}
+
+
+class Job:
+    def __init__(self, id, estimate, actual, filament, model):
+        self.id = id
+        self.name = f"job {id}"
+        self.status = 'inqueue'
+        self.date = datetime(2024, 1, 1)
+        self.file_name_original = f"job{id}.gcode"
+        self.favorite = 0
+        self.td_id = 0
+        self.profile = ''
+        self.estimated_time = estimate
+        self.actual = actual
+        self.filament = filament
+        self.model = model
+
+    def getEstimatedTime(self):
+        return self.estimated_time
+
+    def getStatus(self):
+        return self.status
+
+
+class JobQueue(list):
+    def getSize(self):
+        return len(self)
+
+
+class Printer:
+    def __init__(self, id, hwid, filament):
+        self.id = id
+        self.hwid = f"USB VID:PID={hwid}"
+        self.filament = filament
+        self.queue = JobQueue()
+
+    def getStatus(self):
+        return 'ready'
+
+    def getQueue(self):
+        return self.queue
+
+
+def farm():
+    return [
+        Printer(id, hwid, 'PETG' if id in PETG_PRINTERS else 'PLA')
+        for id, (hwid, _) in enumerate(FAMILIES, start=1)
+    ]
+
+
+def makeJobs(count, rng):
+    low, high = math.log(30 * 60), math.log(12 * HOUR)
+    jobs = []
+    for id in range(count):
+        estimate = math.exp(rng.uniform(low, high))
+        actual = estimate * rng.uniform(0.75, 1.35) * (3 if rng.random() < 0.05 else 1)
+        model = rng.choices(['MK4S', 'MK3S', 'ENDER3', ''], weights=[4, 3, 1, 2])[0]
+        filament = 'PETG' if rng.random() < 0.1 else rng.choice(['PLA', ''])
+        jobs.append(Job(id, round(estimate), actual, filament, model))
+    return jobs
+
+
+def result(printers, finished, worked):
+    # (makespan in hours, utilization): utilization is time spent printing over printers x makespan
+    makespan = max(finished.values())
+    return makespan / HOUR, worked / (len(printers) * makespan)
+
+
+def earlyBinding(jobs):
+    printers = farm()
+    by_id = {printer.id: printer for printer in printers}
+    for job in jobs:
+        printer_id = schedulerService.pickPrinter(printers, job.filament, job.model)
+        if printer_id is not None:  # None: no printer can take it, it isn't printed by either strategy
+            by_id[printer_id].getQueue().append(job)
+    finished = {printer.id: sum(job.actual for job in printer.getQueue()) for printer in printers}
+    return result(printers, finished, sum(finished.values()))
+
+
+def lateBinding(jobs):
+    printers = farm()
+    by_id = {printer.id: printer for printer in printers}
+    queue = queueService.FarmQueue()
+    queue.addMany([(job, job.filament, job.model, None, False) for job in jobs])
+    finished = {printer.id: 0 for printer in printers}
+    worked = 0
+    ready = [(0, printer.id) for printer in printers]  # (time the printer is done with its job, printer id)
+    while ready:
+        now, printer_id = heapq.heappop(ready)
+        job = queue.claim(by_id[printer_id])
+        if job is None:
+            continue  # nothing left that it can print
+        finished[printer_id] = now + job.actual
+        worked += job.actual
+        heapq.heappush(ready, (now + job.actual, printer_id))
+    return result(printers, finished, worked)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=300)
+    parser.add_argument('--seeds', type=int, default=3)
+    args = parser.parse_args()
+    print(f"{len(FAMILIES)} printers, {args.jobs} jobs; makespan in hours, utilization of the farm until then")
+    for seed in range(args.seeds):
+        jobs = makeJobs(args.jobs, random.Random(seed))
+        early, early_use = earlyBinding(jobs)
+        late, late_use = lateBinding(jobs)
+        print(f"seed {seed}: makespan {early:.1f} -> {late:.1f}, utilization {early_use:.0%} -> {late_use:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# shared setup for the bench scripts. each script prints what it measured; run them with python from anywhere,
+# e.g. python server/bench/scheduler.py. scripts that drive the models call loadApp first, which gives them a
+# throwaway config, database and working directory the way tests/conftest.py does for the tests
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+os.environ.setdefault('QVIEW3D_CONFIG', os.path.join(SERVER_DIR, 'config', 'config.json'))
+
+
+def loadApp(**settings):
+    # imports app.py against a temporary config.json with settings added to it and returns the Flask app.
+    # call it before anything imports models.config
+    root = tempfile.mkdtemp(prefix='qview3d-bench-')
+    atexit.register(shutil.rmtree, root, True)
+    os.makedirs(os.path.join(root, 'run'))
+    os.makedirs(os.path.join(root, 'uploads'))
+    os.makedirs(os.path.join(root, 'tempcsv'))
+    with open(os.path.join(root, 'config.json'), 'w') as f:
+        json.dump({"environment": "development", "databaseURI": os.path.join(root, 'qview3d'), **settings}, f)
+    os.environ['QVIEW3D_CONFIG'] = os.path.join(root, 'config.json')
+    os.chdir(os.path.join(root, 'run'))
+    from app import app
+    from models.db import db
+    with app.app_context():
+        db.create_all()
+    return app
@@ -0,0 +1,99 @@
+# MeatPack on the serial link: a dense 4500-segment job (short G1 moves, the case packing is for) printed with
+# PrinterRuntime.execute on a simulated printer whose writes take as long as they would at 115200 baud, with no
+# per-command delay, so the link is the bottleneck. runs it plain, packed, and packed against firmware without
+# MeatPack (where connect() has to fall back to plain text), and prints bytes sent and lines per second.
+# also round-trips 5000 mixed commands through the packer and the firmware-side decoder first
+import argparse
+import contextlib
+import gzip
+import io
+import random
+import time
+
+import harness
+
+SEGMENTS = 4500
+DEVICE = "sim://meatpack?delay=0&baud=115200"
+
+
+def roundTrip(rng, count):
+    from Classes import MeatPack
+
+    commands = [rng.choice([
+        f"G1 X{rng.uniform(0, 250):.3f} Y{rng.uniform(0, 210):.3f} E{rng.uniform(0, 1):.5f}",
+        f"G0 F{rng.randint(100, 9000)} Z{rng.uniform(0, 5):.2f}",
+        f"G2 X1 Y2 I-{rng.random():.3f} J0.5",
+        "M117 Layer 3 of 40", "M104 S215", "M23 QV000001.GCO", "T0", "M73 P12 R40",
+    ]) for _ in range(count)]
+    unpacker = MeatPack.Unpacker()
+    unpacker.on = unpacker.no_spaces = True
+    decoded = unpacker.feed(b"".join(MeatPack.pack(command) for command in commands)).split("\n")[:-1]
+    # what the firmware reads back is the compacted command, with a space padding odd-length lines
+    expected = [MeatPack.compact(command) for command in commands]
+    expected = [line + (" " if len(line.encode()) % 2 == 0 else "") for line in expected]
+    assert decoded == expected, "MeatPack round trip changed a command"
+
+
+def denseGcode(rng):
+    lines = [";FLAVOR:Marlin\n", ";TIME:100\n", "G28\n"]
+    x = y = 0.0
+    for z in range(1, 4):
+        lines += [";LAYER_CHANGE\n", f";Z:{z * 0.2:.1f}\n"]
+        for _ in range(SEGMENTS // 3):
+            x += rng.uniform(-0.8, 0.8)
+            y += rng.uniform(-0.8, 0.8)
+            lines.append(f"G1 X{100 + x:.3f} Y{100 + y:.3f} E{rng.uniform(0.01, 0.05):.5f} ; perimeter\n")
+    return "".join(lines)
+
+
+def run(app, gcode, device, meatpack):
+    # (verdict, whether packing was on, bytes written, seconds)
+    from models.config import Config
+    from models.db import db
+    from models.jobs import Job, JobRuntime
+    from models.printers import PrinterRuntime
+
+    Config['meatpack'] = meatpack
+    with app.app_context():
+        row = Job(gzip.compress(gcode.encode()), 'meatpack', None, 'printing', 'dense.gcode', 0, 0, None)
+        row.ingest_status = 'ready'
+        db.session.add(row)
+        db.session.commit()
+        job = JobRuntime.load([row.id])[0]
+        db.session.remove()
+        job.setFileName(f"dense_{job.id}.gcode")
+        job.status = 'printing'
+        printer = PrinterRuntime(device, 'bench', 'bench', 'bench', status='printing', id=1)
+        start = time.perf_counter()
+        verdict = printer.execute(job)
+        elapsed = time.perf_counter() - start
+        packing, sent = printer.meatpack, printer.ser.bytes_written
+        printer.disconnect()
+    return verdict, packing, sent, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = harness.loadApp()
+    roundTrip(rng, 5000)
+    print("5000 mixed commands round-trip through the packer and decoder")
+    gcode = denseGcode(rng)
+    plain = None
+    for name, device, meatpack in (
+        ("plain", DEVICE, False),
+        ("meatpack", DEVICE, True),
+        ("meatpack, firmware without it", f"{DEVICE}&meatpack=0", True),
+    ):
+        with contextlib.redirect_stdout(io.StringIO()):  # the print loop's own logging
+            verdict, packing, sent, elapsed = run(app, gcode, device, meatpack)
+        plain = plain or sent
+        print(f"{name:30s} {verdict:8s} packing {'on ' if packing else 'off'}  {sent:7d} bytes ({100 * (sent / plain - 1):+.1f}%)"
+              f"  {elapsed:5.1f} s  {SEGMENTS / elapsed:4.0f} lines/s")
+
+
+if __name__ == '__main__':
+    main()
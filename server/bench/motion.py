@@ -0,0 +1,50 @@
+# MotionAnalyzer on a slicer-sized file: 200 layers of perimeter/infill moves with comments, retracts and the odd
+# arc, about 400k lines. times the time profile the upload pool computes for it (best of --runs) and prints
+# lines per second
+import argparse
+import random
+import time
+
+import harness  # noqa: F401 (puts the server directory on the path)
+
+from Classes import MotionAnalyzer
+
+
+def slicerGcode(rng, layers, moves):
+    lines = [";FLAVOR:Marlin\n", ";TIME:7200\n", "M204 P1250\n", "G28 ; home all\n", "G90\n", "M83\n", "G92 E0\n"]
+    x, y = 125.0, 105.0
+    for layer in range(1, layers + 1):
+        lines += [";LAYER_CHANGE\n", f";Z:{layer * 0.2:.1f}\n", f"G1 Z{layer * 0.2:.1f} F720\n", "G1 E-0.8 F2100 ; retract\n"]
+        lines.append(f"G0 X{x:.3f} Y{y:.3f} F9000\n")
+        lines.append("G1 E0.8 F2100\n;TYPE:Perimeter\nG1 F1800\n")
+        for move in range(moves):
+            x = min(max(x + rng.uniform(-2, 2), 20), 230)
+            y = min(max(y + rng.uniform(-2, 2), 20), 190)
+            if move % 250 == 0:
+                lines.append(f"G2 X{x:.3f} Y{y:.3f} I{rng.uniform(-2, 2):.3f} J{rng.uniform(-2, 2):.3f} E0.2\n")
+            else:
+                lines.append(f"G1 X{x:.3f} Y{y:.3f} E{rng.uniform(0.01, 0.08):.5f}\n")
+    return "".join(lines + ["M104 S0\n", "M140 S0\n"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--layers', type=int, default=200)
+    parser.add_argument('--moves', type=int, default=2000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    text = slicerGcode(random.Random(args.seed), args.layers, args.moves)
+    lines = text.count("\n")
+    best = None
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        cumulative = MotionAnalyzer.analyze(text, 'MK4')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{lines} lines ({len(text) / 1e6:.1f} MB), {len(cumulative)} commands, {cumulative[-1] / 3600:.1f} h estimated")
+    print(f"best of {args.runs}: {best * 1000:.0f} ms, {lines / best / 1e6:.2f}M lines/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# auto-queue placement: 10 printers, 200 jobs submitted at once with slicer estimates from 10 minutes to 30 hours
+# (log-uniform), placed one by one either on the printer with the fewest queued jobs (the old getSmallestQueue)
+# or by schedulerService.pickPrinter. prints the makespan, the hours until the last printer is done, per seed,
+# next to the lower bound no placement can beat
+import argparse
+import math
+import random
+
+import harness  # noqa: F401  (puts the server modules on the path)
+from services import schedulerService
+
+HOUR = 60 * 60
+
+
+class Job:
+    def __init__(self, id, estimate):
+        self.id = id
+        self.estimated_time = estimate
+        self.status = 'inqueue'
+        self.profile = ''
+
+    def getEstimatedTime(self):
+        return self.estimated_time
+
+    def getStatus(self):
+        return self.status
+
+
+class JobQueue(list):
+    def getSize(self):
+        return len(self)
+
+
+class Printer:
+    def __init__(self, id):
+        self.id = id
+        self.hwid = ''
+        self.filament = ''
+        self.queue = JobQueue()
+
+    def getStatus(self):
+        return 'ready'
+
+    def getQueue(self):
+        return self.queue
+
+
+def fewestJobs(printers):
+    return min(printers, key=lambda printer: printer.getQueue().getSize()).id
+
+
+def pickPrinter(printers):
+    return schedulerService.pickPrinter(printers)
+
+
+def makespan(jobs, printer_count, place):
+    printers = [Printer(id) for id in range(1, printer_count + 1)]
+    by_id = {printer.id: printer for printer in printers}
+    for job in jobs:
+        by_id[place(printers)].getQueue().append(job)
+    return max(sum(job.estimated_time for job in printer.getQueue()) for printer in printers) / HOUR
+
+
+def mixedJobs(count, rng):
+    low, high = math.log(10 * 60), math.log(30 * HOUR)
+    return [Job(id, round(math.exp(rng.uniform(low, high)))) for id in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--printers', type=int, default=10)
+    parser.add_argument('--jobs', type=int, default=200)
+    parser.add_argument('--seeds', type=int, default=3)
+    args = parser.parse_args()
+    print(f"{args.printers} printers, {args.jobs} jobs of 10 min to 30 h; makespan in hours")
+    for seed in range(args.seeds):
+        jobs = mixedJobs(args.jobs, random.Random(seed))
+        before = makespan(jobs, args.printers, fewestJobs)
+        after = makespan(jobs, args.printers, pickPrinter)
+        bound = max(sum(job.estimated_time for job in jobs) / args.printers, max(job.estimated_time for job in jobs)) / HOUR
+        print(f"seed {seed}: fewest jobs {before:.1f}  pickPrinter {after:.1f}  ({100 * (1 - after / before):.0f}% shorter)"
+              f"  lower bound {bound:.1f}")
+
+
+if __name__ == '__main__':
+    main()
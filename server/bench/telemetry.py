@@ -0,0 +1,76 @@
+# outbound telemetry: 1000 events from 30 printers (80% gcode_viewer, 10% progress_update, 10% temp_update),
+# flushed in batches of 100 the way outboundService.flush sends them, either as one socket.io JSON event each or
+# packed into one binary 'telemetry' frame per batch (outboundService.pack). prints the bytes on the wire
+# (engine.io message prefix included) and the CPU time it takes to build the packets
+import argparse
+import random
+import time
+
+import harness  # noqa: F401  (puts the server modules on the path)
+from socketio import packet
+from services import outboundService
+
+PRINTERS = 30
+BATCH = 100
+
+
+def makeEvents(count, rng):
+    events = []
+    for n in range(count):
+        printer_id = rng.randrange(1, PRINTERS + 1)
+        job_id = 1000 + printer_id
+        kind = rng.random()
+        if kind < 0.8:
+            events.append(('gcode_viewer', {'job_id': job_id, 'gcode_num': n * 7 + printer_id}))
+        elif kind < 0.9:
+            events.append(('progress_update', {'job_id': job_id, 'progress': rng.uniform(0, 100)}))
+        else:
+            events.append(('temp_update', {'printerid': printer_id, 'extruder_temp': rng.uniform(200, 215),
+                                           'bed_temp': rng.uniform(58, 62)}))
+    return events
+
+
+def wireSize(encoded):
+    # engine.io sends a text packet as a '4' message and each binary attachment as a frame of its own
+    if isinstance(encoded, list):
+        return 1 + len(encoded[0].encode()) + sum(len(attachment) for attachment in encoded[1:])
+    return 1 + len(encoded.encode())
+
+
+def encodeJson(batches):
+    return [packet.Packet(packet.EVENT, data=[event, data]).encode() for batch in batches for event, data in batch]
+
+
+def encodePacked(batches):
+    encoded = []
+    for batch in batches:
+        frame, rest = outboundService.pack(batch)
+        encoded.append(packet.Packet(packet.EVENT, data=['telemetry', frame]).encode())
+        encoded.extend(packet.Packet(packet.EVENT, data=[event, data]).encode() for event, data in rest)
+    return encoded
+
+
+def cpuTime(encode, batches, repeats):
+    start = time.process_time()
+    for _ in range(repeats):
+        encode(batches)
+    return (time.process_time() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+    events = makeEvents(args.events, random.Random(0))
+    batches = [events[start:start + BATCH] for start in range(0, len(events), BATCH)]
+    print(f"{args.events} events from {PRINTERS} printers in batches of {BATCH}")
+    for name, encode in (('json', encodeJson), ('packed', encodePacked)):
+        encoded = encode(batches)
+        size = sum(wireSize(item) for item in encoded)
+        cpu = cpuTime(encode, batches, args.repeats)
+        print(f"{name:7s} {len(encoded):5d} packets  {size / 1000:6.1f} KB  {cpu * 1000:5.2f} ms CPU")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# print loops in printer threads vs in print worker processes (printWorkers): N simulated printers
+# (sim://, 2 ms per command) each print a 1500-line job at the same time, either with PrinterRuntime.execute in a
+# thread per printer, or handed to a PrintWorkerPool of printerworker.py processes the way the printer threads do.
+# a probe thread in this process sleeps 10 ms at a time and records how late it wakes up, standing in for request
+# handling. prints the slowdown (wall time over 1500 x 2 ms) and the probe's p99 lateness per printer count
+import argparse
+import contextlib
+import gzip
+import io
+import os
+import tempfile
+import threading
+import time
+
+import harness
+
+LINES = 1500
+DELAY = 0.002
+GCODE = ";FLAVOR:Marlin\n;TIME:3\n" + "".join(f"G1 X{n % 200}.12 Y{(n * 7) % 200}.5 E{n * 0.01:.4f} F1800 ; move\n" for n in range(LINES))
+
+
+def probe(stop, lateness):
+    while not stop.is_set():
+        start = time.perf_counter()
+        time.sleep(0.01)
+        lateness.append(time.perf_counter() - start - 0.01)
+
+
+def makeJobs(app, count):
+    from models.db import db
+    from models.jobs import Job, JobRuntime
+    from Classes import MotionAnalyzer
+
+    profile = MotionAnalyzer.toBytes(MotionAnalyzer.analyze(GCODE.splitlines(True)))
+    with app.app_context():
+        rows = [Job(gzip.compress(GCODE.encode()), f"bench {n}", None, 'printing', 'bench.gcode', 0, 0, None) for n in range(count)]
+        for row in rows:
+            row.ingest_status = 'ready'
+            row.time_profile = profile
+        db.session.add_all(rows)
+        db.session.commit()
+        jobs = JobRuntime.load([row.id for row in rows])
+        db.session.remove()
+    for job in jobs:
+        job.setFileName(f"bench_{job.id}.gcode")
+        job.status = 'printing'
+    return jobs
+
+
+def measure(app, count, pool):
+    from models.printers import PrinterRuntime
+
+    printers = [PrinterRuntime(f"sim://bench{n}?delay={DELAY}", 'bench', 'bench', f"bench {n}", status='printing', id=n + 1)
+                for n in range(count)]
+    jobs = makeJobs(app, count)
+    verdicts = []
+
+    def run(printer, job):
+        with app.app_context():
+            if pool:
+                printer.worker = pool.assign(printer.id)
+                verdicts.append(printer.worker.run(printer, job))
+            else:
+                verdicts.append(printer.execute(job))
+                printer.disconnect()
+
+    lateness, stop = [], threading.Event()
+    prober = threading.Thread(target=probe, args=(stop, lateness))
+    prober.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run, args=pair) for pair in zip(printers, jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+    lateness.sort()
+    p99 = lateness[int(len(lateness) * 0.99)] * 1000 if lateness else 0
+    failed = sum(verdict != "complete" for verdict in verdicts)
+    return elapsed / (LINES * DELAY), p99, failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--printers', default='10,20,40,80,160', help="comma separated printer counts")
+    parser.add_argument('--workers', type=int, default=4, help="worker processes; 0 runs the threads only")
+    args = parser.parse_args()
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = harness.loadApp()
+    from services import workerService
+
+    pool = None
+    if args.workers:
+        workerService.SERVER_DIR = os.getcwd()  # workers get this run's scratch directory, not the server's uploads
+        pool = workerService.PrintWorkerPool(args.workers, os.path.join(tempfile.mkdtemp(), 'bench'))
+        with contextlib.redirect_stdout(io.StringIO()):  # the event streams retry until the workers are up
+            pool.start()
+    print(f"{os.cpu_count()} CPUs, {LINES} lines at {DELAY * 1000:.0f} ms per printer, {args.workers} workers")
+    print("printers   threaded slowdown / probe p99     workers slowdown / probe p99")
+    for count in (int(value) for value in args.printers.split(',')):
+        with contextlib.redirect_stdout(io.StringIO()):  # the print loop's own logging
+            results = [measure(app, count, None)] + ([measure(app, count, pool)] if pool else [])
+        line = f"{count:8d}" + "".join(f"   {slowdown:8.2f} / {p99:6.1f} ms     " for slowdown, p99, _ in results)
+        failed = sum(result[2] for result in results)
+        print((line + (f"({failed} prints failed)" if failed else "")).rstrip(), flush=True)
+    if pool:
+        for worker in pool.workers:
+            worker.process.terminate()
+
+
+if __name__ == '__main__':
+    main()
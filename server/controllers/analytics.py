@@ -0,0 +1,30 @@
+from flask import Blueprint, jsonify, request
+import json
+from models.jobevents import JobEvent, DailyRollup
+
+analytics_bp = Blueprint("analytics", __name__)
+
+# aggregated job statistics from the daily rollups, e.g. failure rate per printer or average queue wait
+@analytics_bp.route('/analytics', methods=["GET"])
+def getAnalytics():
+    try:
+        startdate = request.args.get('startdate', default='', type=str)
+        enddate = request.args.get('enddate', default='', type=str)
+        groupBy = request.args.get('groupBy', default='printer', type=str) # printer, issue, filament or day
+        printerIds = request.args.get('printerIds', type=json.loads)
+
+        res = DailyRollup.getAnalytics(startdate, enddate, groupBy, printerIds)
+        return jsonify(res)
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+@analytics_bp.route('/jobevents', methods=["GET"])
+def getJobEvents():
+    try:
+        job_id = request.args.get('jobid', default=-1, type=int)
+        res = JobEvent.getJobEvents(job_id)
+        return jsonify(res)
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
@@ -0,0 +1,131 @@
+import io
+from flask import Blueprint, jsonify, request
+from Classes import BGCode
+from models.jobs import Job
+from app import printer_status_service
+from services import federationService, uploadService
+
+# federated farm routes (services/federationService.py): report/nodes/dispatch are served by the coordinator,
+# blob/accept by the nodes
+federation_bp = Blueprint("federation", __name__)
+
+def checkRole(role):
+    # error response when the request isn't authorized or this server doesn't play that role, else None
+    if not federationService.authorized(request.headers):
+        return jsonify({"error": "Unauthorized"}), 403
+    if federationService.role() != role:
+        return jsonify({"error": f"This server is not a federation {role}"}), 400
+    return None
+
+@federation_bp.route('/federation/report', methods=["POST"])
+def nodeReport():
+    try:
+        error = checkRole('coordinator')
+        if error:
+            return error
+        data = request.get_json()
+        federationService.nodeReported({"name": data['name'], "url": data['url'], "printers": data['printers']})
+        return jsonify({"success": True})
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+# every node with its printers and their queues, the coordinator's farm-wide queue view
+@federation_bp.route('/federation/nodes', methods=["GET"])
+def getNodes():
+    try:
+        error = checkRole('coordinator')
+        if error:
+            return error
+        return jsonify(federationService.nodes())
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+# auto-queue across the nodes, or onto a given node/printer when node (and printerid) are sent
+@federation_bp.route('/federation/dispatch', methods=["POST"])
+def dispatchJob():
+    try:
+        error = checkRole('coordinator')
+        if error:
+            return error
+        file = request.files['file']
+        data = file.read()
+        filament = request.form.get('filament', '')
+        node_name = request.form.get('node') or None
+        printer_id = request.form.get('printerid', type=int)
+
+        metadata = {}
+        if BGCode.isBGCode(data[:4]):
+            metadata = uploadService.bgcodeMetadata(io.BytesIO(data))
+        elif not uploadService.detectCodec(data[:6]):
+            uploadService.scanMetadata(data, metadata) # the slicer's printer model steers the choice
+        if node_name and printer_id is not None:
+            node = federationService.getNode(node_name)
+            target = (node, printer_id) if node and node['online'] else None
+        else:
+            target = federationService.pickTarget(filament, metadata.get('printer_model', ''), node_name)
+        if target is None:
+            return jsonify({"success": False, "message": "No compatible printer available."}), 400
+
+        node, printer_id = target
+        res = federationService.dispatch(node, printer_id, data, {
+            "name": request.form['name'],
+            "file_name_original": file.filename,
+            "filament": filament,
+            "favorite": 1 if request.form.get('favorite') == 'true' else 0,
+            "td_id": request.form.get('td_id', 0, type=int),
+            "priority": request.form.get('priority') == 'true',
+        })
+        return jsonify({"success": True, "message": f"Job sent to {node['name']}.", "node": node['name'], "printer_id": printer_id, "job_id": res.get('id')}), 200
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+@federation_bp.route('/federation/blob/<digest>', methods=["GET"])
+def hasBlob(digest):
+    try:
+        error = checkRole('node')
+        if error:
+            return error
+        return jsonify({"exists": federationService.hasBlob(digest)})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+@federation_bp.route('/federation/blob/<digest>', methods=["POST"])
+def storeBlob(digest):
+    try:
+        error = checkRole('node')
+        if error:
+            return error
+        federationService.storeBlob(digest, request.get_data())
+        return jsonify({"success": True})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+# a job dispatched by the coordinator, whose file was sent to /federation/blob first
+@federation_bp.route('/federation/accept', methods=["POST"])
+def acceptJob():
+    try:
+        error = checkRole('node')
+        if error:
+            return error
+        data = request.get_json()
+        printer_id = int(data['printer_id'])
+        if printer_id not in [running_id for running_id, _ in printer_status_service.printerStatuses()]:
+            return jsonify({"error": f"Printer {printer_id} is not registered on this node"}), 400
+        blob = federationService.readBlob(data['digest'])
+        res = Job.jobHistoryInsert(data['name'], printer_id, 'inqueue', blob, data['file_name_original'], data.get('favorite', 0), data.get('td_id', 0)) # insert into DB
+        printer_status_service.enqueueJobs(printer_id, [(res['id'], bool(data.get('priority')))], data.get('filament', ''), res)
+        return jsonify({"success": True, "message": "Job added to printer queue.", "id": res['id']}), 200
+    except FileNotFoundError:
+        return jsonify({"error": "File not received"}), 400
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
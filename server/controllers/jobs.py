@@ -12,6 +12,8 @@ from werkzeug.utils import secure_filename
 import os 
 import gzip
 from flask import current_app
+from services import uploadService, schedulerService
+from models.config import Config
 import serial
 import serial.tools.list_ports
 
@@ -79,26 +81,11 @@ def add_job_to_queue():
         status = 'inqueue' # set status 
         res = Job.jobHistoryInsert(name, printer_id, status, file, file_name_original, favorite, td_id) # insert into DB 
         
-        # retrieve job from DB
         id = res['id']
-        
-        job = Job.query.get(id)
-        
-        base_name, extension = os.path.splitext(file_name_original)
-
-        # Append the ID to the base name
-        file_name_pk = f"{base_name}_{id}{extension}"
-        
-        job.setFileName(file_name_pk) # set unique in-memory file name 
-
-        job.setFilament(filament) # set filament type
 
         priority = request.form['priority']
         # if priotiry is '1' then add to front of queue, else add to back
-        if priority == 'true':
-            findPrinterObject(printer_id).getQueue().addToFront(job, printer_id)
-        else:
-            findPrinterObject(printer_id).getQueue().addToBack(job, printer_id)
+        printer_status_service.enqueueJobs(printer_id, [(id, priority == 'true')], filament, res)
                         
         return jsonify({"success": True, "message": "Job added to printer queue."}), 200
     
@@ -121,7 +108,8 @@ def auto_queue():
         favoriteOne = False 
         # for i in range(int(quantity)):
         status = 'inqueue' # set status 
-        printer_id = getSmallestQueue()
+        upload = uploadService.ingest(file) # ingest first so the slicer's printer model can steer the choice
+        model = upload.metadata.get('printer_model', '')
         
         if(favorite == 'true' and not favoriteOne):
             favorite = 1
@@ -129,23 +117,20 @@ def auto_queue():
         else: 
             favorite = 0
         # favorite = 1 if _favorite == 'true' else 0
-        
-        res = Job.jobHistoryInsert(name, printer_id, status, file, file_name_original, favorite, td_id) # insert into DB 
-        
-        id = res['id']
-        
-        job = Job.query.get(id)
-        
-        base_name, extension = os.path.splitext(file_name_original)
 
-        # Append the ID to the base name
-        file_name_pk = f"{base_name}_{id}{extension}"
-        
-        job.setFileName(file_name_pk) # set unique in-memory file name 
-
-        job.setFilament(filament) # set filament type
+        if Config.get('farm_queue'):
+            # late binding: the job waits in the farm queue until a compatible printer is ready
+            res = Job.jobHistoryInsert(name, None, status, upload, file_name_original, favorite, td_id)
+            printer_status_service.farmEnqueue([(res['id'], None, False)], filament, model, res)
+            return jsonify({"success": True, "message": "Job added to farm queue."}), 200
 
-        findPrinterObject(printer_id).getQueue().addToBack(job, printer_id)  
+        printer_id = getSmallestQueue(filament, model)
+        if printer_id is None:
+            return jsonify({"success": False, "message": "No compatible printer available."}), 400
+        
+        res = Job.jobHistoryInsert(name, printer_id, status, upload, file_name_original, favorite, td_id) # insert into DB 
+        
+        printer_status_service.enqueueJobs(printer_id, [(res['id'], False)], filament, res)
         
         return jsonify({"success": True, "message": "Job added to printer queue."}), 200
     
@@ -153,6 +138,96 @@ def auto_queue():
         print(f"Unexpected error: {e}")
         return jsonify({"error": "Unexpected error occurred"}), 500
 
+@jobs_bp.route('/batchqueue', methods=["POST"])
+def batch_queue():
+    try:
+        # one file fanned out to several targets: [{"printerid": <id> | "auto", "count": n, "priority": bool}, ...]
+        file = request.files['file']
+        file_name_original = file.filename
+        name = request.form['name']
+        favorite = 1 if request.form.get('favorite') == 'true' else 0
+        td_id = int(request.form['td_id'])
+        filament = request.form['filament']
+        targets = json.loads(request.form['targets'])
+
+        # explicit printer ids must be running printers, checked before anything is stored
+        running = {printer_id for printer_id, _ in printer_status_service.printerStatuses()}
+        for target in targets:
+            if target['printerid'] == 'auto':
+                continue
+            try:
+                target['printerid'] = int(target['printerid'])
+            except (TypeError, ValueError):
+                return jsonify({"success": False, "message": f"Invalid printer: {target['printerid']}"}), 400
+            if target['printerid'] not in running:
+                return jsonify({"success": False, "message": f"Printer {target['printerid']} not found."}), 400
+
+        upload = uploadService.ingest(file)
+        model = upload.metadata.get('printer_model', '')
+        estimate = upload.metadata.get('estimated_time') or schedulerService.UNKNOWN_JOB_TIME
+
+        # expand targets into one (printer id, priority) entry per copy, resolving "auto" as we go.
+        # with the farm queue on, "auto" copies get printer id None and wait there (optionally "pinned" to a printer)
+        farm = Config.get('farm_queue')
+        planned = {} # printer id -> seconds of work assigned by this batch so far
+        entries = []
+        pins = {} # entry index -> pinned printer id for farm entries
+        for target in targets:
+            priority = target.get('priority') in [True, 'true', 1]
+            pinned = target.get('pinned')
+            if pinned not in [None, '']:
+                # form JSON often carries the id as a string; the farm queue compares it to printer ids
+                try:
+                    pinned = int(pinned)
+                except (TypeError, ValueError):
+                    return jsonify({"success": False, "message": f"Invalid pinned printer: {pinned}"}), 400
+                if not Printer.findPrinter(pinned):
+                    return jsonify({"success": False, "message": f"Pinned printer {pinned} not found."}), 400
+            else:
+                pinned = None
+            for i in range(int(target.get('count', 1))):
+                if target['printerid'] == 'auto' and farm:
+                    pins[len(entries)] = pinned
+                    entries.append((None, priority))
+                    continue
+                if target['printerid'] == 'auto':
+                    printer_id = getSmallestQueue(filament, model, planned)
+                    if printer_id is None:
+                        return jsonify({"success": False, "message": "No compatible printer available."}), 400
+                else:
+                    printer_id = target['printerid']
+                planned[printer_id] = planned.get(printer_id, 0) + estimate
+                entries.append((printer_id, priority))
+
+        if not entries:
+            return jsonify({"success": False, "message": "No targets given."}), 400
+
+        status = 'inqueue'
+        res = Job.batchInsert(name, status, upload, file_name_original, favorite, td_id, [printer_id for printer_id, priority in entries])
+        if not res['success']:
+            return jsonify(res), 500
+        ids = res['ids']
+
+        # group by printer so each affected queue emits one update
+        by_printer = {}
+        farm_entries = []
+        for index, (id, (printer_id, priority)) in enumerate(zip(ids, entries)):
+            if printer_id is None:
+                farm_entries.append((id, pins.get(index), priority))
+            else:
+                by_printer.setdefault(printer_id, []).append((id, priority))
+
+        for printer_id, printer_jobs in by_printer.items():
+            printer_status_service.enqueueJobs(printer_id, printer_jobs, filament, res)
+        if farm_entries:
+            printer_status_service.farmEnqueue(farm_entries, filament, model, res)
+
+        return jsonify({"success": True, "message": f"{len(ids)} jobs added to printer queues.", "ids": ids}), 200
+
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
 @jobs_bp.route('/rerunjob', methods=["POST"])
 def rerun_job():
     try:
@@ -201,18 +276,14 @@ def remove_job():
         job = Job.findJob(jobpk) 
         printerid = job.getPrinterId() 
 
+        if printerid is None: # still waiting in the farm queue
+            printer_status_service.farmDelete(jobpk)
+            Job.update_job_status(jobpk, "cancelled")
+            return jsonify({"success": True, "message": "Job removed from farm queue."}), 200
+
         jobstatus = job.getStatus()
-        # retrieve printer object & corresponding queue
-        printerobject = findPrinterObject(printerid)
-        # printerobject.setStatus("complete")
-        queue = printerobject.getQueue()
-        inmemjob = queue.getJob(job)
-        if jobstatus == 'printing': # only change statuses, dont remove from queue 
-            printerobject.setStatus("complete")
-        else: 
-            queue.deleteJob(jobpk, printerid) 
-            
-        inmemjob.setStatus("cancelled")
+        # printing jobs only change status, the rest are removed from the queue
+        printer_status_service.cancelJob(printerid, jobpk, jobstatus == 'printing')
         Job.update_job_status(jobpk, "cancelled")
 
         return jsonify({"success": True, "message": "Job removed from printer queue."}), 200
@@ -236,17 +307,8 @@ def remove_job_from_queue():
             printerid = job.getPrinterId() 
 
             jobstatus = job.getStatus()
-            # retrieve printer object & corresponding queue
-            printerobject = findPrinterObject(printerid)
-            # printerobject.setStatus("complete")
-            queue = printerobject.getQueue()
-            inmemjob = queue.getJob(job)
-            if jobstatus == 'printing': # only change statuses, dont remove from queue 
-                printerobject.setStatus("complete")
-            else: 
-                queue.deleteJob(jobpk, printerid) 
-                
-            inmemjob.setStatus("cancelled")
+            # printing jobs only change status, the rest are removed from the queue
+            printer_status_service.cancelJob(printerid, jobpk, jobstatus == 'printing')
             Job.update_job_status(jobpk, "cancelled")
 
         return jsonify({"success": True, "message": "Job removed from printer queue."}), 200
@@ -263,30 +325,15 @@ def releasejob():
         key = data['key']
         job = Job.findJob(jobpk) 
         printerid = job.getPrinterId() 
-        printerobject = findPrinterObject(printerid)
-        printerobject.error = ""
-        queue = printerobject.getQueue()
-
-        queue.deleteJob(jobpk, printerid) # remove job from queue
-        
-        printerid = data['printerid']
-        
-        currentStatus = printerobject.getStatus()
 
+        # 1 = clear, 2 = clear and rerun at the front of the queue, 3 = fail
+        rerun = None
         if key == 3: 
             Job.update_job_status(jobpk, "error")
-            printerobject.setError(job.comments)
-            printerobject.setStatus("error") # printer ready to accept new prints 
-            
         elif key == 2: 
-            rerunjob(printerid, jobpk, "front")
+            rerun = (data['printerid'], rerunInsert(data['printerid'], jobpk))
             
-            if currentStatus!="offline":
-                printerobject.setStatus("ready") # printer ready to accept new prints 
-                
-        elif key == 1: 
-            if currentStatus!="offline":
-                printerobject.setStatus("ready") # printer ready to accept new prints 
+        printer_status_service.releaseJob(printerid, jobpk, key, job.comments, rerun)
             
         return jsonify({"success": True, "message": "Job released successfully."}), 200
     
@@ -302,17 +349,7 @@ def bumpjob():
         job_id = data['jobid']
         choice = data['choice']
         
-        printerobject = findPrinterObject(printer_id)
-        
-        if choice == 1: 
-            printerobject.queue.bump(True, job_id)
-        elif choice == 2: 
-            printerobject.queue.bump(False, job_id)
-        elif choice == 3: 
-            printerobject.queue.bumpExtreme(True, job_id, printer_id)
-        elif choice == 4: 
-            printerobject.queue.bumpExtreme(False, job_id, printer_id)
-        else: 
+        if not printer_status_service.bumpJob(printer_id, job_id, choice): 
             return jsonify({"error": "Unexpected error occurred"}), 500
         
         return jsonify({"success": True, "message": "Job bumped up in printer queue."}), 200
@@ -327,8 +364,7 @@ def moveJob():
         printer_id = data['printerid']
         arr = data['arr']
         
-        printerobject = findPrinterObject(printer_id)
-        printerobject.queue.reorder(arr)
+        printer_status_service.reorderQueue(printer_id, arr)
         return jsonify({"success": True, "message": "Queue updated successfully."}), 200
     except Exception as e:
         print(f"Unexpected error: {e}")
@@ -343,13 +379,6 @@ def updateJobStatus():
         
         res = Job.update_job_status(job_id, newstatus)
         
-        job = Job.findJob(job_id) 
-        printerid = job.getPrinterId() 
-        printerobject = findPrinterObject(printerid)
-        queue = printerobject.getQueue()
-        
-        # queue.deleteJob(job_id, printerid)
-        
         return jsonify(res), 200
     except Exception as e:
         print(f"Unexpected error: {e}")
@@ -366,10 +395,7 @@ def assignToError():
         
         job = Job.findJob(job_id) 
         printerid = job.getPrinterId() 
-        printerobject = findPrinterObject(printerid)
-        queue = printerobject.getQueue()
-        
-        queue.deleteJob(job_id, printerid)
+        printer_status_service.dequeueJob(printerid, job_id)
         
         return jsonify(res), 200
     except Exception as e:
@@ -387,13 +413,12 @@ def delete_job():
         printer_id = job.getPrinterId() 
         print("ID: ", printer_id)
         
-        if printer_id != 0:
-            # Retrieve printer object & corresponding queue
-            printer_object = findPrinterObject(printer_id)
-            queue = printer_object.getQueue()
-            
-            # Delete job from the queue
-            queue.deleteJob(job_id, printer_id) 
+        if printer_id is None:
+            # job never left the farm queue
+            printer_status_service.farmDelete(job_id)
+        elif printer_id != 0:
+            # Delete job from the printer's queue
+            printer_status_service.dequeueJob(printer_id, job_id)
 
             # Delete job from the database
         Job.delete_job(job_id)
@@ -411,9 +436,7 @@ def setStatus():
         printer_id = data['printerid']
         newstatus = data['status']
  
-        printerobject = findPrinterObject(printer_id)
-        
-        printerobject.setStatus(newstatus)
+        printer_status_service.setPrinterStatus(printer_id, newstatus)
         
         return jsonify({"success": True, "message": "Status updated successfully."}), 200
 
@@ -421,13 +444,28 @@ def setStatus():
         print(f"Unexpected error: {e}")
         return jsonify({"error": "Unexpected error occurred"}), 500
 
+@jobs_bp.route("/setfilament", methods=["POST"])
+def setFilament():
+    try:
+        data = request.get_json() # get json data 
+        printer_id = data['printerid']
+        filament = data['filament'] # empty string = accepts any filament
+
+        printer_status_service.setPrinterFilament(printer_id, filament)
+
+        return jsonify({"success": True, "message": "Filament updated successfully."}), 200
+
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
 @jobs_bp.route('/getfile', methods=["GET"])
 def getFile():
     try:
         job_id = request.args.get('jobid', default=-1, type=int)        
         job = Job.findJob(job_id) 
         file_blob = job.getFile()  # Assuming this returns the file blob
-        decompressed_file = gzip.decompress(file_blob).decode('utf-8')
+        decompressed_file = uploadService.decompress(file_blob).decode('utf-8')
         
         return jsonify({"file": decompressed_file, "file_name": job.getFileNameOriginal()}), 200
     except Exception as e:
@@ -509,11 +547,7 @@ def startPrint():
         data = request.get_json()
         printerid = data['printerid']
         jobid = data['jobid']
-        printerobject = findPrinterObject(printerid)
-        queue = printerobject.getQueue()
-        inmemjob = queue.getJobById(jobid)
-        print(inmemjob)
-        inmemjob.setReleased(1)
+        printer_status_service.startJob(printerid, jobid)
         
         return jsonify({"success": True, "message": "Job started successfully."}), 200
     except Exception as e:
@@ -588,8 +622,7 @@ def repair_ports():
             if printer is not None: 
                 if(printer.getDevice()!=port.device):
                     printer.editPort(printer.getId(), port.device)
-                    printerthread = findPrinterObject(printer.getId())
-                    printerthread.setDevice(port.device)
+                    printer_status_service.setPrinterDevice(printer.getId(), port.device)
         return {"success": True, "message": "Printer port(s) successfully updated."}
     except Exception as e:
         print(f"Unexpected error: {e}")
@@ -602,34 +635,23 @@ def refetch_time():
         jobid = data['jobid']
         printerid = data['printerid']
 
-        printer = findPrinterObject(printerid)
-        job = printer.getQueue().getNext()
-
-        timearray = job.job_time 
-
-        timejson = {
-            'total': timearray[0], 
-            'eta': timearray[1].isoformat(), 
-            'timestart': timearray[2].isoformat(), 
-            'pause': timearray[3].isoformat()
-        }
-
-        return jsonify(timejson) 
+        return jsonify(printer_status_service.jobTimes(printerid)) 
 
     except Exception as e:
         print(f"Unexpected error: {e}")
         return jsonify({"error": "Unexpected error occurred"}), 500    
     
-def findPrinterObject(printer_id): 
-    threads = printer_status_service.getThreadArray()
-    return list(filter(lambda thread: thread.printer.id == printer_id, threads))[0].printer  
-
-def getSmallestQueue():
-    threads = printer_status_service.getThreadArray()
-    smallest_queue_thread = min(threads, key=lambda thread: thread.printer.queue.getSize())
-    return smallest_queue_thread.printer.id
+def getSmallestQueue(filament='', model='', planned=None):
+    # printer that would finish its queue soonest, skipping faulted/offline and incompatible printers.
+    # returns None if no printer can take the job
+    return printer_status_service.pickPrinter(filament, model, planned)
     
 def rerunjob(printerpk, jobpk, position):
+    id = rerunInsert(printerpk, jobpk)
+    printer_status_service.enqueueJobs(printerpk, [(id, position != "back")])
+
+def rerunInsert(printerpk, jobpk):
+    # copy of the job as a new queued row on the given printer; returns the new id
     job = Job.findJob(jobpk) # retrieve Job to rerun 
     
     status = 'inqueue' # set status 
@@ -638,21 +660,6 @@ def rerunjob(printerpk, jobpk, position):
     td_id = job.getTdId()
     # Insert new job into DB and return new PK 
     res = Job.jobHistoryInsert(name=job.getName(), printer_id=printerpk, status=status, file=job.getFile(), file_name_original=file_name_original, favorite=favorite, td_id=td_id) # insert into DB 
-    
-    id = res['id']
-    file_name_pk = file_name_original + f"_{id}" # append id to file name to make it unique
-    
-    rjob = Job.query.get(id)
-    
-    base_name, extension = os.path.splitext(file_name_original)
-
-    # Append the ID to the base name
-    file_name_pk = f"{base_name}_{id}{extension}"
-    
-    rjob.setFileName(file_name_pk) # set unique file name 
-    
-    if position == "back":
-        findPrinterObject(printerpk).getQueue().addToBack(rjob, rjob.printer_id)
-    else: 
-        findPrinterObject(printerpk).getQueue().addToFront(rjob, rjob.printer_id)
+    Job.copyArcFile(job, res['id'])
+    return res['id']
         
\ No newline at end of file
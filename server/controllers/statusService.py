@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify
 from app import printer_status_service  # import the instance from app.py
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response
 from models.jobs import Job 
+from services import roomService, outboundService, telemetryService
 import os
 
 status_bp = Blueprint("status", __name__)
@@ -15,11 +16,83 @@ def getOpenThreads():
     pass 
 
 # this is the route that will be called by the UI to get the printers that have threads information
+# the snapshot is cached and versioned: it's tagged with the state version, so clients sending If-None-Match
+# get a 304 until something changes, and can follow up with /statedeltas?since=<X-State-Version>
 @status_bp.route('/getprinterinfo', methods=["GET"])
 def getPrinterInfo():
     try: 
-        printer_info = printer_status_service.retrieve_printer_info()  # call the method on the instance
-        return jsonify(printer_info)
+        version, etag, body = printer_status_service.printer_snapshot()  # call the method on the instance
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag, weak=True)  # weak: the body may carry newer telemetry under the same version
+        response.headers['X-State-Version'] = str(version)
+        return response.make_conditional(request)
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+# changes since a snapshot version; 410 means the history no longer reaches back that far and the client should refetch /getprinterinfo
+@status_bp.route('/statedeltas', methods=["GET"])
+def getStateDeltas():
+    try: 
+        since = request.args.get('since', default=0, type=int)
+        version, deltas = printer_status_service.stateDeltas(since)
+        if deltas is None:
+            return jsonify({"error": "Version too old, fetch a new snapshot", "version": version}), 410
+        return jsonify({"version": version, "deltas": deltas})
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+@status_bp.route('/getfarmqueue', methods=["GET"])
+def getFarmQueue():
+    try: 
+        return jsonify(printer_status_service.farmQueueInfo())
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+# subscriber count per socket.io room (farm, printers, printer:<id>, job:<id>)
+@status_bp.route('/rooms', methods=["GET"])
+def getRooms():
+    try: 
+        return jsonify(roomService.getCounts())
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+# telemetry frames sent, coalesced (replaced by a newer value) and dropped, overall and per event
+@status_bp.route('/outboundstats', methods=["GET"])
+def getOutboundStats():
+    try: 
+        return jsonify(outboundService.getStats())
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+@status_bp.route('/etamodel', methods=["GET"])
+def getEtaModel():
+    try: 
+        return jsonify(printer_status_service.etaFactors())
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+@status_bp.route('/printertelemetry', methods=["GET"])
+def getPrinterTelemetry():
+    try: 
+        # read straight from the shared table when it's on, even in an API worker with a printer daemon
+        rows = telemetryService.read() if telemetryService.enabled() else None
+        if rows is None:
+            rows = printer_status_service.telemetry()
+        return jsonify(rows)
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+@status_bp.route('/printworkers', methods=["GET"])
+def getPrintWorkers():
+    try: 
+        return jsonify(printer_status_service.workerStats())
     except Exception as e:
         print(f"Unexpected error: {e}")
         return jsonify({"error": "Unexpected error occurred"}), 500
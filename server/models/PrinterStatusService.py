@@ -1,11 +1,19 @@
 from threading import Thread
-from models.printers import Printer
+import os
+from models.printers import PrinterRuntime
 import serial
 import serial.tools.list_ports
 import time
+from datetime import datetime
 import requests
 from Classes.Queue import Queue
 from flask import jsonify 
+from models.config import Config
+from services.queueService import FarmQueue
+from services import stateService, roomService, telemetryService
+from services.registryService import PrinterRegistry
+from services.workerService import PrintWorkerPool
+from models.db import db, unitOfWork
 
 class PrinterThread(Thread):
     def __init__(self, printer, *args, **kwargs):
@@ -16,9 +24,19 @@ class PrinterStatusService:
     # in order to access the app context, we need to pass the app to the PrinterStatusService, mainly for the websockets
     def __init__(self, app):
         self.app = app
-        self.printer_threads = []  # array of printer threads
+        self.registry = PrinterRegistry()  # printer threads by id/hwid, in display order
+        self.farm_queue = FarmQueue()  # shared queue for late-bound jobs, used when farmQueue is on in config
+        self.fault_times = {}  # printer id -> when it was first seen in error/offline, for failover grace periods
+        self.failover_thread = None
+        # worker processes for the print loops when printWorkers is on, started with the first printer thread
+        workers = Config.get('print_workers')
+        self.print_workers = PrintWorkerPool(workers, Config.get('daemon_socket')) if workers else None
 
     def start_printer_thread(self, printer):
+        if self.print_workers:
+            self.print_workers.start()
+            printer.worker = self.print_workers.assign(printer.id)
+        telemetryService.register(printer.id, printer.status)
         # also pass the app to the printer thread
         thread = PrinterThread(printer, target=self.update_thread, args=(printer, self.app)) 
         thread.daemon = True #lets you kill the thread when the main program exits, allows for the server to be shut down
@@ -28,7 +46,7 @@ class PrinterStatusService:
     def create_printer_threads(self, printers_data):
         # all printer statuses initialized to be 'online.' Instantly changes to 'ready' on initialization -- test with 'reset printer' command.
         for printer_info in printers_data:
-            printer = Printer(
+            printer = PrinterRuntime(
                 id=printer_info["id"],
                 device=printer_info["device"],
                 description=printer_info["description"],
@@ -39,16 +57,18 @@ class PrinterStatusService:
             printer_thread = self.start_printer_thread(
                 printer
             )  # creating a thread for each printer object
-            self.printer_threads.append(printer_thread)
+            self.registry.add(printer_thread)
+        stateService.printersChanged()
 
         # creating separate thread to loop through all of the printer threads to ping them for print status
         self.ping_thread = Thread(target=self.pingForStatus)
 
     
     def queue_restore(self, printers_data, status, queue):
+        from models.jobs import Job
         # all printer statuses initialized to be 'online.' Instantly changes to 'ready' on initialization -- test with 'reset printer' command.
         for printer_info in printers_data:
-            printer = Printer(
+            printer = PrinterRuntime(
                 id=printer_info["id"],
                 device=printer_info["device"],
                 description=printer_info["description"],
@@ -58,13 +78,14 @@ class PrinterStatusService:
             for job in queue: 
                 if(job.status!='inqueue'):
                     job.setStatus('inqueue')
-                    job.setDBstatus(job.id, 'inqueue')
+                    Job.setDBstatus(job.id, 'inqueue')
             printer.setQueue(queue)
             printer.setStatus(status)
             printer_thread = self.start_printer_thread(
                 printer
             )  # creating a thread for each printer object
-            self.printer_threads.append(printer_thread)
+            self.registry.add(printer_thread)
+        stateService.printersChanged()
 
     # passing app here to access the app context
     def update_thread(self, printer, app):
@@ -75,138 +96,361 @@ class PrinterStatusService:
 
                 queueSize = printer.getQueue().getSize() # get size of queue 
                 printer.responseCount = 0 
+                if (status == "ready" and queueSize == 0 and printer.terminated == 0 and Config.get('farm_queue')):
+                    queueSize = self.pullFromFarmQueue(printer)
                 if (status == "ready" and queueSize > 0):
                     time.sleep(2) # wait for 2 seconds to allow the printer to process the queue
-                    if status != "offline": 
-                        printer.printNextInQueue()
+                    if status != "offline" and self.nextJobReady(printer): 
+                        try:
+                            printer.printNextInQueue()
+                        finally:
+                            db.session.remove() # don't carry this print's session into the next one
+
+    def nextJobReady(self, printer):
+        # the job at the front can start once its upload is stored in the row (the compression pool may run in
+        # another process); until then the printer waits and polls. a job whose upload failed is dropped
+        from models.jobs import Job
+        job = printer.getQueue().getNext()
+        with unitOfWork():
+            state = Job.getIngestStatus(job.id)
+        if state == 'failed':
+            printer.getQueue().deleteJob(job.id, printer.id)
+            job.setStatus('error')
+            return False
+        return state == 'ready'
+
+    def pullFromFarmQueue(self, printer):
+        # idle printer takes the first farm job it is compatible with. returns the new local queue size
+        job = self.farm_queue.claim(printer)
+        if job is not None:
+            from models.jobs import Job
+            with unitOfWork():
+                Job.bindToPrinter(job, printer)
+            printer.getQueue().addToBack(job, printer.id)
+        return printer.getQueue().getSize()
+
+    def start_failover_thread(self):
+        # one monitor thread for the whole farm; only started when failover is on in config
+        if self.failover_thread is None:
+            self.failover_thread = Thread(target=self.failover_loop, args=(self.app,))
+            self.failover_thread.daemon = True
+            self.failover_thread.start()
+
+    def failover_loop(self, app):
+        with app.app_context():
+            while True:
+                time.sleep(5)
+                try:
+                    with unitOfWork():
+                        self.checkFailover()
+                except Exception as e:
+                    print(f"Failover error: {e}")
+
+    def checkFailover(self, now=None):
+        now = now or time.time()
+        grace = {"error": Config.get('failover_error_grace'), "offline": Config.get('failover_offline_grace')}
+        for printer in self.registry.printers():
+            status = printer.getStatus()
+            if status not in grace:
+                self.fault_times.pop(printer.id, None)
+                continue
+            since = self.fault_times.setdefault(printer.id, now)
+            if now - since >= grace[status]:
+                self.redispatch(printer)
+
+    def redispatch(self, printer):
+        # move jobs that haven't started off a faulted printer, onto the healthy printer that would finish soonest
+        from models.jobs import Job
+        from services import schedulerService
+
+        waiting = [job.id for job in printer.getQueue() if job.getStatus() == 'inqueue' and job.getReleased() == 0]
+        if not waiting:
+            return []
+
+        others = [p for p in self.registry.printers() if p.id != printer.id]
+        planned = {} # seconds assigned to each printer during this pass
+        moves = []
+        deltas = [] # queue deltas, sent together in one event
+        for job in printer.getQueue().removeJobs(waiting):
+            if Config.get('farm_queue'):
+                target = None # hand it back to the farm queue instead of picking a printer now
+            else:
+                target_id = schedulerService.pickPrinter(others, job.filament, job.printer_model, planned)
+                target = next((p for p in others if p.id == target_id), None)
+                if target is None:
+                    deltas.append(printer.getQueue().addJobs([(job, False)], printer.id, emit=False)) # nowhere to go, keep it
+                    continue
+                planned[target.id] = planned.get(target.id, 0) + schedulerService.jobEstimate(job)
+            moves.append((job, target))
+
+        deltas.append(stateService.queueChanged(printer.id, printer.getQueue(), emit=False))
+        farm_jobs = []
+        for job, target in moves:
+            Job.bindToPrinter(job, target)
+            if target is None:
+                farm_jobs.append((job, job.filament, job.printer_model, None, False))
+                continue
+            deltas.append(target.getQueue().addJobs([(job, False)], target.id, emit=False))
+        if farm_jobs:
+            Job.setFarmConstraints([(job.id, filament, model, pinned) for job, filament, model, pinned, priority in farm_jobs])
+            self.farm_queue.addMany(farm_jobs)
+
+        # one consolidated update for every queue that changed
+        roomService.emit("queue_failover", {
+            "from": printer.id,
+            "moved": [{"jobid": job.id, "printerid": target.id if target else None} for job, target in moves],
+            "deltas": [delta for delta in deltas if delta],
+        }, [printer.id] + [target.id for job, target in moves if target])
+        return moves
+
+    # the printer management calls below return plain dicts (and raise on failure, which the controllers turn
+    # into a 500) so they can be sent back over the daemon socket as well
 
     def resetThread(self, printer_id):
-        try: 
-            for thread in self.printer_threads:
-                if thread.printer.id == printer_id:    
-                    printer = thread.printer
-                    printer.terminated = 1 
-                    thread_data = {
-                        "id": printer.id, 
-                        "device": printer.device,
-                        "description": printer.description,
-                        "hwid": printer.hwid,
-                        "name": printer.name, 
-                    }
-                    self.printer_threads.remove(thread)
-                    self.create_printer_threads([thread_data])
-                    break
-            return jsonify({"success": True, "message": "Printer thread reset successfully"})
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return jsonify({"success": False, "error": "Unexpected error occurred"}), 500
-        
+        thread = self.registry.get(printer_id)
+        if thread is not None:
+            printer = thread.printer
+            printer.terminate()
+            thread_data = {
+                "id": printer.id, 
+                "device": printer.device,
+                "description": printer.description,
+                "hwid": printer.hwid,
+                "name": printer.name, 
+            }
+            self.create_printer_threads([thread_data]) # the new thread takes the old one's place
+        return {"success": True, "message": "Printer thread reset successfully"}
     
     def queueRestore(self, printer_id, status):
-        try: 
-            for thread in self.printer_threads:
-                if thread.printer.id == printer_id:    
-                    printer = thread.printer
-                    printer.terminated = 1 
-                    thread_data = {
-                        "id": printer.id, 
-                        "device": printer.device,
-                        "description": printer.description,
-                        "hwid": printer.hwid,
-                        "name": printer.name, 
-                    }
-                    self.printer_threads.remove(thread)
-                    self.queue_restore([thread_data], status, printer.getQueue())
-                    break
-            return jsonify({"success": True, "message": "Printer thread reset successfully"})
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return jsonify({"success": False, "error": "Unexpected error occurred"}), 500
+        thread = self.registry.get(printer_id)
+        if thread is not None:
+            printer = thread.printer
+            printer.terminate()
+            thread_data = {
+                "id": printer.id, 
+                "device": printer.device,
+                "description": printer.description,
+                "hwid": printer.hwid,
+                "name": printer.name, 
+            }
+            self.queue_restore([thread_data], status, printer.getQueue())
+        return {"success": True, "message": "Printer thread reset successfully"}
         
     def deleteThread(self, printer_id):
-        try: 
-            for thread in self.printer_threads:
-                if thread.printer.id == printer_id:    
-                    printer = thread.printer
-                    thread_data = {
-                        "id": printer.id, 
-                        "device": printer.device,
-                        "description": printer.description,
-                        "hwid": printer.hwid,
-                        "name": printer.name
-                    }
-                    self.printer_threads.remove(thread)
-                    break
-            return jsonify({"success": True, "message": "Printer thread reset successfully"})
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return jsonify({"success": False, "error": "Unexpected error occurred"}), 500
+        if self.registry.remove(printer_id) is not None:
+            telemetryService.unregister(printer_id)
+            stateService.printersChanged()
+        return {"success": True, "message": "Printer thread reset successfully"}
         
     def editName(self, printer_id, name):
-        try: 
-            for thread in self.printer_threads:
-                if thread.printer.id == printer_id:    
-                    printer = thread.printer
-                    printer.name = name
-                    break
-            return jsonify({"success": True, "message": "Printer name updated successfully"})
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return jsonify({"success": False, "error": "Unexpected error occurred"}), 500
-        
+        thread = self.registry.get(printer_id)
+        if thread is not None:
+            printer = thread.printer
+            printer.name = name
+            stateService.printerChanged(printer, name=name)
+        return {"success": True, "message": "Printer name updated successfully"}
 
-    # this method will be called by the UI to get the printers that have a threads information
-    def retrieve_printer_info(self):
-        printer_info_list = []
-        for thread in self.printer_threads:
-            printer = (
-                thread.printer
-            )  # get the printer object associated with the thread
-            printer_info = {
-                "device": printer.device,
-                "description": printer.description,
-                "hwid": printer.hwid,
-                "name": printer.name,
+    # commands: everything the API does to printers, queues and the farm queue, addressed by id so the same calls
+    # work in this process or from an API worker through the printer daemon (services/daemonService.py)
+
+    def prepareJobs(self, job_ids, filament=None, upload=None):
+        # runtime jobs for freshly inserted rows, keyed by id
+        from models.jobs import JobRuntime
+        jobs = JobRuntime.load(job_ids)
+        for job in jobs:
+            base_name, extension = os.path.splitext(job.file_name_original)
+            job.setFileName(f"{base_name}_{job.id}{extension}") # set unique in-memory file name
+            if filament is not None:
+                job.setFilament(filament)
+            if upload is not None:
+                job.setUploadInfo(upload) # slicer estimate/model, used by the auto-queue scheduler
+        return {job.id: job for job in jobs}
+
+    def enqueueJobs(self, printer_id, entries, filament=None, upload=None):
+        # entries are (job id, priority); the printer's queue emits one update for all of them
+        jobs = self.prepareJobs([job_id for job_id, priority in entries], filament, upload)
+        self.registry.getPrinter(printer_id).getQueue().addJobs([(jobs[job_id], priority) for job_id, priority in entries], printer_id)
+
+    def farmEnqueue(self, entries, filament, model, upload):
+        # entries are (job id, pinned printer id or None, priority)
+        from models.jobs import Job
+        jobs = self.prepareJobs([job_id for job_id, pinned, priority in entries], filament, upload)
+        Job.setFarmConstraints([(job_id, filament, model, pinned) for job_id, pinned, priority in entries])
+        self.farm_queue.addMany([(jobs[job_id], filament, model, pinned, priority) for job_id, pinned, priority in entries])
+
+    def restoreFarmQueue(self):
+        # the farm queue lives in memory only: on start, jobs the DB still has waiting unbound go back into it
+        from models.jobs import Job
+        rows = Job.getFarmJobs()
+        if not rows:
+            return
+        jobs = self.prepareJobs([row.id for row in rows])
+        for row in rows:
+            jobs[row.id].setUploadInfo({"printer_model": row.farm_model or ''})
+            if row.farm_filament:
+                jobs[row.id].setFilament(row.farm_filament)
+        self.farm_queue.addMany([(jobs[row.id], row.farm_filament or '', row.farm_model or '', row.farm_pinned, False) for row in rows])
+        print(f"Restored {len(rows)} job(s) to the farm queue.")
+
+    def farmDelete(self, job_id):
+        self.farm_queue.deleteJob(job_id)
+
+    def farmQueueInfo(self):
+        return self.farm_queue.convertQueueToJson()
+
+    def pickPrinter(self, filament='', model='', planned=None):
+        # printer that would finish its queue soonest, or None. planned may come over JSON with string keys
+        from services import schedulerService
+        planned = {int(printer_id): seconds for printer_id, seconds in (planned or {}).items()}
+        return schedulerService.pickPrinter(self.registry.printers(), filament, model, planned)
+
+    def cancelJob(self, printer_id, job_id, printing):
+        printer = self.registry.getPrinter(printer_id)
+        queue = printer.getQueue()
+        job = queue.getJobById(job_id)
+        if printing: # only change statuses, dont remove from queue 
+            printer.setStatus("complete")
+        else: 
+            queue.deleteJob(job_id, printer_id) 
+        if job is not None:
+            job.setStatus("cancelled")
+
+    def releaseJob(self, printer_id, job_id, key, error=None, rerun=None):
+        # 1 = clear, 2 = clear and rerun (rerun is (printer id, new job id), queued at the front), 3 = fail
+        printer = self.registry.getPrinter(printer_id)
+        printer.error = ""
+        printer.getQueue().deleteJob(job_id, printer_id) # remove job from queue
+        currentStatus = printer.getStatus()
+        if key == 3: 
+            printer.setError(error)
+            printer.setStatus("error")
+            return
+        if rerun is not None:
+            self.enqueueJobs(rerun[0], [(rerun[1], True)])
+        if currentStatus != "offline":
+            printer.setStatus("ready") # printer ready to accept new prints 
+
+    def bumpJob(self, printer_id, job_id, choice):
+        # 1 = up, 2 = down, 3 = to the front, 4 = to the back. returns False for an unknown choice
+        queue = self.registry.getPrinter(printer_id).getQueue()
+        if choice == 1: 
+            queue.bump(True, job_id, printer_id)
+        elif choice == 2: 
+            queue.bump(False, job_id, printer_id)
+        elif choice == 3: 
+            queue.bumpExtreme(True, job_id, printer_id)
+        elif choice == 4: 
+            queue.bumpExtreme(False, job_id, printer_id)
+        else: 
+            return False
+        return True
+
+    def reorderQueue(self, printer_id, job_ids):
+        self.registry.getPrinter(printer_id).getQueue().reorder(job_ids, printer_id)
+
+    def dequeueJob(self, printer_id, job_id):
+        self.registry.getPrinter(printer_id).getQueue().deleteJob(job_id, printer_id)
+
+    def startJob(self, printer_id, job_id):
+        # the user confirmed the bed is clear: let the waiting job start
+        self.registry.getPrinter(printer_id).getQueue().getJobById(job_id).setReleased(1)
+
+    def setPrinterStatus(self, printer_id, status):
+        self.registry.getPrinter(printer_id).setStatus(status)
+
+    def setPrinterFilament(self, printer_id, filament):
+        self.registry.getPrinter(printer_id).setFilament(filament)
+
+    def setPrinterDevice(self, printer_id, device):
+        self.registry.getPrinter(printer_id).setDevice(device)
+
+    def jobTimes(self, printer_id):
+        # timing of the job at the front of the printer's queue
+        timearray = self.registry.getPrinter(printer_id).getQueue().getNext().job_time
+        return {
+            'total': timearray[0], 
+            'eta': timearray[1].isoformat(), 
+            'timestart': timearray[2].isoformat(), 
+            'pause': timearray[3].isoformat()
+        }
+
+    def telemetry(self):
+        # the rows of the shared telemetry table, read from the printer objects when the table is off
+        rows = []
+        for printer in self.registry.printers():
+            job = printer.getQueue().getNext() if printer.getQueue().getSize() > 0 else None
+            eta = job.job_time[1] if job else None
+            rows.append({
+                "id": printer.id,
                 "status": printer.status,
+                "extruder_temp": float(printer.extruder_temp or 0),
+                "bed_temp": float(printer.bed_temp or 0),
+                "job_id": job.id if job else None,
+                "progress": job.progress if job else 0.0,
+                "sent_lines": job.sent_lines if job else 0,
+                "current_layer_height": job.current_layer_height if job else 0.0,
+                "max_layer_height": job.max_layer_height if job else 0.0,
+                "eta": eta.isoformat() if isinstance(eta, datetime) and eta != datetime.min else None,
+            })
+        return rows
+
+    def nodeReport(self):
+        # compact state of every printer for the federation coordinator: enough to show the queues and pick a printer
+        from services import schedulerService
+        now = datetime.now()
+        return [
+            {
                 "id": printer.id,
-                "error": printer.error, 
-                "canPause": printer.canPause,
-                "queue": [], # empty queue to store job objects 
-                "colorChangeBuffer": printer.colorbuff
-                # "colorChangeBuffer": printer.colorChangeBuffer
+                "name": printer.name,
+                "status": printer.status,
+                "filament": printer.filament,
+                "family": schedulerService.printerFamily(printer),
+                "busy": round(schedulerService.completionTime(printer, now)), # seconds until its queue is through
+                "queue": [
+                    {"id": job.id, "name": job.name, "status": job.status, "progress": round(job.progress, 1)}
+                    for job in printer.getQueue()
+                ],
             }
-            queue = printer.getQueue()
-            for job in queue: 
-                job_info = {
-                    "id": job.id,
-                    "name": job.name,
-                    "status": job.status,
-                    "date": job.date.strftime('%a, %d %b %Y %H:%M:%S'),
-                    "printerid": job.printer_id, 
-                    "errorid": job.error_id,
-                    "file_name_original": job.file_name_original, 
-                    "progress": job.progress,
-                    "sent_lines": job.sent_lines,
-                    "favorite": job.favorite,
-                    "released": job.released,
-                    "file_pause": job.filePause, 
-                    "comments": job.comments, 
-                    "extruded": job.extruded,
-                    "td_id": job.td_id,
-                    "time_started": job.time_started,
-                    "printer_name": job.printer_name,
-                    "max_layer_height": job.max_layer_height,
-                    "current_layer_height": job.current_layer_height,
-                    "filament": job.filament,
-                }
-                printer_info['queue'].append(job_info)
-            
-            printer_info_list.append(printer_info)
-            
-        return printer_info_list
+            for printer in self.registry.printers()
+        ]
+
+    def workerStats(self):
+        # print worker processes and what each is printing; empty when the loops run in the printer threads
+        return self.print_workers.getStats() if self.print_workers else []
+
+    def etaFactors(self):
+        from services import etaService
+        return etaService.getFactors()
+
+    # this method will be called by the UI to get the printers that have a threads information
+    def retrieve_printer_info(self):
+        return [
+            {**stateService.printerInfo(printer), "queue": printer.getQueue().convertQueueToJson()}
+            for printer in self.registry.printers()
+        ]
+
+    def printer_snapshot(self):
+        # (version, etag, json body) of retrieve_printer_info, cached until something in the state store changes
+        version, body = stateService.snapshot(self.registry.printers())
+        return version, stateService.etag(version), body
+
+    def printerStatuses(self):
+        # [printer id, status] of every running printer; printers without a thread here aren't listed
+        return [[printer.id, printer.status] for printer in self.registry.printers()]
+
+    def stateDeltas(self, since):
+        # (current version, deltas since the given one or None if the history doesn't reach back that far)
+        return stateService.getVersion(), stateService.deltasSince(since)
+
+    def stateChanged(self, kind, ident, printer_id, fields):
+        # a job/printer change made in an API worker, forwarded to this process's store
+        if kind == 'job':
+            stateService.changeJob(ident, printer_id, fields)
+        else:
+            stateService.changePrinter(ident, fields)
 
     def getThreadArray(self):
-        return self.printer_threads
+        return self.registry.threads()
     
     def pingForStatus(self):
         """_summary_ pseudo code
@@ -217,17 +461,9 @@ class PrinterStatusService:
         """
         pass
 
-    def getThreadArray(self):
-        return self.printer_threads
-    
     def movePrinterList(self, printer_ids):
         # printer_ids is a list of printer ids in the order they should be displayed
-        new_thread_list = []
-        for id in printer_ids:
-            for thread in self.printer_threads:
-                if thread.printer.id == id:
-                    new_thread_list.append(thread)
-                    break
-        self.printer_threads = new_thread_list
-        return jsonify({"success": True, "message": "Printer list reordered successfully"})
+        self.registry.reorder(printer_ids)
+        stateService.printersChanged()
+        return {"success": True, "message": "Printer list reordered successfully"}
 
@@ -1,5 +1,6 @@
 import json
 import os
+import socket
 
 def base_url():
     return f"http://{ip}:{port}"
@@ -10,16 +11,77 @@ def load_config(file_path):
         config = json.load(config_file)
     return config
 
-config = load_config('./config/config.json')
+# QVIEW3D_CONFIG points at another config file, e.g. to run several local instances as federation nodes
+config = load_config(os.environ.get('QVIEW3D_CONFIG', './config/config.json'))
 environment = config.get('environment', 'development')
 ip = config.get('ip', '127.0.0.1')
 database_uri = config.get('databaseURI', 'hvamc') + ".db"
 port = os.environ.get('FLASK_RUN_PORT', 8000)
+# codec/level used to store uploaded gcode blobs, and size of the process pool that compresses them
+compression_codec = config.get('compressionCodec', 'gzip')
+compression_level = config.get('compressionLevel', 6)
+upload_workers = config.get('uploadWorkers', 2)
+# when on, auto-queued jobs wait in a shared farm queue and are bound to a printer when it becomes ready
+farm_queue = config.get('farmQueue', False)
+# when on, queued jobs that haven't started are moved off a printer that stays in error/offline past its grace period
+failover = config.get('failover', False)
+failover_error_grace = config.get('failoverErrorGrace', 300)
+failover_offline_grace = config.get('failoverOfflineGrace', 600)
+# when on, printer threads and queues run in their own process (printerdaemon.py) and the API talks to it over a unix socket
+printer_daemon = config.get('printerDaemon', False)
+daemon_socket = config.get('daemonSocket', '/tmp/qview3d-printers.sock')
+process_role = os.environ.get('QVIEW3D_ROLE', 'api')  # 'daemon' in the printer daemon process, 'worker' in a print worker
+# when above 0, print loops run in this many worker processes (printerworker.py) instead of the printer threads
+print_workers = config.get('printWorkers', 0)
+# when on, printer status/telemetry is also kept in a shared memory table any process on the host can read
+shared_telemetry = config.get('sharedTelemetry', False)
+telemetry_name = config.get('telemetryName', 'qview3d-telemetry')
+# federated farm: 'node' reports its printers to coordinatorUrl and takes jobs from it, 'coordinator' gives one
+# view of every node and auto-queues across them. nodeUrl is where the coordinator reaches this node
+federation_role = config.get('federationRole', '')
+coordinator_url = config.get('coordinatorUrl', '')
+node_name = config.get('nodeName', socket.gethostname())
+node_url = config.get('nodeUrl', base_url())
+federation_token = config.get('federationToken', '')
+federation_interval = config.get('federationInterval', 5)
+if federation_role and not federation_token:
+    # a node takes jobs and the coordinator takes node urls from whoever can reach them, so both need the shared secret
+    raise ValueError("federationToken is required when federationRole is set")
+# print from the printer's SD/USB storage instead of streaming each line: true for every printer, or a list of printer ids
+sd_print = config.get('sdPrint', False)
+# MeatPack-pack commands on the serial link when the firmware supports it: true for every printer, or a list of printer ids
+meatpack = config.get('meatPack', False)
+# fit runs of short G1 moves to G2/G3 arcs when gcode is uploaded, within arcTolerance mm; the arc-fitted file is what prints
+arc_fitting = config.get('arcFitting', False)
+arc_tolerance = config.get('arcTolerance', 0.05)
 
 Config = {
     'base_url': base_url(),
     'environment': environment,
     'ip': ip,
     'database_uri': database_uri,
-    'port': port
+    'port': port,
+    'compression_codec': compression_codec,
+    'compression_level': compression_level,
+    'upload_workers': upload_workers,
+    'farm_queue': farm_queue,
+    'failover': failover,
+    'failover_error_grace': failover_error_grace,
+    'failover_offline_grace': failover_offline_grace,
+    'printer_daemon': printer_daemon,
+    'daemon_socket': daemon_socket,
+    'process_role': process_role,
+    'print_workers': print_workers,
+    'shared_telemetry': shared_telemetry,
+    'telemetry_name': telemetry_name,
+    'federation_role': federation_role,
+    'coordinator_url': coordinator_url,
+    'node_name': node_name,
+    'node_url': node_url,
+    'federation_token': federation_token,
+    'federation_interval': federation_interval,
+    'sd_print': sd_print,
+    'meatpack': meatpack,
+    'arc_fitting': arc_fitting,
+    'arc_tolerance': arc_tolerance
 }
\ No newline at end of file
@@ -1,3 +1,18 @@
+from contextlib import contextmanager
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
+
+# session-per-operation for background threads (printer threads, failover, ETA refit). the scoped session of a
+# thread that never returns to Flask is otherwise never closed: its identity map keeps every row it touched and
+# its open transaction can keep it from seeing commits made by request threads
+@contextmanager
+def unitOfWork():
+    try:
+        yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
@@ -0,0 +1,146 @@
+from models.db import db
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+# lifecycle events a job goes through, in the order they usually happen
+EVENTS = ['queued', 'released', 'started', 'paused', 'colorchange', 'completed', 'failed', 'cancelled', 'issue']
+
+# model for job_event table: append-only log of job lifecycle events, written in batches by services/eventService.py
+class JobEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, nullable=False, index=True)
+    printer_id = db.Column(db.Integer, nullable=True)
+    event = db.Column(db.String(20), nullable=False)
+    issue_id = db.Column(db.Integer, nullable=True)
+    filament = db.Column(db.String(50), nullable=True)
+    timestamp = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __init__(self, job_id, printer_id, event, timestamp, issue_id=None, filament=None):
+        self.job_id = job_id
+        self.printer_id = printer_id
+        self.event = event
+        self.timestamp = timestamp
+        self.issue_id = issue_id
+        self.filament = filament
+
+    @classmethod
+    def getJobEvents(cls, job_id):
+        try:
+            events = cls.query.filter_by(job_id=job_id).order_by(cls.timestamp.asc()).all()
+            return [
+                {
+                    "event": event.event,
+                    "printerid": event.printer_id,
+                    "issueid": event.issue_id,
+                    "timestamp": event.timestamp.isoformat(),
+                }
+                for event in events
+            ]
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return []
+
+    @classmethod
+    def getMilestones(cls, job_ids):
+        # earliest queued/started time per job, for jobs whose earlier events were flushed before a restart
+        try:
+            rows = (
+                db.session.query(cls.job_id, cls.event, func.min(cls.timestamp))
+                .filter(cls.job_id.in_(job_ids), cls.event.in_(['queued', 'started']))
+                .group_by(cls.job_id, cls.event)
+                .all()
+            )
+            milestones = {}
+            for job_id, event, timestamp in rows:
+                milestones.setdefault(job_id, {})[event] = timestamp
+            return milestones
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return {}
+
+
+# model for daily_rollup table: per day/printer/issue/filament counters, maintained incrementally as events are flushed.
+# 0 / '' stand for "none" so the key columns can be compared directly
+class DailyRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    printer_id = db.Column(db.Integer, nullable=False, default=0)
+    issue_id = db.Column(db.Integer, nullable=False, default=0)
+    filament = db.Column(db.String(50), nullable=False, default='')
+    queued = db.Column(db.Integer, nullable=False, default=0)
+    started = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    paused = db.Column(db.Integer, nullable=False, default=0)
+    issues = db.Column(db.Integer, nullable=False, default=0)
+    wait_seconds = db.Column(db.Float, nullable=False, default=0) # queued -> started, summed over started jobs
+    print_seconds = db.Column(db.Float, nullable=False, default=0) # started -> completed/failed, summed over finished jobs
+
+    __table_args__ = (db.UniqueConstraint('day', 'printer_id', 'issue_id', 'filament'),)
+
+    COUNTERS = ['queued', 'started', 'completed', 'failed', 'cancelled', 'paused', 'issues', 'wait_seconds', 'print_seconds']
+
+    def __init__(self, day, printer_id, issue_id, filament):
+        self.day = day
+        self.printer_id = printer_id
+        self.issue_id = issue_id
+        self.filament = filament
+        for counter in self.COUNTERS:
+            setattr(self, counter, 0)
+
+    @classmethod
+    def apply(cls, deltas):
+        # deltas: {(day, printer_id, issue_id, filament): {counter: amount}}. caller commits.
+        # one upsert per row that adds in SQL, so API workers and the printer daemon flushing the same day's
+        # rollups at once neither collide on the insert nor overwrite each other's counts
+        for (day, printer_id, issue_id, filament), counters in deltas.items():
+            if not counters:
+                continue
+            statement = insert(cls).values(
+                day=day, printer_id=printer_id, issue_id=issue_id, filament=filament,
+                **{counter: counters.get(counter, 0) for counter in cls.COUNTERS},
+            )
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['day', 'printer_id', 'issue_id', 'filament'],
+                set_={counter: getattr(cls, counter) + statement.excluded[counter] for counter in counters},
+            ))
+
+    @classmethod
+    def getAnalytics(cls, startDate=None, endDate=None, groupBy='printer', printerIds=None):
+        try:
+            groups = {
+                'printer': cls.printer_id,
+                'issue': cls.issue_id,
+                'filament': cls.filament,
+                'day': cls.day,
+            }
+            if groupBy not in groups:
+                groupBy = 'printer'
+            key = groups[groupBy]
+            query = db.session.query(key, *[func.sum(getattr(cls, counter)) for counter in cls.COUNTERS])
+            if startDate:
+                query = query.filter(cls.day >= datetime.fromisoformat(startDate).date())
+            if endDate:
+                query = query.filter(cls.day <= datetime.fromisoformat(endDate).date())
+            if printerIds:
+                query = query.filter(cls.printer_id.in_(printerIds))
+            rows = query.group_by(key).order_by(key).all()
+
+            results = []
+            for row in rows:
+                totals = dict(zip(cls.COUNTERS, [value or 0 for value in row[1:]]))
+                finished = totals['completed'] + totals['failed']
+                results.append({
+                    groupBy: row[0].isoformat() if groupBy == 'day' else row[0],
+                    **totals,
+                    "failure_rate": totals['failed'] / finished if finished else None,
+                    "avg_wait_seconds": totals['wait_seconds'] / totals['started'] if totals['started'] else None,
+                    "avg_print_seconds": totals['print_seconds'] / finished if finished else None,
+                })
+            return {"success": True, "groupBy": groupBy, "results": results}
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return {"success": False, "message": "Failed to retrieve analytics. Database error"}
@@ -9,7 +9,7 @@ from models.printers import Printer
 from models.issues import Issue  # assuming the Issue model is defined in the issue.py file in the models directory
 from datetime import datetime, timezone, timedelta
 from sqlalchemy import Column, String, LargeBinary, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, defer
 from flask import jsonify, current_app
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
@@ -20,6 +20,8 @@ import time
 import gzip
 import csv
 from flask import send_file
+from services import uploadService, eventService, stateService, roomService, telemetryService
+from Classes import BGCode, MotionAnalyzer
 
 from app import printer_status_service
 # model for job history table
@@ -28,6 +30,21 @@ from app import printer_status_service
 class Job(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     file = db.Column(db.LargeBinary(16777215), nullable=True)
+    # cumulative print time after each sent command (float32 seconds), see Classes/MotionAnalyzer.py
+    time_profile = db.Column(db.LargeBinary(16777215), nullable=True)
+    # slicer printer model whose motion limits the upload computed time_profile with; a printer of a family with
+    # other limits computes its own when it starts the job
+    time_profile_model = db.Column(db.String(50), nullable=True)
+    # arc-fitted variant of file (arcFitting in config, see Classes/ArcFitter.py), printed instead of it when set
+    arc_file = db.Column(db.LargeBinary(16777215), nullable=True)
+    arc_lines_removed = db.Column(db.Integer, nullable=True)
+    # 'ingesting' while the upload pool compresses the file, 'ready' once it's stored, 'failed' if that raised.
+    # the pool runs in the process that took the upload, so other processes go by this rather than the future
+    ingest_status = db.Column(db.String(20), nullable=True)
+    # farm queue constraints of a job waiting unbound (printer_id None), so the queue can be rebuilt after a restart
+    farm_filament = db.Column(db.String(50), nullable=True)
+    farm_model = db.Column(db.String(50), nullable=True)
+    farm_pinned = db.Column(db.Integer, nullable=True)
     name = db.Column(db.String(50), nullable=False)
     status = db.Column(db.String(50), nullable=False)
     date = db.Column(db.DateTime, default=lambda: datetime.now(
@@ -51,21 +68,8 @@ class Job(db.Model):
     
     file_name_original = db.Column(db.String(50), nullable=False)
     favorite = db.Column(db.Boolean, nullable=False)
-    file_name_pk = None
-    max_layer_height = 0.0
-    current_layer_height = 0.0
-    filament = ''
-    released = 0 
-    filePause = 0
-    progress = 0.0
-    sent_lines = 0
-    time_started = 0
-    extruded = 0
-    #total, eta, timestart, pause time 
-    job_time = [0, datetime.min, datetime.min, datetime.min]
 
-
-    
+    # in-memory print state lives in JobRuntime below; rows are only used for persistence
     def __init__(self, file, name, printer_id, status, file_name_original, favorite, td_id, printer_name):
         self.file = file 
         self.name = name 
@@ -73,20 +77,9 @@ class Job(db.Model):
         self.status = status 
         self.file_name_original = file_name_original # original file name without PK identifier 
         self.td_id = td_id
-        self.file_name_pk = None
         self.favorite = favorite
-        self.released = 0 
-        self.filePause = 0
-        self.progress = 0.0
-        self.sent_lines = 0
-        self.time_started = 0
-        self.extruded = 0
-        self.job_time = [0, datetime.min, datetime.min, datetime.min]
         self.error_id = 0
         self.printer_name = printer_name
-        self.max_layer_height = 0.0
-        self.current_layer_height = 0.0
-        self.filament = ''
 
     def __repr__(self):
         return f"Job(id={self.id}, name={self.name}, printer_id={self.printer_id}, status={self.status})"
@@ -185,7 +178,8 @@ class Job(db.Model):
                     "td_id": job.td_id,
                     "printer": job.printer.name if job.printer else "None",
                     "error": job.error.issue if job.error else 'None', 
-                    "printer_name": job.printer_name
+                    "printer_name": job.printer_name,
+                    "arc_lines_removed": job.arc_lines_removed
                 }
                 for job in jobs
             ]
@@ -201,36 +195,32 @@ class Job(db.Model):
     @classmethod
     def jobHistoryInsert(cls, name, printer_id, status, file, file_name_original, favorite, td_id): 
         try:
-            if isinstance(file, bytes):
-                file_data = file
-            else:
-                file.seek(0)
-                file_data = file.read()
-
-            try:
-                gzip.decompress(file_data)
-                # If it decompresses successfully, it's already compressed
-                compressed_data = file_data
-            except OSError:
-                compressed_data = gzip.compress(file_data)
+            # detect the format by magic bytes; plain gcode is streamed to disk and compressed in the upload pool.
+            # file may also be an Upload the controller already ingested (to read its metadata first)
+            upload = uploadService.ingest(file)
 
             printer = Printer.query.get(printer_id)
 
             job = cls(
-                file=compressed_data,
+                file=upload.blob,
                 name=name,
                 printer_id=printer_id,
                 status=status,
                 file_name_original = file_name_original,
                 favorite = favorite, 
                 td_id = td_id, 
-                printer_name = printer.name 
+                printer_name = printer.name if printer else None # no printer yet for jobs waiting in the farm queue
             )
+            job.ingest_status = 'ingesting' if upload.future is not None else 'ready'
 
             db.session.add(job)
             db.session.commit()
 
-            return {"success": True, "message": "Job added to collection.", "id": job.id}
+            if upload.future is not None:
+                cls.storeFileWhenReady([job.id], upload.future)
+            eventService.record(job.id, 'queued', printer_id)
+
+            return {"success": True, "message": "Job added to collection.", "id": job.id, **upload.metadata}
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
             return (
@@ -238,6 +228,145 @@ class Job(db.Model):
                 500,
             )
 
+    @classmethod
+    def batchInsert(cls, name, status, file, file_name_original, favorite, td_id, printer_ids):
+        # insert one job per entry in printer_ids, compressing the file once and committing once
+        try:
+            upload = uploadService.ingest(file)
+
+            printers = Printer.query.filter(Printer.id.in_(set(printer_ids))).all()
+            printer_names = {printer.id: printer.name for printer in printers}
+
+            jobs = []
+            for index, printer_id in enumerate(printer_ids):
+                job = cls(
+                    file=upload.blob,
+                    name=name,
+                    printer_id=printer_id,
+                    status=status,
+                    file_name_original = file_name_original,
+                    favorite = favorite if index == 0 else 0, # only the first copy is favorited
+                    td_id = td_id,
+                    printer_name = printer_names.get(printer_id)
+                )
+                job.ingest_status = 'ingesting' if upload.future is not None else 'ready'
+                jobs.append(job)
+
+            db.session.add_all(jobs)
+            db.session.commit()
+
+            ids = [job.id for job in jobs]
+            if upload.future is not None:
+                cls.storeFileWhenReady(ids, upload.future)
+            for job in jobs:
+                eventService.record(job.id, 'queued', job.printer_id)
+
+            return {"success": True, "message": f"{len(ids)} jobs added to collection.", "ids": ids, **upload.metadata}
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"Database error: {e}")
+            return {"success": False, "message": "Failed to add jobs. Database error"}
+
+    @classmethod
+    def bindToPrinter(cls, job, printer):
+        # late binding for farm queue jobs: record the printer the job was pulled by (None puts it back unbound)
+        try:
+            printer_id = printer.id if printer else None
+            printer_name = printer.name if printer else None
+            cls.query.filter_by(id=job.id).update({"printer_id": printer_id, "printer_name": printer_name})
+            db.session.commit()
+            job.printer_id = printer_id
+            job.printer_name = printer_name
+            stateService.jobChanged(job, printerid=printer_id, printer_name=printer_name)
+            return {"success": True, "message": f"Job {job.id} bound to printer {printer_id}."}
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"Database error: {e}")
+            return {"success": False, "message": "Failed to bind job. Database error"}
+
+    @classmethod
+    def setFarmConstraints(cls, entries):
+        # entries are (job id, filament, model, pinned printer id) of jobs going into the farm queue
+        try:
+            for job_id, filament, model, pinned in entries:
+                cls.query.filter_by(id=job_id).update({"farm_filament": filament or None, "farm_model": model or None, "farm_pinned": pinned})
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"Database error: {e}")
+
+    @classmethod
+    def getFarmJobs(cls):
+        # rows (id, farm_filament, farm_model, farm_pinned) of the jobs still waiting in the farm queue, oldest first
+        try:
+            return (
+                db.session.query(cls.id, cls.farm_filament, cls.farm_model, cls.farm_pinned)
+                .filter(cls.printer_id.is_(None), cls.status == 'inqueue')
+                .order_by(cls.date.asc())
+                .all()
+            )
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return []
+
+    @classmethod
+    def storeFileWhenReady(cls, job_ids, future):
+        # the job rows are committed without a blob; write it (and the time profile and arc-fitted variant) once the pool finishes
+        uploadService.trackUpload(job_ids, future)
+        app = printer_status_service.app
+
+        def store(done):
+            try:
+                compressed_data, time_profile, arc_data, arc_lines_removed, profile_model = done.result()
+                with app.app_context():
+                    for job in cls.query.filter(cls.id.in_(job_ids)).all():
+                        job.file = compressed_data
+                        job.time_profile = time_profile
+                        job.time_profile_model = profile_model
+                        job.arc_file = arc_data
+                        job.arc_lines_removed = arc_lines_removed if arc_data else None
+                        job.ingest_status = 'ready'
+                    db.session.commit()
+                    db.session.remove()
+                if arc_data:
+                    print(f"Arc fitting removed {arc_lines_removed} lines from job(s) {job_ids}")
+            except Exception as e:
+                print(f"Error storing compressed file: {e}")
+                cls.ingestFailed(app, job_ids)
+            finally:
+                uploadService.finishUpload(job_ids)
+
+        future.add_done_callback(store)
+
+    @classmethod
+    def ingestFailed(cls, app, job_ids):
+        # the file never made it into the rows: fail the jobs so the printers drop them instead of waiting forever
+        try:
+            with app.app_context():
+                cls.query.filter(cls.id.in_(job_ids)).update({"ingest_status": 'failed'}, synchronize_session=False)
+                db.session.commit()
+                for job_id in job_ids:
+                    cls.update_job_status(job_id, "error") # emits job_status_update to the farm room and the job's printer
+                db.session.remove()
+        except Exception as e:
+            print(f"Error marking upload as failed: {e}")
+
+    @classmethod
+    def getIngestStatus(cls, job_id):
+        # rows from before ingest_status existed have their file already
+        return db.session.query(cls.ingest_status).filter(cls.id == job_id).scalar() or 'ready'
+
+    @classmethod
+    def copyArcFile(cls, source, job_id):
+        # a rerun's blob is the stored (compressed) file, which isn't fitted again: it keeps the source's variant
+        try:
+            if source.arc_file is not None:
+                cls.query.filter_by(id=job_id).update({"arc_file": source.arc_file, "arc_lines_removed": source.arc_lines_removed})
+                db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"Database error: {e}")
+
     @classmethod
     def update_job_status(cls, job_id, new_status):
         try:
@@ -248,9 +377,10 @@ class Job(db.Model):
                 job.status = new_status
                 # Commit the changes to the database
                 db.session.commit()
+                eventService.recordStatus(job_id, new_status, job.printer_id)
 
-                current_app.socketio.emit('job_status_update', {
-                                          'job_id': job_id, 'status': new_status})
+                roomService.emit('job_status_update', {
+                                          'job_id': job_id, 'status': new_status}, job.printer_id, job_id)
 
                 return {"success": True, "message": f"Job {job_id} status updated successfully."}
             else:
@@ -291,8 +421,7 @@ class Job(db.Model):
 
     @classmethod
     def findPrinterObject(self, printer_id):
-        threads = printer_status_service.getThreadArray()
-        return list(filter(lambda thread: thread.printer.id == printer_id, threads))[0].printer
+        return printer_status_service.registry.getPrinter(printer_id)
 
     @classmethod
     def removeFileFromPath(cls, file_path):
@@ -381,6 +510,7 @@ class Job(db.Model):
         # Commit the changes to the database
         try:
             db.session.commit()
+            eventService.record(job_id, 'issue', job.printer_id, issue_id)
             return {"success": True, "message": "Issue assigned successfully."}
         except Exception as e:
             db.session.rollback()
@@ -460,9 +590,99 @@ class Job(db.Model):
             print(f"Error downloading CSV: {e}")
             return {"status": "error", "message": f"Error downloading CSV: {e}"}
                
+    def getName(self):
+        return self.name
+
+    def getFile(self):
+        if self.file is None:
+            # compression may still be running in the upload pool, or it finished and was stored by another session
+            pending = uploadService.waitForUpload(self.id)
+            data = pending[0] if pending else db.session.query(Job.file).filter(Job.id == self.id).scalar()
+            if data is not None:
+                self.file = data
+        return self.file
+
+    def getStatus(self):
+        return self.status
+
+    def getFileNameOriginal(self):
+        return self.file_name_original
+    
+    def getFileFavorite(self):
+        return self.favorite
+    
+    def setFileFavorite(self, favorite):
+        self.favorite = favorite
+        stateService.jobChanged(self, favorite=favorite)
+        db.session.commit()
+        return {"success": True, "message": "Favorite status updated successfully."}
+
+    def getJobId(self):
+        return self.id
+
+    def getTdId(self): 
+        return self.td_id
+
+
+# runtime state of a queued/printing job, held by the printer queues and the print loop. it copies the
+# few row fields the UI and scheduler read and refers to the row by id; the gcode blob and time profile
+# are read from the DB when the print starts instead of living on the object for as long as it is queued
+class JobRuntime:
+    __slots__ = (
+        'id', 'name', 'status', 'date', 'printer_id', 'printer_name', 'td_id', 'error_id', 'comments',
+        'file_name_original', 'favorite', 'file_name_pk', 'path', 'max_layer_height', 'current_layer_height',
+        'filament', 'estimated_time', 'printer_model', 'profile', 'predicted_time', 'released', 'filePause',
+        'progress', 'sent_lines', 'time_started', 'extruded', 'job_time',
+    )
+
+    def __init__(self, row):
+        self.id = row.id
+        self.name = row.name
+        self.status = row.status
+        self.date = row.date
+        self.printer_id = row.printer_id
+        self.printer_name = row.printer_name
+        self.td_id = row.td_id
+        self.error_id = row.error_id
+        self.comments = row.comments
+        self.file_name_original = row.file_name_original
+        self.favorite = row.favorite
+        self.file_name_pk = None
+        self.path = None
+        self.max_layer_height = 0.0
+        self.current_layer_height = 0.0
+        self.filament = ''
+        self.estimated_time = None # slicer estimate in seconds, read from the upload
+        self.printer_model = '' # printer model the file was sliced for, if the slicer recorded one
+        self.profile = '' # slicer print profile, keys the learned ETA correction
+        self.predicted_time = 0 # corrected total print time the ETA was started from
+        self.released = 0
+        self.filePause = 0
+        self.progress = 0.0
+        self.sent_lines = 0
+        self.time_started = 0
+        self.extruded = 0
+        #total, eta, timestart, pause time 
+        self.job_time = [0, datetime.min, datetime.min, datetime.min]
+
+    @classmethod
+    def load(cls, job_ids):
+        # runtime objects for the given job ids in the order given, without loading the file blobs
+        rows = (
+            Job.query.options(defer(Job.file), defer(Job.time_profile), defer(Job.arc_file))
+            .filter(Job.id.in_(job_ids))
+            .all()
+        )
+        by_id = {row.id: row for row in rows}
+        return [cls(by_id[job_id]) for job_id in job_ids]
+
+    def __repr__(self):
+        return f"JobRuntime(id={self.id}, name={self.name}, printer_id={self.printer_id}, status={self.status})"
+
     def saveToFolder(self):
-        file_data = self.getFile()
-        decompressed_data = gzip.decompress(file_data)
+        file_data = self.getPrintFile()
+        # binary G-code stays compact on disk too: the print loop decodes it as it goes
+        decompressed_data = file_data if BGCode.isBGCode(file_data[:4]) else uploadService.decompress(file_data)
         with open(self.generatePath(), 'wb') as f:
             f.write(decompressed_data)
 
@@ -477,7 +697,29 @@ class Job(db.Model):
         return self.path
 
     def getFile(self):
-        return self.file
+        # compression may still be running in the upload pool; otherwise it's in the job row
+        pending = uploadService.waitForUpload(self.id)
+        return pending[0] if pending else db.session.query(Job.file).filter(Job.id == self.id).scalar()
+
+    def getPrintFile(self):
+        # the arc-fitted variant when the upload made one, else the file as uploaded
+        pending = uploadService.waitForUpload(self.id)
+        if pending:
+            return pending[2] or pending[0]
+        return db.session.query(db.func.coalesce(Job.arc_file, Job.file)).filter(Job.id == self.id).scalar()
+
+    def getTimeProfile(self, family=None):
+        # cumulative seconds after each sent command as a float32 array, or None if it was never computed or was
+        # computed with other motion limits than the given printer family's
+        pending = uploadService.waitForUpload(self.id)
+        if pending:
+            data, model = pending[1], pending[4]
+        else:
+            row = db.session.query(Job.time_profile, Job.time_profile_model).filter(Job.id == self.id).first()
+            data, model = row if row else (None, None)
+        if MotionAnalyzer.limitsFor(model) != MotionAnalyzer.limitsFor(family):
+            return None
+        return MotionAnalyzer.fromBytes(data)
 
     def getStatus(self):
         return self.status
@@ -491,11 +733,6 @@ class Job(db.Model):
     def getFileFavorite(self):
         return self.favorite
     
-    def setFileFavorite(self, favorite):
-        self.favorite = favorite
-        db.session.commit()
-        return {"success": True, "message": "Favorite status updated successfully."}
-    
     def getPrinterId(self): 
         return self.printer_id
 
@@ -507,21 +744,24 @@ class Job(db.Model):
 
     def setFilePause(self, pause):
         self.filePause = pause
-        current_app.socketio.emit('file_pause_update', {
-                                  'job_id': self.id, 'file_pause': self.filePause})
+        stateService.jobChanged(self, file_pause=pause)
+        roomService.emit('file_pause_update', {
+                                  'job_id': self.id, 'file_pause': self.filePause}, self.printer_id, self.id)
     
     def getExtruded(self):
         return self.extruded
     
     def setExtruded(self, extruded):
         self.extruded = extruded
-        current_app.socketio.emit('extruded_update', {
-                                    'job_id': self.id, 'extruded': self.extruded}) 
+        stateService.jobChanged(self, extruded=extruded)
+        roomService.emit('extruded_update', {
+                                    'job_id': self.id, 'extruded': self.extruded}, self.printer_id, self.id) 
 
     # setters
 
     def setStatus(self, status):
         self.status = status
+        stateService.jobChanged(self, status=status)
         # self.setDBstatus(self.id, status)
 
     # added a setProgress method to update the progress of a job
@@ -529,9 +769,10 @@ class Job(db.Model):
     def setProgress(self, progress):
         if self.status == 'printing':
             self.progress = progress
+            stateService.jobChanged(self, progress=progress)
+            telemetryService.jobUpdated(self.printer_id, self.id, progress=progress)
             # Emit a 'progress_update' event with the new progress
-            current_app.socketio.emit(
-                'progress_update', {'job_id': self.id, 'progress': self.progress})
+            roomService.emit('progress_update', {'job_id': self.id, 'progress': self.progress}, self.printer_id, self.id)
 
     # added a getProgress method to get the progress of a job
     def getProgress(self):
@@ -539,7 +780,9 @@ class Job(db.Model):
     
     def setSentLines(self, sent_lines):
         self.sent_lines = sent_lines
-        current_app.socketio.emit('gcode_viewer', {'job_id': self.id, 'gcode_num': self.sent_lines})
+        stateService.jobChanged(self, sent_lines=sent_lines)
+        telemetryService.jobUpdated(self.printer_id, self.id, sent_lines=sent_lines)
+        roomService.emit('gcode_viewer', {'job_id': self.id, 'gcode_num': self.sent_lines}, self.printer_id, self.id)
         
     def getSentLines(self):
         return self.sent_lines
@@ -627,18 +870,39 @@ class Job(db.Model):
     
     def getTdId(self): 
         return self.td_id
+
+    def removeFileFromPath(self, file_path):
+        Job.removeFileFromPath(file_path)
     
     def setMaxLayerHeight(self, max_layer_height):
         self.max_layer_height = max_layer_height
-        current_app.socketio.emit('max_layer_height', {'job_id': self.id, 'max_layer_height': self.max_layer_height})
+        stateService.jobChanged(self, max_layer_height=max_layer_height)
+        telemetryService.jobUpdated(self.printer_id, self.id, max_layer_height=max_layer_height)
+        roomService.emit('max_layer_height', {'job_id': self.id, 'max_layer_height': self.max_layer_height}, self.printer_id, self.id)
 
     def setCurrentLayerHeight(self, current_layer_height):
         print("Current Layer Height: ", current_layer_height)
         self.current_layer_height = current_layer_height
-        current_app.socketio.emit('current_layer_height', {'job_id': self.id, 'current_layer_height': self.current_layer_height})
+        stateService.jobChanged(self, current_layer_height=current_layer_height)
+        telemetryService.jobUpdated(self.printer_id, self.id, current_layer_height=current_layer_height)
+        roomService.emit('current_layer_height', {'job_id': self.id, 'current_layer_height': self.current_layer_height}, self.printer_id, self.id)
 
     def setFilament(self, filament):
         self.filament = filament
+        eventService.setFilament(self.id, filament)
+        stateService.jobChanged(self, filament=filament)
+
+    def setUploadInfo(self, info):
+        # info is the jobHistoryInsert/batchInsert result, carrying metadata scanned from the upload
+        self.estimated_time = info.get('estimated_time')
+        self.printer_model = info.get('printer_model', '')
+        self.profile = info.get('profile', '')
+
+    def getEstimatedTime(self):
+        return self.estimated_time
+
+    def getPrinterModel(self):
+        return self.printer_model
     
     def setPath(self, path): 
         self.path = path 
@@ -646,23 +910,26 @@ class Job(db.Model):
     def setFileName(self, filename):
         self.file_name_pk = filename
 
-    def setFile(self, file):
-        self.file = file
-
     def setReleased(self, released):
         self.released = released
-        current_app.socketio.emit('release_job', {'job_id': self.id, 'released': released}) 
+        stateService.jobChanged(self, released=released)
+        if released == 1:
+            eventService.record(self.id, 'released', self.printer_id)
+        roomService.emit('release_job', {'job_id': self.id, 'released': released}, self.printer_id, self.id) 
 
     def setTimeStarted(self, time_started):
             self.time_started = time_started
-            current_app.socketio.emit('set_time_started', {'job_id': self.id, 'started': time_started}) 
+            stateService.jobChanged(self, time_started=time_started)
+            roomService.emit('set_time_started', {'job_id': self.id, 'started': time_started}, self.printer_id, self.id) 
 
 
     def setTime(self, timeData, index):
         # timeData = datetime(y, m, d, h, min, s)
         # print("TimeData: ", timeData, " Index: ", index)
         self.job_time[index] = timeData
+        if index==1:
+            telemetryService.jobUpdated(self.printer_id, self.id, eta=timeData)
         if index==0: 
-            current_app.socketio.emit('set_time', {'job_id': self.id, 'new_time': timeData, 'index': index}) 
+            roomService.emit('set_time', {'job_id': self.id, 'new_time': timeData, 'index': index}, self.printer_id, self.id) 
         else: 
-            current_app.socketio.emit('set_time', {'job_id': self.id, 'new_time': timeData.isoformat(), 'index': index}) 
\ No newline at end of file
+            roomService.emit('set_time', {'job_id': self.id, 'new_time': timeData.isoformat(), 'index': index}, self.printer_id, self.id) 
\ No newline at end of file
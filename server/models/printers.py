@@ -1,5 +1,5 @@
 import re
-from models.db import db
+from models.db import db, unitOfWork
 from datetime import datetime, timezone
 from sqlalchemy import Column, String, LargeBinary, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
@@ -13,12 +13,23 @@ from datetime import datetime, timezone, timedelta
 from tzlocal import get_localzone
 import os
 import json
+import bisect
+from collections import deque
 import requests
 from dotenv import load_dotenv
 
 from models.config import Config
+from models.printrecords import PrintRecord
+from services import etaService, schedulerService, eventService, stateService, roomService, telemetryService, uploadService
+from Classes import BGCode, MeatPack, MotionAnalyzer
+from Classes.transports import openTransport, CardControl
 
 load_dotenv()
+
+# bytes of unanswered lines kept in flight while copying a file to the printer's card: Marlin's default serial
+# receive buffer is 128 bytes, and what doesn't fit there would be dropped
+STORAGE_WINDOW = 127
+
 # model for Printer table
 class Printer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -31,41 +42,18 @@ class Printer(db.Model):
         default=lambda: datetime.now(timezone.utc).astimezone(),
         nullable=False,
     )
-    queue = None
-    ser = None
-    # default setting on printer start. Runs initialization and status switches to "ready" automatically.
-    status = None
-    # stopPrint = False
-    responseCount = 0  # if count == 10 & no response, set error
-    error = ""
-    extruder_temp = 0
-    bed_temp = 0
-    canPause = 0
-    prevMes = ""
-    colorbuff = 0
-    terminated = 0
-
-    def __init__(self, device, description, hwid, name, status=status, id=None):
+
+    # the connection, queue and print state of a running printer live in PrinterRuntime below;
+    # rows are only used for registration and persistence
+    def __init__(self, device, description, hwid, name, status=None, id=None):
         self.device = device
         self.description = description
         self.hwid = hwid
         self.name = name
-        self.status = status
         self.date = datetime.now(get_localzone())
-        self.queue = Queue()
-        self.stopPrint = False
-        self.error = ""
-        self.extruder_temp = 0
-        self.bed_temp = 0
-        self.canPause = 0
-        self.prevMes=""
-        self.colorbuff=0
-        self.terminated = 0
-        # self.colorChangeBuffer=0
 
         if id is not None:
             self.id = id
-        self.responseCount = 0
 
     # general classes
     @classmethod
@@ -135,6 +123,7 @@ class Printer(db.Model):
         try:
             # Query the database to get all registered printers
             printers = cls.query.all()
+            statuses = cls.runtimeStatuses()
 
             # Convert the list of printers to a list of dictionaries
             printers_data = [
@@ -144,7 +133,7 @@ class Printer(db.Model):
                     "description": printer.description,
                     "hwid": printer.hwid,
                     "name": printer.name,
-                    "status": printer.status,
+                    "status": statuses.get(printer.id, "offline"),
                     # Include timezone abbreviation
                     "date": f"{printer.date.strftime('%a, %d %b %Y %H:%M:%S')} {get_localzone().tzname(printer.date)}",
                 }
@@ -160,6 +149,17 @@ class Printer(db.Model):
                 500,
             )
 
+    @staticmethod
+    def runtimeStatuses():
+        # printer id -> status of the printers running in this process or the printer daemon. the row has no
+        # status of its own; a printer with no running thread (e.g. during startup) is offline
+        try:
+            from app import printer_status_service
+            return {printer_id: status for printer_id, status in printer_status_service.printerStatuses()}
+        except Exception as e:
+            print(f"Error reading printer statuses: {e}")
+            return {}
+
     @classmethod
     def getConnectedPorts(cls, retries=3, delay=2):
         """Detects all available printer ports with retries."""
@@ -290,9 +290,7 @@ class Printer(db.Model):
             printer.device = printerport
             db.session.commit()
             
-            current_app.socketio.emit(
-                "port_repair", {"printer_id": printerid, "device": printerport}
-            )
+            roomService.emit("port_repair", {"printer_id": printerid, "device": printerport}, printerid)
             return {"success": True, "message": "Printer port successfully updated."}
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
@@ -303,7 +301,7 @@ class Printer(db.Model):
             
     @classmethod 
     def moveHead(cls, device):
-        ser = serial.Serial(device, 115200, timeout=1)
+        ser = openTransport(device, timeout=1)
         # message = "G91\nG1 Z10 F3000\nG90"
         message = "G28"
          # Encode and send the message to the printer.
@@ -323,10 +321,68 @@ class Printer(db.Model):
         ser.close()
         return 
         
+    @classmethod 
+    def repairPorts(cls):
+        try:
+            response = requests.post(f"{Config.get('base_url')}/repairports")
+
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to repair ports: {e}")
+            
+    @classmethod 
+    def hardReset(cls, printerid, status):
+        try:
+            response = requests.post(f"{Config.get('base_url')}/queuerestore", json={'printerid': printerid, 'status': status})
+
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to repair ports: {e}")   
+
+    def getDevice(self):
+        return self.device
+
+    def getId(self):
+        return self.id
+
+
+# a printer thread's live state: serial connection, queue, status and the print loop. one per printer thread,
+# created by PrinterStatusService from the registered printer's row fields, never attached to a session
+class PrinterRuntime:
+    __slots__ = (
+        'id', 'device', 'description', 'hwid', 'name', 'status', 'queue', 'ser', 'stopPrint', 'responseCount',
+        'error', 'extruder_temp', 'bed_temp', 'canPause', 'prevMes', 'colorbuff', 'terminated', 'filament', 'worker',
+        'meatpack',
+    )
+
+    def __init__(self, device, description, hwid, name, status=None, id=None):
+        self.id = id
+        self.device = device
+        self.description = description
+        self.hwid = hwid
+        self.name = name
+        # default setting on printer start. Runs initialization and status switches to "ready" automatically.
+        self.status = status
+        self.queue = Queue()
+        self.ser = None
+        self.stopPrint = False
+        self.responseCount = 0  # if count == 10 & no response, set error
+        self.error = ""
+        self.extruder_temp = 0
+        self.bed_temp = 0
+        self.canPause = 0
+        self.prevMes = ""
+        self.colorbuff = 0
+        self.terminated = 0
+        self.filament = "" # filament loaded, used to match auto-queued jobs. Empty accepts any
+        self.worker = None # PrintWorker running this printer's print loop, when printWorkers is on
+        self.meatpack = False # whether commands go out MeatPack-packed (meatPack in config, once the firmware agreed)
+
     def connect(self):
         try:
-            self.ser = serial.Serial(self.device, 115200, timeout=10)
+            self.ser = openTransport(self.device, timeout=10)
             self.ser.write(f"M155 S5\n".encode("utf-8"))
+            self.meatpack = False
+            if self.configured('meatpack') and not getattr(self.ser, "uploads", False):
+                self.negotiateMeatPack()
         except Exception as e:
             self.setError(e)
             return "error"
@@ -334,9 +390,43 @@ class Printer(db.Model):
     def disconnect(self):
         if self.ser:
             # self.ser.write(f"M155 S0\n".encode("utf-8"))
+            if self.meatpack:
+                self.meatpack = False
+                try:
+                    self.ser.write(MeatPack.DISABLE) # the firmware keeps packing on across host connections
+                except Exception:
+                    pass
             self.ser.close()
             self.setSer(None)
 
+    def negotiateMeatPack(self):
+        # asks the firmware whether it decodes MeatPack and turns packing on (without spaces) if it does.
+        # firmware without it sees one unknown command, and every command keeps going out as plain text
+        self.ser.write(MeatPack.QUERY + b"\n")
+        self.ser.write(b"M105\n")
+        supported = False
+        for _ in range(20):
+            response = self.ser.readline().decode("utf-8", "replace").strip()
+            if response == "":
+                break
+            if MeatPack.report(response):
+                supported = True
+            if response.startswith("ok") and "T:" in response:
+                break
+        if not supported:
+            print(f"Printer {self.id} does not support MeatPack, sending plain G-code")
+            return
+        self.ser.write(MeatPack.ENABLE + MeatPack.NO_SPACES)
+        for _ in range(10):
+            state = MeatPack.report(self.ser.readline().decode("utf-8", "replace").strip())
+            if state == (True, True):
+                self.meatpack = True
+                return
+
+    def encode(self, message):
+        # a command as it goes on the wire: packed when MeatPack is on, else the plain line
+        return MeatPack.pack(message) if self.meatpack else f"{message}\n".encode("utf-8")
+
     def reset(self):
         self.sendGcode("G28")
         self.sendGcode("G92 E0")
@@ -345,7 +435,7 @@ class Printer(db.Model):
     def sendGcode(self, message):
         try:
             # Encode and send the message to the printer.
-            self.ser.write(f"{message}\n".encode("utf-8"))
+            self.ser.write(self.encode(message))
             # Sleep the printer to give it enough time to get the instruction.
             # time.sleep(0.1)
             # Save and print out the response from the printer. We can use this for error handling and status updates.
@@ -387,7 +477,7 @@ class Printer(db.Model):
 
     def gcodeEnding(self, message):
         try: 
-            self.ser.write(f"{message}\n".encode("utf-8"))
+            self.ser.write(self.encode(message))
             # Save and print out the response from the printer. We can use this for error handling and status updates.
             while True:
                 if(self.terminated==1): 
@@ -415,160 +505,199 @@ class Printer(db.Model):
             self.setError(e)
             return "error"
 
+    def scanGcode(self, lines):
+        # one pass over the file: the number of commands, the height of the last layer and the comments the
+        # slicer's time estimate can be in (the first two, or the first one mentioning the time; see getTimeFromFile)
+        total_lines, max_layer_height = 0, 0
+        time_comments, found_time, prev_comment = [], False, ""
+        for line in lines:
+            if not line.strip():
+                continue
+            if not line.startswith(";"):
+                total_lines += 1
+                continue
+            # the ";Z:" comment after the last ";LAYER_CHANGE" is the height of the top layer
+            if ";LAYER_CHANGE" in prev_comment:
+                match = re.search(r";Z:(\d+\.?\d*)", line)
+                if match:
+                    max_layer_height = float(match.group(1))
+            prev_comment = line
+            if len(time_comments) < 2 or (not found_time and "time" in line):
+                time_comments.append(line)
+                found_time = found_time or "time" in line
+        return total_lines, max_layer_height, time_comments
+
+    def prepareJob(self, lines, job):
+        # layer height and time estimates; returns the cumulative print time after each command and the number of
+        # commands. binary G-code has the estimate and top layer in its metadata blocks and the upload's time profile
+        # has an entry per command, so then the G-code isn't decoded here at all; otherwise it's read once
+        family = schedulerService.printerFamily(self)  # motion limits come from this printer, not the slicer's model
+        with unitOfWork():
+            cumulative = job.getTimeProfile(family)
+        profiled = cumulative is not None and len(cumulative) > 0
+        metadata = {}
+        if isinstance(lines, BGCode.Lines):
+            with open(lines.path, "rb") as f:
+                metadata = uploadService.bgcodeMetadata(f)
+
+        # the upload's estimate when it had one (binary G-code carries it in a metadata block, not in the comments)
+        total_time = job.getEstimatedTime() or metadata.get('estimated_time')
+        max_layer_height = metadata.get('max_layer_height', 0)
+        total_lines = len(cumulative) if profiled else 0
+        if not (profiled and total_time and max_layer_height):
+            total_lines, scanned_height, time_comments = self.scanGcode(lines)
+            max_layer_height = max_layer_height or scanned_height
+            total_time = total_time or job.getTimeFromFile(time_comments)
+        if max_layer_height != 0:
+            job.setMaxLayerHeight(max_layer_height)
+
+        if not job.getEstimatedTime():
+            job.estimated_time = total_time
+        # correct the slicer estimate with what this printer has actually taken on past prints
+        total_time = round(etaService.predict(self.id, job.profile, total_time))
+        job.predicted_time = total_time
+        job.setTime(total_time, 0)
+
+        # cumulative print time after each sent command, so progress/ETA follow print time rather than line count
+        if not profiled:
+            cumulative = MotionAnalyzer.analyze(lines, family)
+        return cumulative, total_lines
+
     def parseGcode(self, path, job):
         try:
-            with open(path, "r") as g:
-                # Read the file and store the lines in a list
+            if(self.terminated==1): 
+                return 
+            
+            lines = BGCode.readLines(path) # binary G-code is decoded block by block as it's sent
+
+            # Only send the lines that are not empty and don't start with ";"
+            # so we can correctly get the progress
+            # store the total to find the percentage later on
+            cumulative, total_lines = self.prepareJob(lines, job)
+            last_percent = -1
+            # set the sent lines to 0
+            sent_lines = 0
+            # previous line to check for layer height
+            prev_line = ""
+            # Replace file with the path to the file. "r" means read mode. 
+            # now instead of reading from 'g', we are reading line by line
+            for line in lines:
                 if(self.terminated==1): 
                     return 
                 
-                lines = g.readlines()
-
-                #  Time handling
-                comment_lines = [line for line in lines if line.strip() and line.startswith(";")]
-
-                max_layer_height = 0
-                for i in reversed(range(len(comment_lines))):
-                    # Check if the line contains ";LAYER_CHANGE"
-                    if ";LAYER_CHANGE" in comment_lines[i]:
-                        # Check if the next line exists
-                        if i < len(comment_lines) - 1:
-                            # Save the next line
-                            line = comment_lines[i + 1]
-                            # Use regex to find the numerical value after ";Z:"
-                            match = re.search(r";Z:(\d+\.?\d*)", line)
-                            if match:
-                                max_layer_height = float(match.group(1))
-                                break       
-                if max_layer_height != 0:
-                    job.setMaxLayerHeight(max_layer_height)
+                # print("LINE: ", line, " STATUS: ", self.status, " FILE PAUSE: ", job.getFilePause())
+                if("layer" in line.lower() and self.status=='colorchange' and job.getFilePause()==0 and self.colorbuff==0):
+                    self.setColorChangeBuffer(1)
+
+                # if line contains ";LAYER_CHANGE", do job.currentLayerHeight(the next line)
+                if prev_line and ";LAYER_CHANGE" in prev_line:
+                    match = re.search(r";Z:(\d+\.?\d*)", line)
+                    if match:
+                        current_layer_height = float(match.group(1))
+                        job.setCurrentLayerHeight(current_layer_height)
+                prev_line = line
+
+                # remove whitespace
+                line = line.strip()
+                # Don't send empty lines and comments. ";" is a comment in gcode.
+                if ";" in line:  # Remove inline comments
+                    line = line.split(";")[
+                        0
+                    ].strip()  # Remove comments starting with ";"
+
+                if len(line) == 0 or line.startswith(";"):
+                    continue
+
+                if("M569" in line) and job.getTimeStarted()==0:
+                    job.setTimeStarted(1)
+                    job.setTime(job.calculateEta(), 1)
+                    job.setTime(datetime.now(), 2)
+             
+                res = self.sendGcode(line)
                 
-
-                total_time = job.getTimeFromFile(comment_lines)
-                job.setTime(total_time, 0)
-                # job.setTime(total_time, 0)
-
-                # Only send the lines that are not empty and don't start with ";"
-                # so we can correctly get the progress
-                command_lines = [
-                    line for line in lines if line.strip() and not line.startswith(";")
-                ]
-                # store the total to find the percentage later on
-                total_lines = len(command_lines)
-                # set the sent lines to 0
-                sent_lines = 0
-                # previous line to check for layer height
-                prev_line = ""
-                # Replace file with the path to the file. "r" means read mode. 
-                # now instead of reading from 'g', we are reading line by line
-                for line in lines:
-                    if(self.terminated==1): 
-                        return 
-                    
-                    # print("LINE: ", line, " STATUS: ", self.status, " FILE PAUSE: ", job.getFilePause())
-                    if("layer" in line.lower() and self.status=='colorchange' and job.getFilePause()==0 and self.colorbuff==0):
-                        self.setColorChangeBuffer(1)
-
-                    # if line contains ";LAYER_CHANGE", do job.currentLayerHeight(the next line)
-                    if prev_line and ";LAYER_CHANGE" in prev_line:
-                        match = re.search(r";Z:(\d+\.?\d*)", line)
-                        if match:
-                            current_layer_height = float(match.group(1))
-                            job.setCurrentLayerHeight(current_layer_height)
-                    prev_line = line
-
-                    # remove whitespace
-                    line = line.strip()
-                    # Don't send empty lines and comments. ";" is a comment in gcode.
-                    if ";" in line:  # Remove inline comments
-                        line = line.split(";")[
-                            0
-                        ].strip()  # Remove comments starting with ";"
-
-                    if len(line) == 0 or line.startswith(";"):
-                        continue
-
-                    if("M569" in line) and job.getTimeStarted()==0:
-                        job.setTimeStarted(1)
-                        job.setTime(job.calculateEta(), 1)
-                        job.setTime(datetime.now(), 2)
-                 
-                    res = self.sendGcode(line)
-                    
-                    if(job.getFilePause() == 1):
-                        # self.setStatus("printing")
-                        job.setTime(job.colorEta(), 1)
-                        job.setTime(job.calculateColorChangeTotal(), 0)
-                        job.setTime(datetime.min, 3)
-                        job.setFilePause(0)
-                        if(self.getStatus()=="complete"):
-                            return "cancelled"
-                        self.setStatus("printing")
-                    
-                    if("M600" in line):
-                        job.setTime(datetime.now(), 3)
-                        # job.setTime(job.calculateTotalTime(), 0)
-                        # job.setTime(job.updateEta(), 1)
-                        self.setStatus("colorchange")
-                        # self.setColorChangeBuffer(3)
-                        # self.setColorChangeBuffer(1)
-                        job.setFilePause(1)
-
-                    if("M569" in line) and (job.getExtruded()==0):
-                        job.setExtruded(1)
-                    
-                    if self.prevMes == "M602":
-                        self.prevMes=""
-                             
-                #  software pausing        
-                    if (self.getStatus()=="paused"):
-                        # self.prevMes = "M601"
-                        self.sendGcode("M601") # pause command for prusa
-                        job.setTime(datetime.now(), 3)
-                        while(True):
-                            time.sleep(1)
-                            stat = self.getStatus()
-                            if(stat=="printing"):
-                                self.prevMes = "M602"
-
-                                self.sendGcode("M602") # resume command for prusa
-
-                                time.sleep(2)
-                                job.setTime(job.colorEta(), 1)
-                                job.setTime(job.calculateColorChangeTotal(), 0)
-                                job.setTime(datetime.min, 3)
-                                break
-                    
-                    # software color change
-                    if (self.getStatus()=="colorchange" and job.getFilePause()==0 and self.colorbuff==1):
-                        job.setTime(datetime.now(), 3)
-                        # job.setTime(job.calculateTotalTime(), 0)
-                        # job.setTime(job.updateEta(), 1)
-                        print("SENDING COLORCHANGE")
-                        self.sendGcode("M600") # color change command
-                        job.setTime(job.colorEta(), 1)
-                        job.setTime(job.calculateColorChangeTotal(), 0)
-                        job.setTime(datetime.min, 3)
-                        job.setFilePause(1)
-                        self.setColorChangeBuffer(0)
-                        # self.setStatus("printing")
-
-                    # Increment the sent lines
-                    sent_lines += 1
-                    job.setSentLines(sent_lines)
-                    # Calculate the progress
+                if(job.getFilePause() == 1):
+                    # self.setStatus("printing")
+                    job.setTime(job.colorEta(), 1)
+                    job.setTime(job.calculateColorChangeTotal(), 0)
+                    job.setTime(datetime.min, 3)
+                    job.setFilePause(0)
+                    if(self.getStatus()=="complete"):
+                        return "cancelled"
+                    self.setStatus("printing")
+                
+                if("M600" in line):
+                    job.setTime(datetime.now(), 3)
+                    # job.setTime(job.calculateTotalTime(), 0)
+                    # job.setTime(job.updateEta(), 1)
+                    self.setStatus("colorchange")
+                    # self.setColorChangeBuffer(3)
+                    # self.setColorChangeBuffer(1)
+                    job.setFilePause(1)
+
+                if("M569" in line) and (job.getExtruded()==0):
+                    job.setExtruded(1)
+                
+                if self.prevMes == "M602":
+                    self.prevMes=""
+                         
+            #  software pausing        
+                if (self.getStatus()=="paused"):
+                    # self.prevMes = "M601"
+                    self.sendGcode("M601") # pause command for prusa
+                    job.setTime(datetime.now(), 3)
+                    while(True):
+                        time.sleep(1)
+                        stat = self.getStatus()
+                        if(stat=="printing"):
+                            self.prevMes = "M602"
+
+                            self.sendGcode("M602") # resume command for prusa
+
+                            time.sleep(2)
+                            job.setTime(job.colorEta(), 1)
+                            job.setTime(job.calculateColorChangeTotal(), 0)
+                            job.setTime(datetime.min, 3)
+                            break
+                
+                # software color change
+                if (self.getStatus()=="colorchange" and job.getFilePause()==0 and self.colorbuff==1):
+                    job.setTime(datetime.now(), 3)
+                    # job.setTime(job.calculateTotalTime(), 0)
+                    # job.setTime(job.updateEta(), 1)
+                    print("SENDING COLORCHANGE")
+                    self.sendGcode("M600") # color change command
+                    job.setTime(job.colorEta(), 1)
+                    job.setTime(job.calculateColorChangeTotal(), 0)
+                    job.setTime(datetime.min, 3)
+                    job.setFilePause(1)
+                    self.setColorChangeBuffer(0)
+                    # self.setStatus("printing")
+
+                # Increment the sent lines
+                sent_lines += 1
+                job.setSentLines(sent_lines)
+                # Calculate the progress
+                if sent_lines <= len(cumulative) and cumulative[-1] > 0:
+                    done = float(cumulative[sent_lines - 1] / cumulative[-1])
+                    progress = done * 100
+                    # refresh the ETA from the time profile once per percent while printing normally
+                    if int(progress) != last_percent and job.getTimeStarted() == 1 and job.getFilePause() == 0 and self.getStatus() == "printing":
+                        last_percent = int(progress)
+                        remaining = (1 - done) * (job.predicted_time or float(cumulative[-1]))
+                        job.setTime(datetime.now() + timedelta(seconds=remaining), 1)
+                else:
                     progress = (sent_lines / total_lines) * 100
 
-                    # Call the setProgress method
-                    job.setProgress(progress)
+                # Call the setProgress method
+                job.setProgress(progress)
+            
                 
-                    
-                    # if self.getStatus() == "complete" and job.extruded != 0:
-                    if self.getStatus() == "complete":
-                        return "cancelled"
+                # if self.getStatus() == "complete" and job.extruded != 0:
+                if self.getStatus() == "complete":
+                    return "cancelled"
 
-                    if self.getStatus() == "error":
-                        return "error"
+                if self.getStatus() == "error":
+                    return "error"
 
             return "complete"
         except Exception as e:
@@ -576,6 +705,207 @@ class Printer(db.Model):
             self.setError(e)
             return "error"
 
+    def configured(self, key):
+        # per-printer switches in config: true for every printer, or a list of printer ids
+        setting = Config.get(key)
+        return setting is True or (isinstance(setting, list) and self.id in setting)
+
+    def printsFromStorage(self):
+        return self.configured('sd_print')
+
+    def queryGcode(self, message):
+        # sends a command and returns the lines the printer answered with before its "ok"
+        self.ser.write(self.encode(message))
+        responses = []
+        while True:
+            response = self.ser.readline().decode("utf-8").strip()
+            if response == "":
+                self.responseCount += 1
+                if self.responseCount >= 10:
+                    raise Exception("No response from printer")
+                continue
+            self.responseCount = 0
+            if "error" in response.lower():
+                raise Exception(response)
+            temp_t = re.search(r'T:(\d+.\d+)', response)
+            temp_b = re.search(r'B:(\d+.\d+)', response)
+            if temp_t and temp_b:
+                self.setTemps(temp_t.group(1), temp_b.group(1))
+            if response.startswith("ok"):
+                return responses
+            responses.append(response)
+
+    def printFromStorage(self, path, job):
+        # sdPrint mode: the file is copied to the printer's SD/USB storage (M28/M29) and printed from there (M23/M24),
+        # so the host only polls the byte position (M27) every few seconds instead of streaming every line
+        try:
+            lines = BGCode.readLines(path)
+            cumulative, _ = self.prepareJob(lines, job)
+            commands, offsets, layers = self.storageLayout(lines, stripped=True)
+
+            name = f"QV{job.id % 1000000:06d}.GCO" # 8.3 name, what every firmware's card code accepts
+            self.ser.reset_input_buffer() # drop stray replies (e.g. to M155 on connect) so each "ok" lines up with its command
+            self.sendGcode(f"M28 {name}")
+            if self.uploadToStorage(commands) != "complete":
+                return "error" if self.getStatus() == "error" else None
+            self.sendGcode(f"M29 {name}")
+
+            self.sendGcode(f"M23 {name}")
+            self.sendGcode("M24")
+            job.setTimeStarted(1)
+            job.setTime(job.calculateEta(), 1)
+            job.setTime(datetime.now(), 2)
+            verdict = self.watchStoragePrint(job, CardControl(self), offsets, layers, cumulative)
+            if verdict in ("complete", "cancelled"):
+                self.sendGcode(f"M30 {name}") # don't leave it on the card
+            return verdict
+        except Exception as e:
+            self.setError(e)
+            return "error"
+
+    def printOverNetwork(self, path, job):
+        # network printers (Classes/NetworkTransport.py): the file is uploaded and started through the printer's API,
+        # which pushes the byte position it's at back over its status feed
+        text_path = None
+        try:
+            if BGCode.isFile(path):
+                # uploaded as text, so the byte positions the printer reports match the offsets below
+                text_path = f"{path}.gcode"
+                BGCode.writeText(path, text_path)
+                path = text_path
+            with open(path, "r", newline="") as g:
+                lines = g.readlines()
+            cumulative, _ = self.prepareJob(lines, job)
+            commands, offsets, layers = self.storageLayout(lines, stripped=False)
+
+            name = f"qview3d-{job.id}.gcode"
+            self.ser.printFile(path, name)
+            job.setTimeStarted(1)
+            job.setTime(job.calculateEta(), 1)
+            job.setTime(datetime.now(), 2)
+            verdict = self.watchStoragePrint(job, self.ser, offsets, layers, cumulative)
+            if verdict in ("complete", "cancelled"):
+                self.ser.deleteFile(name)
+            return verdict
+        except Exception as e:
+            self.setError(e)
+            return "error"
+        finally:
+            if text_path:
+                job.removeFileFromPath(text_path)
+
+    def uploadToStorage(self, commands):
+        # the lines between M28 and M29. the firmware only writes them to the card, so instead of a round trip per
+        # line, lines go out while the ones not yet answered fit in the firmware's receive buffer (character
+        # counting, as Grbl senders do); each "ok" frees the bytes of the oldest line. "complete", "error", or None
+        # when the printer thread is stopped
+        pending = deque()  # bytes on the wire of each line not answered yet
+        in_flight = 0
+        for command in list(commands) + [None]:
+            data = self.encode(command) if command is not None else b""
+            while pending and (command is None or in_flight + len(data) > STORAGE_WINDOW):
+                if(self.terminated==1):
+                    return
+                response = self.ser.readline().decode("utf-8").strip()
+                if response == "":
+                    self.responseCount += 1
+                    if self.responseCount >= 10:
+                        self.setError("No response from printer")
+                        return "error"
+                    continue
+                self.responseCount = 0
+                if "error" in response.lower():
+                    self.setError(response)
+                    return "error"
+                if "ok" in response:
+                    in_flight -= pending.popleft()
+            if command is not None:
+                self.ser.write(data)
+                pending.append(len(data))
+                in_flight += len(data)
+        return "complete"
+
+    def storageLayout(self, lines, stripped):
+        # the file's commands, with the byte offset each one ends at and the layer it's on. offsets count the
+        # commands alone when the file is stored stripped of comments (M28), or every byte when it's stored as is.
+        # stripped commands are returned as the firmware stores them: with MeatPack on, that's without their spaces
+        commands, offsets, layers = [], [], []
+        size, layer, prev_line = 0, 0.0, ""
+        for line in lines:
+            if prev_line and ";LAYER_CHANGE" in prev_line:
+                match = re.search(r";Z:(\d+\.?\d*)", line)
+                if match:
+                    layer = float(match.group(1))
+            prev_line = line
+            command = line.split(";")[0].strip()
+            if stripped and self.meatpack:
+                command = MeatPack.compact(command)
+            if not stripped:
+                size += len(line.encode("utf-8"))
+            if command:
+                commands.append(command)
+                if stripped:
+                    size += len(command) + 1
+                offsets.append(size)
+                layers.append(layer)
+        return commands, offsets, layers
+
+    def watchStoragePrint(self, job, control, offsets, layers, cumulative):
+        # follows a print the printer runs on its own. control is CardControl for card prints or the NetworkTransport
+        last_percent = -1
+        while True:
+            time.sleep(control.poll_interval)
+            if(self.terminated==1):
+                return
+            status = self.getStatus()
+            if status == "complete": # cancelled from the UI
+                control.cancel()
+                return "cancelled"
+            if status == "error":
+                return "error"
+            if status == "paused":
+                control.pause()
+                job.setTime(datetime.now(), 3)
+                while self.getStatus() == "paused" and self.terminated == 0:
+                    time.sleep(1)
+                if self.getStatus() == "printing":
+                    control.resume()
+                    job.setTime(job.colorEta(), 1)
+                    job.setTime(job.calculateColorChangeTotal(), 0)
+                    job.setTime(datetime.min, 3)
+                continue
+            if status == "colorchange" and self.colorbuff == 1:
+                # the firmware runs the filament change and resumes when it's confirmed on the printer
+                control.colorChange()
+                self.setColorChangeBuffer(0)
+                self.setStatus("printing")
+
+            temps = control.temps()
+            if temps:
+                self.setTemps(*temps)
+            position = control.position()
+            if position is None:
+                job.setSentLines(len(offsets))
+                job.setProgress(100)
+                return "complete"
+            printed, total = position
+            sent_lines = min(bisect.bisect_right(offsets, printed), len(offsets))
+            job.setSentLines(sent_lines)
+            if sent_lines and job.getExtruded() == 0:
+                job.setExtruded(1)
+            if sent_lines and layers[sent_lines - 1] != job.current_layer_height:
+                job.setCurrentLayerHeight(layers[sent_lines - 1])
+            if 0 < sent_lines <= len(cumulative) and cumulative[-1] > 0:
+                done = float(cumulative[sent_lines - 1] / cumulative[-1])
+            else:
+                done = printed / total if total else 0
+            progress = done * 100
+            if int(progress) != last_percent and self.getStatus() == "printing":
+                last_percent = int(progress)
+                remaining = (1 - done) * (job.predicted_time or float(cumulative[-1] if len(cumulative) else 0))
+                job.setTime(datetime.now() + timedelta(seconds=remaining), 1)
+            job.setProgress(progress)
+
     # Function to send "ending" gcode commands
     def endingSequence(self, job=None):
         try:
@@ -635,14 +965,10 @@ class Printer(db.Model):
             
             if begin==True: 
                 Printer.repairPorts() 
-                self.connect()
-                if self.getSer():
-                    self.responseCount = 0
-                    job.saveToFolder()
-                    path = job.generatePath()
-                    verdict = self.parseGcode(path, job)  # passes file to code. returns "complete" if successful, "error" if not.
+                # the loop runs here, or in this printer's worker process when printWorkers is on
+                verdict = self.worker.run(self, job) if self.worker else self.execute(job)
+                if verdict != "unconnected":
                     self.handleVerdict(verdict, job)
-                    job.removeFileFromPath(path)  # remove file from folder after job complete
                 else:
                     self.getQueue().deleteJob(job.id, self.id)
                     # self.setStatus("error")
@@ -668,12 +994,35 @@ class Printer(db.Model):
             return 
             # self.handleVerdict("error", job)
 
+    def execute(self, job):
+        # connect and send the job's file; returns the parseGcode verdict, or "unconnected"
+        self.connect()
+        if not self.getSer():
+            return "unconnected"
+        self.responseCount = 0
+        with unitOfWork():
+            job.saveToFolder()
+        path = job.generatePath()
+        try:
+            if getattr(self.ser, "uploads", False):
+                return self.printOverNetwork(path, job)
+            if self.printsFromStorage():
+                return self.printFromStorage(path, job)
+            return self.parseGcode(path, job)  # passes file to code. returns "complete" if successful, "error" if not.
+        finally:
+            job.removeFileFromPath(path)  # remove file from folder after job complete
+
+    def terminate(self):
+        # stops this printer's loop; the thread taking its place is started by the caller
+        self.terminated = 1
+        if self.worker:
+            self.worker.control(self, 'terminated', 1)
+
     def setErrorMessage(self, error):
         self.error = str(error)
+        stateService.printerChanged(self, error=self.error)
         self.setStatus("error")
-        current_app.socketio.emit(
-            "error_update", {"printerid": self.id, "error": self.error}
-        )
+        roomService.emit("error_update", {"printerid": self.id, "error": self.error}, self.id)
             
     def beginPrint(self, job): 
         while True: 
@@ -686,6 +1035,8 @@ class Printer(db.Model):
     def handleVerdict(self, verdict, job):
         # self.disconnect()
         if verdict == "complete":
+            with unitOfWork():
+                PrintRecord.record(job, self.id) # actual vs. estimated time, feeds the ETA model
             self.disconnect()
             self.setStatus("complete")
             self.sendStatusToJob(job, job.id, "complete")
@@ -697,7 +1048,8 @@ class Printer(db.Model):
             self.sendStatusToJob(job, job.id, "error")
             # self.setError("Error")
         elif verdict == "cancelled":
-            self.endingSequence(job)
+            if self.getSer(): # a worker process runs the ending sequence on its own connection
+                self.endingSequence(job)
             self.sendStatusToJob(job, job.id, "cancelled")
             self.disconnect()
         elif verdict== "misprint": 
@@ -746,6 +1098,7 @@ class Printer(db.Model):
 
     def setDevice(self, device): 
         self.device = device 
+        stateService.printerChanged(self, device=device)
 
     #  now when we set the status, we can emit the status to the frontend
 
@@ -756,10 +1109,15 @@ class Printer(db.Model):
                 Printer.hardReset(self.id, newStatus)
             else: 
                 self.status = newStatus
+                stateService.printerChanged(self, status=newStatus)
+                telemetryService.printerUpdated(self.id, status=newStatus)
+                if self.worker:
+                    self.worker.control(self, 'status', newStatus) # pause/resume/cancel reach the loop there
 
-            current_app.socketio.emit(
-                "status_update", {"printer_id": self.id, "status": newStatus}
-            )
+            if newStatus in ("paused", "colorchange") and self.queue and self.queue.getSize() > 0:
+                eventService.record(self.queue.getNext().id, newStatus, self.id)
+
+            roomService.emit("status_update", {"printer_id": self.id, "status": newStatus}, self.id)
         except Exception as e:
             print("Error setting status:", e)
 
@@ -769,10 +1127,9 @@ class Printer(db.Model):
     def setError(self, error):
         self.disconnect()
         self.error = str(error)
+        stateService.printerChanged(self, error=self.error)
         self.setStatus("error")
-        current_app.socketio.emit(
-            "error_update", {"printerid": self.id, "error": self.error}
-        )
+        roomService.emit("error_update", {"printerid": self.id, "error": self.error}, self.id)
 
     def sendStatusToJob(self, job, job_id, status):
         try:
@@ -791,39 +1148,30 @@ class Printer(db.Model):
         except requests.exceptions.RequestException as e:
             print(f"Failed to send status to job: {e}")
 
-    @classmethod 
-    def repairPorts(cls):
-        try:
-            response = requests.post(f"{Config.get('base_url')}/repairports")
-
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to repair ports: {e}")
-            
-    @classmethod 
-    def hardReset(cls, printerid, status):
-        try:
-            response = requests.post(f"{Config.get('base_url')}/queuerestore", json={'printerid': printerid, 'status': status})
-
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to repair ports: {e}")   
-
     def setTemps(self, extruder_temp, bed_temp):
         self.extruder_temp = extruder_temp
         self.bed_temp = bed_temp
-        current_app.socketio.emit(
-            'temp_update', {'printerid': self.id, 'extruder_temp': self.extruder_temp, 'bed_temp': self.bed_temp})
+        telemetryService.printerUpdated(self.id, extruder_temp=extruder_temp, bed_temp=bed_temp)
+        roomService.emit('temp_update', {'printerid': self.id, 'extruder_temp': self.extruder_temp, 'bed_temp': self.bed_temp}, self.id)
 
 
     def setCanPause(self, canPause):
         try:
             self.canPause = canPause
-            current_app.socketio.emit('can_pause', {'printerid': self.id, 'canPause': canPause})
+            stateService.printerChanged(self, canPause=canPause)
+            roomService.emit('can_pause', {'printerid': self.id, 'canPause': canPause}, self.id)
         except Exception as e:
             print('Error setting canPause:', e)
 
+    def setFilament(self, filament):
+        self.filament = filament
+        stateService.printerChanged(self, filament=filament)
+        roomService.emit('printer_filament', {'printerid': self.id, 'filament': filament}, self.id)
+
     def setColorChangeBuffer(self, buff): 
         self.colorbuff = buff
-        current_app.socketio.emit('color_buff', {'printerid': self.id, 'colorChangeBuffer': buff})
+        stateService.printerChanged(self, colorChangeBuffer=buff)
+        roomService.emit('color_buff', {'printerid': self.id, 'colorChangeBuffer': buff}, self.id)
 
 
             
@@ -0,0 +1,69 @@
+from models.db import db
+from datetime import datetime, timedelta
+from sqlalchemy.exc import SQLAlchemyError
+
+# model for print_record table: slicer estimate vs. actual print time for every completed job,
+# used to fit the per-printer ETA correction in services/etaService.py
+class PrintRecord(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.id'), nullable=True)
+    printer_id = db.Column(db.Integer, db.ForeignKey('printer.id'), nullable=True)
+    profile = db.Column(db.String(100), nullable=True) # slicer print profile (print_settings_id)
+    estimated = db.Column(db.Integer, nullable=False) # slicer estimate, seconds
+    actual = db.Column(db.Integer, nullable=False) # measured print time without pauses, seconds
+    started = db.Column(db.DateTime, nullable=False)
+    finished = db.Column(db.DateTime, nullable=False)
+
+    def __init__(self, job_id, printer_id, profile, estimated, actual, started, finished):
+        self.job_id = job_id
+        self.printer_id = printer_id
+        self.profile = profile
+        self.estimated = estimated
+        self.actual = actual
+        self.started = started
+        self.finished = finished
+
+    @classmethod
+    def record(cls, job, printer_id, finished=None):
+        # called when a print completes. actual time excludes pauses and color changes, which the
+        # print loop adds onto job_time[0] on top of the predicted total
+        try:
+            finished = finished or datetime.now()
+            total, eta, started, pause = job.getJobTime()
+            estimated = job.getEstimatedTime()
+            if not estimated or started == datetime.min:
+                return None
+            paused = max(total - (job.predicted_time or total), 0)
+            actual = (finished - started).total_seconds() - paused
+            if actual <= 0:
+                return None
+
+            record = cls(
+                job_id=job.id,
+                printer_id=printer_id,
+                profile=job.profile or None,
+                estimated=int(estimated),
+                actual=int(actual),
+                started=started,
+                finished=finished,
+            )
+            db.session.add(record)
+            db.session.commit()
+            return record
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"Database error: {e}")
+            return None
+
+    @classmethod
+    def getRecent(cls, days=180):
+        try:
+            since = datetime.now() - timedelta(days=days)
+            return (
+                db.session.query(cls.printer_id, cls.profile, cls.estimated, cls.actual)
+                .filter(cls.finished >= since)
+                .all()
+            )
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return []
@@ -0,0 +1,81 @@
+# printer/job runtime objects inside a print worker process (services/workerService.py). the print loop runs on
+# these exactly as on PrinterRuntime/JobRuntime, but the setters only keep the value locally and forward the call
+# to the server process, which replays it on the real objects (state store, socket events, hard resets happen there)
+from models.jobs import JobRuntime
+from models.printers import PrinterRuntime
+
+
+class WorkerPrinter(PrinterRuntime):
+    __slots__ = ('link',)
+
+    @classmethod
+    def fromState(cls, state, link):
+        printer = cls(state['device'], state['description'], state['hwid'], state['name'], state['status'], state['id'])
+        for field in ('filament', 'colorbuff', 'canPause', 'error', 'extruder_temp', 'bed_temp'):
+            setattr(printer, field, state[field])
+        printer.link = link
+        return printer
+
+    def setStatus(self, newStatus):
+        self.status = newStatus
+        self.link.forward('printer', 'setStatus', newStatus)
+
+    def setError(self, error):
+        self.disconnect()
+        self.error = str(error)
+        self.status = "error"
+        self.link.forward('printer', 'setError', self.error)
+
+    def setTemps(self, extruder_temp, bed_temp):
+        self.extruder_temp = extruder_temp
+        self.bed_temp = bed_temp
+        self.link.forward('printer', 'setTemps', extruder_temp, bed_temp)
+
+    def setColorChangeBuffer(self, buff):
+        self.colorbuff = buff
+        self.link.forward('printer', 'setColorChangeBuffer', buff)
+
+
+class WorkerJob(JobRuntime):
+    __slots__ = ('link',)
+
+    @classmethod
+    def fromState(cls, state, link):
+        job = cls.__new__(cls)
+        for field in JobRuntime.__slots__:
+            setattr(job, field, state[field])
+        job.link = link
+        return job
+
+    def setProgress(self, progress):
+        if self.status == 'printing':
+            self.progress = progress
+            self.link.forward('job', 'setProgress', progress)
+
+    def setSentLines(self, sent_lines):
+        self.sent_lines = sent_lines
+        self.link.forward('job', 'setSentLines', sent_lines)
+
+    def setExtruded(self, extruded):
+        self.extruded = extruded
+        self.link.forward('job', 'setExtruded', extruded)
+
+    def setFilePause(self, pause):
+        self.filePause = pause
+        self.link.forward('job', 'setFilePause', pause)
+
+    def setMaxLayerHeight(self, max_layer_height):
+        self.max_layer_height = max_layer_height
+        self.link.forward('job', 'setMaxLayerHeight', max_layer_height)
+
+    def setCurrentLayerHeight(self, current_layer_height):
+        self.current_layer_height = current_layer_height
+        self.link.forward('job', 'setCurrentLayerHeight', current_layer_height)
+
+    def setTimeStarted(self, time_started):
+        self.time_started = time_started
+        self.link.forward('job', 'setTimeStarted', time_started)
+
+    def setTime(self, timeData, index):
+        self.job_time[index] = timeData
+        self.link.forward('job', 'setTime', timeData, index)
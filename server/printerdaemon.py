@@ -0,0 +1,15 @@
+# printer daemon: with "printerDaemon": true in config/config.json this process owns the serial threads, queues
+# and printer state, and the API (app.py) can run as several workers that talk to it over a unix socket, e.g.
+#   python printerdaemon.py
+#   gunicorn -k eventlet -w 4 -b 0.0.0.0:8000 app:app
+# (socket.io clients need sticky sessions across several workers unless they connect with the websocket transport)
+import os
+
+os.environ.setdefault('QVIEW3D_ROLE', 'daemon')
+
+from app import app, printer_status_service
+from models.config import Config
+from services import daemonService
+
+if __name__ == "__main__":
+    daemonService.serve(app, printer_status_service, Config.get('daemon_socket'))
@@ -0,0 +1,13 @@
+# print worker: with "printWorkers": N in config/config.json, the process running the printers (app.py or
+# printerdaemon.py) starts N of these and runs the print loops in them. not meant to be started by hand:
+#   python printerworker.py <socket path>
+import os
+import sys
+
+os.environ['QVIEW3D_ROLE'] = 'worker'
+
+from app import app
+from services import workerService
+
+if __name__ == "__main__":
+    workerService.serveWorker(app, sys.argv[1])
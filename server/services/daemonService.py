@@ -0,0 +1,76 @@
+# printer daemon split: with printerDaemon on in config, printerdaemon.py owns the printer threads, queues and
+# state store, and the API workers (app.py, one or several) reach them over a unix socket (services/ipcService.py).
+# socket events from either side go through the daemon's event stream, so every worker can send them to its clients
+from models.db import unitOfWork
+from services import ipcService, roomService, stateService
+
+# PrinterStatusService methods that may be called over the socket
+COMMANDS = {
+    'create_printer_threads', 'resetThread', 'queueRestore', 'deleteThread', 'editName', 'movePrinterList',
+    'printer_snapshot', 'stateDeltas', 'stateChanged', 'enqueueJobs', 'farmEnqueue', 'farmDelete', 'farmQueueInfo',
+    'pickPrinter', 'cancelJob', 'releaseJob', 'bumpJob', 'reorderQueue', 'dequeueJob', 'startJob',
+    'setPrinterStatus', 'setPrinterFilament', 'setPrinterDevice', 'jobTimes', 'etaFactors',
+    'workerStats', 'telemetry', 'nodeReport', 'printerStatuses',
+}
+PUBLISH = 'publish'  # an API worker's event, sent back out on the stream
+
+
+class PrinterDaemonClient:
+    # stands in for PrinterStatusService in the API workers: the commands are forwarded by name
+    def __init__(self, app, path):
+        self.app = app  # the worker's own app, for upload callbacks (Job.storeFileWhenReady)
+        self.rpc = ipcService.RpcClient(path)
+
+    def __getattr__(self, name):
+        if name not in COMMANDS:
+            raise AttributeError(name)
+
+        def command(*args, **kwargs):
+            return self.rpc.call(name, *args, **kwargs)
+
+        return command
+
+
+def eventFrame(event, data, printer_id, job_id):
+    return {"event": event, "data": data, "printer_id": printer_id, "job_id": job_id}
+
+
+def serve(app, service, path):
+    # run in the printer daemon; blocks serving calls from the API workers
+    def dispatch(method, args, kwargs):
+        if method == PUBLISH:
+            server.publish(args[0])
+            return None
+        if method not in COMMANDS:
+            raise AttributeError(f"Unknown printer daemon command: {method}")
+        with app.app_context():
+            with unitOfWork():
+                return getattr(service, method)(*args, **kwargs)
+
+    server = ipcService.RpcServer(path, dispatch)
+    roomService.setRelay(lambda event, data, printer_id, job_id: server.publish(eventFrame(event, data, printer_id, job_id)))
+    print(f"Printer daemon listening on {path}")
+    server.serve_forever()
+
+
+def connect(socketio, client):
+    # run in each API worker: local events and state changes go to the daemon, the daemon's events come back
+    # on the stream and are sent to this worker's subscribers
+    def relay(event, data, printer_id, job_id):
+        try:
+            client.rpc.call(PUBLISH, eventFrame(event, data, printer_id, job_id))
+        except Exception as e:
+            print(f"Error relaying {event} to the printer daemon: {e}")
+
+    def forward(kind, ident, printer_id, fields):
+        try:
+            client.rpc.call('stateChanged', kind, ident, printer_id, fields)
+        except Exception as e:
+            print(f"Error forwarding state change to the printer daemon: {e}")
+
+    def deliver(frame):
+        roomService.deliver(frame['event'], frame['data'], frame.get('printer_id'), frame.get('job_id'))
+
+    roomService.setRelay(relay)
+    stateService.forwardTo(forward)
+    socketio.start_background_task(client.rpc.events, deliver, socketio.sleep)
@@ -0,0 +1,102 @@
+# learned ETA correction: fits actual/estimated print time per printer and per (printer, slicer profile)
+# from PrintRecord rows in a background thread. predict() is a dict lookup and a multiply.
+import math
+import time
+from threading import Thread
+
+REFIT_INTERVAL = 10 * 60  # seconds between background refits
+PRIOR_WEIGHT = 5  # pseudo-samples pulling a factor towards its parent (global -> printer -> profile)
+RATIO_LIMITS = (0.5, 2.0)  # ratios outside this are treated as bad records (cancelled early, left paused...)
+
+# fitted factors; replaced wholesale on every fit so readers never see a half-built table
+_factors = {'global': 1.0, 'printer': {}, 'profile': {}}
+_thread = None
+
+
+def shrink(log_ratios, parent):
+    # mean log ratio, shrunk towards the parent factor when there are few samples
+    total = sum(log_ratios) + PRIOR_WEIGHT * math.log(parent)
+    return math.exp(total / (len(log_ratios) + PRIOR_WEIGHT))
+
+
+def fit(records):
+    # records: iterable of (printer_id, profile, estimated, actual)
+    by_printer = {}
+    by_profile = {}
+    all_ratios = []
+    for printer_id, profile, estimated, actual in records:
+        if not estimated or not actual:
+            continue
+        ratio = actual / estimated
+        if ratio < RATIO_LIMITS[0] or ratio > RATIO_LIMITS[1]:
+            continue
+        log_ratio = math.log(ratio)
+        all_ratios.append(log_ratio)
+        by_printer.setdefault(printer_id, []).append(log_ratio)
+        if profile:
+            by_profile.setdefault((printer_id, profile), []).append(log_ratio)
+
+    global_factor = shrink(all_ratios, 1.0) if all_ratios else 1.0
+    printer_factors = {printer_id: shrink(ratios, global_factor) for printer_id, ratios in by_printer.items()}
+    profile_factors = {
+        key: shrink(ratios, printer_factors.get(key[0], global_factor)) for key, ratios in by_profile.items()
+    }
+    return {'global': global_factor, 'printer': printer_factors, 'profile': profile_factors}
+
+
+def refit():
+    global _factors
+    from models.printrecords import PrintRecord
+    _factors = fit(PrintRecord.getRecent())
+    return _factors
+
+
+def getFactor(printer_id, profile=None):
+    factors = _factors
+    if profile:
+        factor = factors['profile'].get((printer_id, profile))
+        if factor is not None:
+            return factor
+    return factors['printer'].get(printer_id, factors['global'])
+
+
+def predict(printer_id, profile, estimate):
+    # corrected print time in seconds for a slicer estimate on this printer
+    if not estimate:
+        return estimate
+    return estimate * getFactor(printer_id, profile)
+
+
+def getFactors():
+    factors = _factors
+    return {
+        'global': factors['global'],
+        'printer': factors['printer'],
+        'profile': [
+            {'printer_id': printer_id, 'profile': profile, 'factor': factor}
+            for (printer_id, profile), factor in factors['profile'].items()
+        ],
+    }
+
+
+def start(app):
+    # background refit loop, started once from app.py
+    global _thread
+    if _thread is not None:
+        return
+
+    from models.db import unitOfWork
+
+    def loop():
+        with app.app_context():
+            while True:
+                try:
+                    with unitOfWork():
+                        refit()
+                except Exception as e:
+                    print(f"Error fitting ETA model: {e}")
+                time.sleep(REFIT_INTERVAL)
+
+    _thread = Thread(target=loop)
+    _thread.daemon = True
+    _thread.start()
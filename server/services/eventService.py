@@ -0,0 +1,144 @@
+# job lifecycle event log: record() only appends to an in-memory buffer; a background thread writes the
+# buffered events in one transaction and folds them into the daily rollups in the same commit
+from collections import deque
+from datetime import datetime
+from threading import Event, Lock, Thread
+
+from models.db import db
+
+FLUSH_INTERVAL = 2  # seconds between flushes
+FLUSH_SIZE = 500  # flush early when this many events are waiting
+FILAMENT_CACHE_SIZE = 10000  # job ids whose filament we remember
+
+# job status (as stored by Job.update_job_status) -> lifecycle event
+# ('inqueue' is left out: the queued event is recorded when the job row is inserted, and a restore re-queue isn't a new submission)
+STATUS_EVENTS = {
+    'printing': 'started',
+    'complete': 'completed',
+    'error': 'failed',
+    'cancelled': 'cancelled',
+}
+
+_buffer = deque()
+_lock = Lock()
+_filaments = {}  # job id -> filament, so rollups can be keyed by it
+_milestones = {}  # job id -> {'queued': datetime, 'started': datetime} for jobs still in flight
+_thread = None
+_wake = Event()  # set when the buffer fills up, so the flusher doesn't wait out the interval
+
+
+def record(job_id, event, printer_id=None, issue_id=None, when=None):
+    # cheap enough to call from request handlers and the print loop
+    _buffer.append((job_id, printer_id, event, issue_id, when or datetime.now()))
+    if len(_buffer) >= FLUSH_SIZE:
+        _wake.set()
+
+
+def recordStatus(job_id, status, printer_id=None):
+    event = STATUS_EVENTS.get(status)
+    if event:
+        record(job_id, event, printer_id)
+
+
+def setFilament(job_id, filament):
+    _filaments[job_id] = filament or ''
+    if len(_filaments) > FILAMENT_CACHE_SIZE:
+        del _filaments[next(iter(_filaments))]  # oldest first, dicts keep insertion order
+
+
+def drain():
+    events = []
+    while _buffer:
+        events.append(_buffer.popleft())
+    return events
+
+
+def flush():
+    # write everything buffered so far and update the rollups; must run inside an app context
+    from models.jobevents import JobEvent, DailyRollup
+
+    with _lock:
+        events = drain()
+        if not events:
+            return 0
+
+        # terminal/started events for jobs whose earlier milestones aren't cached (server restarted mid-flight)
+        missing = {job_id for job_id, printer_id, event, issue_id, when in events
+                   if event in ('started', 'completed', 'failed') and job_id not in _milestones}
+        if missing:
+            _milestones.update(JobEvent.getMilestones(list(missing)))
+
+        rows = []
+        deltas = {}
+        milestones_after = {}  # job id -> its milestones once these events are written; applied after the commit
+        for job_id, printer_id, event, issue_id, when in events:
+            filament = _filaments.get(job_id, '')
+            rows.append({
+                "job_id": job_id,
+                "printer_id": printer_id,
+                "event": event,
+                "issue_id": issue_id,
+                "filament": filament,
+                "timestamp": when,
+            })
+
+            counters = deltas.setdefault((when.date(), printer_id or 0, issue_id or 0, filament), {})
+            milestones = milestones_after.setdefault(job_id, dict(_milestones.get(job_id, {})))
+            if event == 'queued':
+                milestones.setdefault('queued', when)
+                counters['queued'] = counters.get('queued', 0) + 1
+            elif event == 'started':
+                milestones['started'] = when
+                counters['started'] = counters.get('started', 0) + 1
+                if 'queued' in milestones:
+                    counters['wait_seconds'] = counters.get('wait_seconds', 0) + (when - milestones['queued']).total_seconds()
+            elif event in ('completed', 'failed'):
+                counters[event] = counters.get(event, 0) + 1
+                if 'started' in milestones:
+                    counters['print_seconds'] = counters.get('print_seconds', 0) + (when - milestones['started']).total_seconds()
+                milestones.clear()
+            elif event == 'cancelled':
+                counters['cancelled'] = counters.get('cancelled', 0) + 1
+                milestones.clear()
+            elif event in ('paused', 'colorchange'):
+                counters['paused'] = counters.get('paused', 0) + 1
+            elif event == 'issue':
+                counters['issues'] = counters.get('issues', 0) + 1
+
+        try:
+            db.session.bulk_insert_mappings(JobEvent, rows)
+            DailyRollup.apply(deltas)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            _buffer.extendleft(reversed(events))  # back at the head, ahead of anything recorded since, for the next flush
+            print(f"Error writing job events: {e}")
+            return 0
+        for job_id, milestones in milestones_after.items():
+            if milestones:
+                _milestones[job_id] = milestones
+            else:
+                _milestones.pop(job_id, None)  # finished, or never had a milestone
+        return len(rows)
+
+
+def start(app):
+    global _thread
+    if _thread is not None:
+        return
+
+    def loop():
+        with app.app_context():
+            while True:
+                _wake.wait(FLUSH_INTERVAL)
+                _wake.clear()
+                try:
+                    flush()
+                except Exception as e:
+                    print(f"Error flushing job events: {e}")
+                finally:
+                    db.session.remove()
+
+    _thread = Thread(target=loop)
+    _thread.daemon = True
+    _thread.start()
@@ -0,0 +1,162 @@
+# federated farm: one QView3D server per rack (a "node") drives the printers attached to its host, and a
+# "coordinator" server gives one view of every node's printers and queues and auto-queues across all of them.
+# nodes post a compact report of their printers to the coordinator every few seconds (controllers/federation.py);
+# a dispatched job's file is sent to the chosen node by content hash, so a file the node already has isn't sent again
+import hashlib
+import hmac
+import os
+import re
+import time
+from threading import Lock, Thread
+
+import requests
+
+from models.config import Config
+
+BLOB_DIR = '../federation_blobs'  # files received from the coordinator, named by their sha256
+TOKEN_HEADER = 'X-Federation-Token'
+OFFLINE_AFTER = 3  # report intervals a node can miss before the coordinator stops dispatching to it
+REQUEST_TIMEOUT = 10
+TRANSFER_TIMEOUT = 300
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# printers in these states can't take new work (same as the local scheduler)
+UNAVAILABLE_STATUSES = ['error', 'offline']
+
+_nodes = {}  # coordinator: node name -> its last report, with the time it arrived
+_lock = Lock()
+
+
+def role():
+    return Config.get('federation_role')
+
+
+def authorized(headers):
+    # nodes and the coordinator share a token (config.py won't start a federation role without one)
+    token = Config.get('federation_token')
+    return bool(token) and hmac.compare_digest(headers.get(TOKEN_HEADER, ''), token)
+
+
+def authHeaders():
+    return {TOKEN_HEADER: Config.get('federation_token')}
+
+
+# node side
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def blobPath(content_hash):
+    if not DIGEST_PATTERN.match(content_hash):
+        raise ValueError(f"Not a sha256 digest: {content_hash}")
+    return os.path.join(BLOB_DIR, content_hash)
+
+
+def hasBlob(content_hash):
+    return os.path.exists(blobPath(content_hash))
+
+
+def storeBlob(content_hash, data):
+    path = blobPath(content_hash)
+    if digest(data) != content_hash:
+        raise ValueError("File does not match its content hash")
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    partial = f"{path}.part"
+    with open(partial, 'wb') as f:
+        f.write(data)
+    os.replace(partial, path)
+
+
+def readBlob(content_hash):
+    with open(blobPath(content_hash), 'rb') as f:
+        return f.read()
+
+
+def startNode(app, service):
+    # reports this node's printers to the coordinator for as long as the process runs
+    thread = Thread(target=reportLoop, args=(app, service), daemon=True)
+    thread.start()
+    return thread
+
+
+def reportLoop(app, service):
+    url = f"{Config.get('coordinator_url').rstrip('/')}/federation/report"
+    while True:
+        try:
+            with app.app_context():
+                printers = service.nodeReport()
+            report = {"name": Config.get('node_name'), "url": Config.get('node_url'), "printers": printers}
+            requests.post(url, json=report, headers=authHeaders(), timeout=REQUEST_TIMEOUT).raise_for_status()
+        except Exception as e:
+            print(f"Error reporting to the federation coordinator: {e}")
+        time.sleep(Config.get('federation_interval'))
+
+
+# coordinator side
+
+def nodeReported(report):
+    with _lock:
+        _nodes[report['name']] = {**report, "reported": time.time()}
+
+
+def nodes():
+    # every node's last report, with whether it has reported recently enough to take jobs
+    now = time.time()
+    cutoff = OFFLINE_AFTER * Config.get('federation_interval')
+    with _lock:
+        reports = list(_nodes.values())
+    return [
+        {**report, "age": round(now - report['reported'], 1), "online": now - report['reported'] <= cutoff}
+        for report in sorted(reports, key=lambda report: report['name'])
+    ]
+
+
+def getNode(name):
+    return next((node for node in nodes() if node['name'] == name), None)
+
+
+def printerMatches(printer, filament='', model=''):
+    # same rules as schedulerService: unknown or empty on either side means compatible
+    if printer['status'] in UNAVAILABLE_STATUSES:
+        return False
+    loaded = printer.get('filament') or ''
+    if loaded and filament and loaded.strip().lower() != filament.strip().lower():
+        return False
+    family = printer.get('family')
+    return not family or not model or model.upper().startswith(family.upper())
+
+
+def pickTarget(filament='', model='', node_name=None):
+    # (node, printer id) of the online printer that would get through its queue first, or None
+    best = None
+    for node in nodes():
+        if not node['online'] or (node_name and node['name'] != node_name):
+            continue
+        for printer in node['printers']:
+            if not printerMatches(printer, filament, model):
+                continue
+            key = (printer['busy'], len(printer['queue']))
+            if best is None or key < best[0]:
+                best = (key, node, printer['id'])
+    return (best[1], best[2]) if best else None
+
+
+def dispatch(node, printer_id, data, fields):
+    # sends the file (unless the node has it already) and queues the job on the node's printer.
+    # fields are the job's name, file_name_original, filament, favorite, td_id and priority
+    url = node['url'].rstrip('/')
+    content_hash = digest(data)
+    res = requests.get(f"{url}/federation/blob/{content_hash}", headers=authHeaders(), timeout=REQUEST_TIMEOUT)
+    res.raise_for_status()
+    if not res.json().get('exists'):
+        requests.post(
+            f"{url}/federation/blob/{content_hash}", data=data,
+            headers={**authHeaders(), 'Content-Type': 'application/octet-stream'}, timeout=TRANSFER_TIMEOUT,
+        ).raise_for_status()
+    res = requests.post(
+        f"{url}/federation/accept", json={**fields, "digest": content_hash, "printer_id": printer_id},
+        headers=authHeaders(), timeout=REQUEST_TIMEOUT,
+    )
+    res.raise_for_status()
+    return res.json()
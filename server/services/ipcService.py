@@ -0,0 +1,198 @@
+# local IPC between the printer daemon and the API workers: length-prefixed JSON messages over a unix socket.
+# a connection either makes calls ({"method", "args", "kwargs"} -> {"result"} or {"error"}) or, after asking
+# for "__events__", only receives the daemon's event stream as lists of whatever events piled up since the last send
+import json
+import os
+import select
+import socket
+import socketserver
+import struct
+import time
+from collections import deque
+from datetime import datetime
+from threading import Condition, local
+
+HEADER = struct.Struct('>I')  # message length
+MAX_MESSAGE = 64 * 1024 * 1024
+EVENTS = '__events__'
+EVENT_BACKLOG = 10000  # events kept per subscriber that hasn't read them yet; the oldest is dropped past this
+RECONNECT_DELAY = 1
+STREAM_CHECK = 5  # seconds an idle event stream waits before checking that its client is still connected
+
+
+class RpcError(Exception):
+    # the call reached the daemon but raised there
+    pass
+
+
+def encode(value):
+    # datetimes survive the trip (job times); anything else JSON can't take goes as its string
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    return str(value)
+
+
+def decode(obj):
+    if "__datetime__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def send(sock, message):
+    body = json.dumps(message, default=encode).encode()
+    sock.sendall(HEADER.pack(len(body)) + body)
+
+
+def recvExactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv(sock):
+    # next message, or None when the other side closed the connection
+    header = recvExactly(sock, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_MESSAGE:
+        raise ValueError(f"IPC message too large: {length} bytes")
+    body = recvExactly(sock, length)
+    if body is None:
+        raise ConnectionError("IPC connection closed mid-message")
+    return json.loads(body, object_hook=decode)
+
+
+def peerClosed(sock):
+    # whether the other end hung up. stream clients never send after subscribing, so anything readable means EOF
+    if not select.select([sock], [], [], 0)[0]:
+        return False
+    try:
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except OSError:
+        return True
+
+
+class RpcClient:
+    # one connection per thread (or green thread), opened on first use and dropped on any socket error
+    def __init__(self, path):
+        self.path = path
+        self.__local = local()
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock
+
+    def call(self, method, *args, **kwargs):
+        sock = getattr(self.__local, 'sock', None)
+        if sock is None:
+            sock = self.__local.sock = self.connect()
+        try:
+            send(sock, {"method": method, "args": args, "kwargs": kwargs})
+            reply = recv(sock)
+            if reply is None:
+                raise ConnectionError("printer daemon closed the connection")
+        except (OSError, ValueError):
+            # not retried: the call may already have run in the daemon
+            self.__local.sock = None
+            sock.close()
+            raise
+        if 'error' in reply:
+            raise RpcError(reply['error'])
+        return reply.get('result')
+
+    def events(self, handler, sleep=time.sleep):
+        # blocks forever, calling handler(event) for each event the daemon publishes; reconnects if the daemon restarts
+        while True:
+            try:
+                sock = self.connect()
+                try:
+                    send(sock, {"method": EVENTS})
+                    while True:
+                        events = recv(sock)
+                        if events is None:
+                            break
+                        for event in events:
+                            try:
+                                handler(event)
+                            except Exception as e:
+                                print(f"Error handling daemon event: {e}")
+                finally:
+                    sock.close()
+            except OSError as e:
+                print(f"Printer daemon event stream unavailable: {e}")
+            sleep(RECONNECT_DELAY)
+
+
+class Subscriber:
+    # events waiting for one event-stream connection; publishing never blocks on a slow reader
+    def __init__(self):
+        self.pending = deque(maxlen=EVENT_BACKLOG)
+        self.ready = Condition()
+        self.closed = False
+
+    def put(self, event):
+        with self.ready:
+            self.pending.append(event)
+            self.ready.notify()
+
+    def take(self, timeout=None):
+        # events since the last take; empty if none came within timeout
+        with self.ready:
+            self.ready.wait_for(lambda: self.pending or self.closed, timeout)
+            events = list(self.pending)
+            self.pending.clear()
+            return events
+
+
+class RpcHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            message = recv(self.request)
+            if message is None:
+                return
+            if message.get('method') == EVENTS:
+                return self.server.stream(self.request)
+            try:
+                reply = {"result": self.server.dispatch(message['method'], message.get('args') or [], message.get('kwargs') or {})}
+            except Exception as e:
+                reply = {"error": f"{type(e).__name__}: {e}"}
+            send(self.request, reply)
+
+
+class RpcServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # dispatch(method, args, kwargs) runs a call; publish(event) fans an event out to every stream connection
+    daemon_threads = True
+
+    def __init__(self, path, dispatch):
+        if os.path.exists(path):
+            os.unlink(path)  # left over from a previous run
+        self.dispatch = dispatch
+        self.subscribers = set()
+        super().__init__(path, RpcHandler)
+
+    def publish(self, event):
+        for subscriber in list(self.subscribers):
+            subscriber.put(event)
+
+    def stream(self, sock):
+        subscriber = Subscriber()
+        self.subscribers.add(subscriber)
+        try:
+            while not subscriber.closed:
+                events = subscriber.take(STREAM_CHECK)
+                if events:
+                    send(sock, events)
+                elif peerClosed(sock):
+                    return
+        except OSError:
+            pass
+        finally:
+            subscriber.closed = True
+            self.subscribers.discard(subscriber)
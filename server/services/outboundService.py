@@ -0,0 +1,157 @@
+# per-client outbound buffers for high-frequency telemetry. state events (status, errors, queue changes) are
+# emitted straight away and never dropped; telemetry goes into a per-client slot keyed by event + printer/job,
+# so a client that falls behind gets the newest value instead of a backlog of stale ones.
+import struct
+from threading import Lock
+
+FLUSH_INTERVAL = 0.1  # seconds between telemetry flushes, so at most ~10 updates/s per value per client
+HIGH_WATER = 50  # frames waiting in a client's engine.io queue before we stop sending it telemetry
+MAX_PENDING = 200  # telemetry slots kept per client; the oldest is dropped past this
+
+# events that only ever carry the latest value of something, safe to coalesce or drop
+TELEMETRY_EVENTS = {
+    'progress_update', 'gcode_viewer', 'temp_update', 'extruded_update',
+    'current_layer_height', 'max_layer_height', 'set_time',
+}
+
+# packed telemetry for clients that opt in (subscribe with binary: true): every pending value for the client
+# goes out as one 'telemetry' binary frame of fixed 13-byte records instead of one JSON event each.
+# frame = version byte, then records of (code uint8, job/printer id uint32, value float64), little endian.
+# anything that doesn't fit a record (set_time, odd values) still goes out as JSON
+FRAME_VERSION = 1
+RECORD = struct.Struct('<BId')
+PACKERS = {
+    'progress_update': lambda data: [(1, data['job_id'], data['progress'])],
+    'gcode_viewer': lambda data: [(2, data['job_id'], data['gcode_num'])],
+    'extruded_update': lambda data: [(3, data['job_id'], data['extruded'])],
+    'current_layer_height': lambda data: [(4, data['job_id'], data['current_layer_height'])],
+    'max_layer_height': lambda data: [(5, data['job_id'], data['max_layer_height'])],
+    'temp_update': lambda data: [(6, data['printerid'], data['extruder_temp']), (7, data['printerid'], data['bed_temp'])],
+}
+
+_lock = Lock()
+_pending = {}  # sid -> {key: (event, data)}, insertion ordered
+_binary = set()  # sids that asked for packed telemetry frames
+_stats = {'sent': 0, 'coalesced': 0, 'dropped': 0, 'deferred': 0, 'packed': 0, 'binary_frames': 0}
+_events = {}  # event -> {'sent': n, 'coalesced': n, 'dropped': n}
+_started = False
+
+
+def count(event, field, amount=1):
+    _stats[field] += amount
+    counters = _events.setdefault(event, {'sent': 0, 'coalesced': 0, 'dropped': 0})
+    counters[field] = counters.get(field, 0) + amount
+
+
+def enqueue(sids, event, data, key):
+    # key identifies the value this event carries, e.g. (event, printer id, job id)
+    with _lock:
+        for sid in sids:
+            slots = _pending.setdefault(sid, {})
+            if key in slots:
+                count(event, 'coalesced')
+                del slots[key]  # re-insert so the slot moves to the back, behind older values
+            elif len(slots) >= MAX_PENDING:
+                oldest = next(iter(slots))
+                count(slots.pop(oldest)[0], 'dropped')
+            slots[key] = (event, data)
+
+
+def setBinary(sid, enabled):
+    with _lock:
+        if enabled:
+            _binary.add(sid)
+        else:
+            _binary.discard(sid)
+
+
+def pack(frames):
+    # returns (binary frame or None, frames that have to go as JSON)
+    records = []
+    rest = []
+    for event, data in frames:
+        packer = PACKERS.get(event)
+        try:
+            packed = [RECORD.pack(code, int(ident), float(value)) for code, ident, value in packer(data)] if packer else None
+        except (KeyError, TypeError, ValueError, struct.error):
+            packed = None
+        if packed is None:
+            rest.append((event, data))
+        else:
+            records.extend(packed)
+    if not records:
+        return None, rest
+    return bytes([FRAME_VERSION]) + b''.join(records), rest
+
+
+def forget(sid):
+    # client disconnected: whatever it hadn't been sent yet is dropped
+    with _lock:
+        _binary.discard(sid)
+        slots = _pending.pop(sid, {})
+        for event, data in slots.values():
+            count(event, 'dropped')
+
+
+def backlog(socketio, sid):
+    # frames already handed to engine.io for this client but not yet written to its transport
+    try:
+        server = socketio.server
+        eio_sid = server.manager.eio_sid_from_sid(sid, '/')
+        return server.eio.sockets[eio_sid].queue.qsize()
+    except (AttributeError, KeyError, TypeError):
+        return 0
+
+
+def flush(socketio):
+    with _lock:
+        ready = {}
+        for sid, slots in _pending.items():
+            if not slots:
+                continue
+            if backlog(socketio, sid) >= HIGH_WATER:
+                _stats['deferred'] += 1  # leave it to coalesce until the client catches up
+                continue
+            ready[sid] = (list(slots.values()), sid in _binary)
+            slots.clear()
+    for sid, (frames, binary) in ready.items():
+        frame, rest = pack(frames) if binary else (None, frames)
+        if frame is not None:
+            socketio.emit('telemetry', frame, to=sid)
+        for event, data in rest:
+            socketio.emit(event, data, to=sid)
+        with _lock:
+            for event, data in frames:
+                count(event, 'sent')
+            if frame is not None:
+                _stats['packed'] += len(frames) - len(rest)
+                _stats['binary_frames'] += 1
+
+
+def getStats():
+    with _lock:
+        return {
+            **_stats,
+            'pending': sum(len(slots) for slots in _pending.values()),
+            'clients': len(_pending),
+            'binary_clients': len(_binary),
+            'events': {event: dict(counters) for event, counters in _events.items()},
+        }
+
+
+def start(socketio):
+    # flush loop as a socketio background task, so it works under both eventlet and threading
+    global _started
+    if _started:
+        return
+    _started = True
+
+    def loop():
+        while True:
+            socketio.sleep(FLUSH_INTERVAL)
+            try:
+                flush(socketio)
+            except Exception as e:
+                print(f"Error flushing telemetry: {e}")
+
+    socketio.start_background_task(loop)
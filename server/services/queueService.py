@@ -1 +1,105 @@
-# handle queue operations 
\ No newline at end of file
+# handle queue operations
+# farm-level queue: when enabled, auto-queued jobs wait here and are bound to a printer only when one is ready
+from collections import deque
+from threading import Lock
+
+from services import schedulerService, roomService
+
+
+class FarmEntry:
+    def __init__(self, job, filament='', model='', pinned=None):
+        self.job = job
+        self.filament = filament # required filament, '' = any
+        self.model = model # printer model the file was sliced for, '' = any
+        self.pinned = int(pinned) if pinned is not None else None # printer id the job must run on, None = any
+
+    def accepts(self, printer):
+        if self.pinned is not None and self.pinned != printer.id:
+            return False
+        return schedulerService.modelMatches(printer, self.model) and schedulerService.filamentMatches(printer, self.filament)
+
+
+class FarmQueue:
+    def __init__(self):
+        self.__entries = deque()
+        self.__lock = Lock()
+
+    def __iter__(self):
+        with self.__lock:
+            return iter(list(self.__entries))
+
+    def add(self, job, filament='', model='', pinned=None, priority=False):
+        with self.__lock:
+            entry = FarmEntry(job, filament, model, pinned)
+            if priority:
+                self.__entries.appendleft(entry)
+            else:
+                self.__entries.append(entry)
+        self.emitUpdate()
+
+    def addMany(self, entries):
+        # entries is a list of (job, filament, model, pinned, priority); emits one update
+        with self.__lock:
+            for job, filament, model, pinned, priority in entries:
+                entry = FarmEntry(job, filament, model, pinned)
+                if priority:
+                    self.__entries.appendleft(entry)
+                else:
+                    self.__entries.append(entry)
+        self.emitUpdate()
+
+    def claim(self, printer):
+        # work-pulling: hand the first job this printer can run to it, or None
+        with self.__lock:
+            for entry in self.__entries:
+                if entry.accepts(printer):
+                    self.__entries.remove(entry)
+                    break
+            else:
+                return None
+        self.emitUpdate()
+        return entry.job
+
+    def deleteJob(self, jobid):
+        with self.__lock:
+            for entry in self.__entries:
+                if entry.job.id == jobid:
+                    self.__entries.remove(entry)
+                    break
+            else:
+                return None
+        self.emitUpdate()
+        return entry.job
+
+    def getJobById(self, jobid):
+        with self.__lock:
+            for entry in self.__entries:
+                if entry.job.id == jobid:
+                    return entry.job
+        return None
+
+    def getSize(self):
+        return len(self.__entries)
+
+    def convertQueueToJson(self):
+        with self.__lock:
+            entries = list(self.__entries)
+        return [
+            {
+                "id": entry.job.id,
+                "name": entry.job.name,
+                "status": entry.job.status,
+                "date": entry.job.date.strftime('%a, %d %b %Y %H:%M:%S'),
+                "file_name_original": entry.job.file_name_original,
+                "favorite": entry.job.favorite,
+                "td_id": entry.job.td_id,
+                "filament": entry.filament,
+                "printer_model": entry.model,
+                "pinned": entry.pinned,
+                "estimated_time": entry.job.estimated_time,
+            }
+            for entry in entries
+        ]
+
+    def emitUpdate(self):
+        roomService.emit("farm_queue_update", {"queue": self.convertQueueToJson()})
@@ -0,0 +1,66 @@
+# printer registry: every running printer thread, indexed by printer id and hwid, in display order.
+# lookups are dict reads and the order is an immutable tuple swapped under the lock (same idea as
+# Classes/Queue), so request handlers and printer threads never scan or block on it
+from threading import Lock
+
+
+class PrinterRegistry:
+    def __init__(self):
+        self.__lock = Lock()
+        self.__byId = {}  # printer id -> thread
+        self.__byHwid = {}  # hwid -> thread
+        self.__order = ()  # threads in display order, as set by movePrinterList
+
+    def __iter__(self):
+        return iter(self.__order)
+
+    def __len__(self):
+        return len(self.__order)
+
+    def add(self, thread):
+        # a thread replacing one with the same printer id (reset/restore) keeps its place in the list
+        printer = thread.printer
+        with self.__lock:
+            old = self.__byId.get(printer.id)
+            if old is not None:
+                self.__byHwid.pop(old.printer.hwid, None)
+                self.__order = tuple(thread if t is old else t for t in self.__order)
+            else:
+                self.__order = self.__order + (thread,)
+            self.__byId[printer.id] = thread
+            self.__byHwid[printer.hwid] = thread
+
+    def remove(self, printer_id):
+        # returns the removed thread, or None if the printer wasn't registered
+        with self.__lock:
+            thread = self.__byId.pop(printer_id, None)
+            if thread is None:
+                return None
+            if self.__byHwid.get(thread.printer.hwid) is thread:
+                del self.__byHwid[thread.printer.hwid]
+            self.__order = tuple(t for t in self.__order if t is not thread)
+            return thread
+
+    def reorder(self, printer_ids):
+        # printer_ids in the order they should be displayed; printers left out keep their relative order at the end
+        with self.__lock:
+            ordered = [self.__byId[pid] for pid in dict.fromkeys(printer_ids) if pid in self.__byId]
+            self.__order = tuple(ordered) + tuple(t for t in self.__order if t not in ordered)
+
+    def get(self, printer_id):
+        return self.__byId.get(printer_id)
+
+    def getByHwid(self, hwid):
+        return self.__byHwid.get(hwid)
+
+    def getPrinter(self, printer_id):
+        thread = self.__byId.get(printer_id)
+        if thread is None:
+            raise KeyError(f"Printer {printer_id} is not registered.")
+        return thread.printer
+
+    def threads(self):
+        return self.__order
+
+    def printers(self):
+        return [thread.printer for thread in self.__order]
@@ -0,0 +1,147 @@
+# socket.io rooms: clients subscribe to the printers/jobs they show, and events go only to the rooms that
+# want them instead of to every connected client. an event nobody is subscribed to isn't sent at all.
+from threading import Lock
+
+from flask import request
+from flask_socketio import join_room, leave_room
+
+from services import outboundService
+
+FARM_ROOM = 'farm'  # farm-wide summary: status, errors and queue changes of every printer, no per-line telemetry
+ALL_PRINTERS_ROOM = 'printers'  # every event of every printer, for the full dashboard
+
+# events small and infrequent enough for the farm summary room
+SUMMARY_EVENTS = {
+    'status_update', 'error_update', 'queue_delta', 'queue_failover', 'farm_queue_update', 'job_status_update',
+    'release_job', 'file_pause_update', 'can_pause', 'printer_filament', 'color_buff', 'port_repair',
+}
+
+_socketio = None
+_lock = Lock()
+_rooms = {}  # room -> sids subscribed to it
+_sids = {}  # sid -> rooms it is in, so a disconnect can be cleaned up
+_relay = None  # with a printer daemon, every event goes through it so all API workers get it, see daemonService
+
+
+def printerRoom(printer_id):
+    return f'printer:{printer_id}'
+
+
+def jobRoom(job_id):
+    return f'job:{job_id}'
+
+
+def roomsFor(event, printer_id=None, job_id=None):
+    # printer_id may be a list when one event covers several printers (failover)
+    rooms = []
+    if event in SUMMARY_EVENTS:
+        rooms.append(FARM_ROOM)
+    printer_ids = printer_id if isinstance(printer_id, (list, tuple, set)) else [printer_id]
+    if any(pid is not None for pid in printer_ids):
+        rooms.append(ALL_PRINTERS_ROOM)
+        rooms.extend(printerRoom(pid) for pid in printer_ids if pid is not None)
+    if job_id is not None:
+        rooms.append(jobRoom(job_id))
+    return rooms
+
+
+def setRelay(relay):
+    # relay(event, data, printer_id, job_id) replaces the local send; the receiving side calls deliver()
+    global _relay
+    _relay = relay
+
+
+def emit(event, data, printer_id=None, job_id=None):
+    if _relay is not None:
+        _relay(event, data, printer_id, job_id)
+        return
+    deliver(event, data, printer_id, job_id)
+
+
+def deliver(event, data, printer_id=None, job_id=None):
+    # send to this process's subscribers
+    rooms = [room for room in roomsFor(event, printer_id, job_id) if _rooms.get(room)]
+    if not rooms or _socketio is None:
+        return
+    if event in outboundService.TELEMETRY_EVENTS:
+        # buffered per client and coalesced, see outboundService
+        with _lock:
+            sids = set().union(*(_rooms.get(room, ()) for room in rooms))
+        key = (event, str(printer_id), job_id, data.get('index'))
+        outboundService.enqueue(sids, event, data, key)
+        return
+    _socketio.emit(event, data, to=rooms)  # a client in several of these rooms still gets it once
+
+
+def requestedRooms(data):
+    # {"farm": true, "printers": "all" | [ids], "jobs": [ids], "binary": true}. binary asks for packed telemetry frames
+    data = data or {}
+    rooms = []
+    if data.get('farm'):
+        rooms.append(FARM_ROOM)
+    printers = data.get('printers') or []
+    if printers == 'all':
+        rooms.append(ALL_PRINTERS_ROOM)
+    else:
+        rooms.extend(printerRoom(printer_id) for printer_id in printers)
+    rooms.extend(jobRoom(job_id) for job_id in data.get('jobs') or [])
+    return rooms
+
+
+def subscribe(sid, rooms):
+    with _lock:
+        for room in rooms:
+            _rooms.setdefault(room, set()).add(sid)
+            _sids.setdefault(sid, set()).add(room)
+
+
+def unsubscribe(sid, rooms):
+    with _lock:
+        for room in rooms:
+            members = _rooms.get(room)
+            if members is not None:
+                members.discard(sid)
+                if not members:
+                    del _rooms[room]
+            _sids.get(sid, set()).discard(room)
+
+
+def disconnect(sid):
+    with _lock:
+        rooms = _sids.pop(sid, set())
+    unsubscribe(sid, rooms)
+
+
+def getCounts():
+    with _lock:
+        return {room: len(members) for room, members in _rooms.items()}
+
+
+def register(socketio):
+    # called once from app.py
+    global _socketio
+    _socketio = socketio
+    outboundService.start(socketio)
+
+    @socketio.on('subscribe')
+    def onSubscribe(data):
+        rooms = requestedRooms(data)
+        for room in rooms:
+            join_room(room)
+        subscribe(request.sid, rooms)
+        if data and 'binary' in data:
+            outboundService.setBinary(request.sid, bool(data['binary']))
+        return {"rooms": rooms}
+
+    @socketio.on('unsubscribe')
+    def onUnsubscribe(data):
+        rooms = requestedRooms(data)
+        for room in rooms:
+            leave_room(room)
+        unsubscribe(request.sid, rooms)
+        return {"rooms": rooms}
+
+    @socketio.on('disconnect')
+    def onDisconnect():
+        disconnect(request.sid)
+        outboundService.forget(request.sid)
@@ -0,0 +1,93 @@
+# auto-queue scheduling: rank printers by when they would finish everything already assigned to them
+from datetime import datetime
+
+from services import etaService
+
+# printers in these states can't take new work
+UNAVAILABLE_STATUSES = ['error', 'offline']
+
+# job statuses that still occupy a printer's queue time
+ACTIVE_JOB_STATUSES = ['inqueue', 'printing']
+
+# used for jobs with no slicer estimate (e.g. reruns of stored blobs)
+UNKNOWN_JOB_TIME = 60 * 60
+
+# USB VID:PID -> printer family, same ids Printer.getConnectedPorts recognises
+MODEL_FAMILIES = {
+    '2C99:0002': 'MK3',
+    '2C99:000D': 'MK4',
+    '1A86:7523': 'Ender',
+}
+
+
+def printerFamily(printer):
+    hwid = (printer.hwid or '').upper()
+    for vidpid, family in MODEL_FAMILIES.items():
+        if vidpid in hwid:
+            return family
+    return None
+
+
+def modelMatches(printer, model):
+    # model is what the slicer recorded, e.g. "MK4S", "MK3S", "ENDER3"; unknown on either side means compatible
+    family = printerFamily(printer)
+    if not family or not model:
+        return True
+    return model.upper().startswith(family.upper())
+
+
+def filamentMatches(printer, filament):
+    # a printer with no filament set accepts anything
+    loaded = getattr(printer, 'filament', '') or ''
+    if not loaded or not filament:
+        return True
+    return loaded.strip().lower() == filament.strip().lower()
+
+
+def isEligible(printer, filament='', model=''):
+    return (
+        printer.getStatus() not in UNAVAILABLE_STATUSES
+        and modelMatches(printer, model)
+        and filamentMatches(printer, filament)
+    )
+
+
+def jobEstimate(job):
+    estimate = job.getEstimatedTime()
+    return estimate if estimate else UNKNOWN_JOB_TIME
+
+
+def jobRemaining(job, now, printer_id=None):
+    # seconds left on a job: the live ETA for the printing job, the corrected slicer estimate for queued ones
+    if job.getStatus() == 'printing':
+        total, eta, start, pause = job.getJobTime()
+        if eta != datetime.min:
+            remaining = (eta - now).total_seconds()
+            if pause != datetime.min:
+                # paused/color change: the ETA moves out by however long it has been paused
+                remaining += (now - pause).total_seconds()
+            return max(remaining, 0)
+        total = total or jobEstimate(job)
+        return total * (1 - job.getProgress() / 100)
+    return etaService.predict(printer_id, job.profile, jobEstimate(job))
+
+
+def completionTime(printer, now=None):
+    # seconds until this printer would be through its current queue
+    now = now or datetime.now()
+    return sum(jobRemaining(job, now, printer.id) for job in printer.getQueue() if job.getStatus() in ACTIVE_JOB_STATUSES)
+
+
+def pickPrinter(printers, filament='', model='', planned=None):
+    # planned maps printer id -> seconds already assigned in this request but not queued yet (batch submissions).
+    # returns the id of the eligible printer that would finish first, or None if no printer can take the job.
+    planned = planned or {}
+    now = datetime.now()
+    candidates = [printer for printer in printers if isEligible(printer, filament, model)]
+    if not candidates:
+        return None
+    best = min(
+        candidates,
+        key=lambda printer: (completionTime(printer, now) + planned.get(printer.id, 0), printer.getQueue().getSize()),
+    )
+    return best.id
@@ -0,0 +1,200 @@
+# versioned printer/queue state: every change bumps one sequence number and is kept as a small delta.
+# serialized jobs and printers are cached, so the /getprinterinfo snapshot only re-dumps what changed,
+# and queue changes go out as added jobs + the new order instead of the whole queue.
+import json
+import time
+import uuid
+from collections import deque
+from threading import RLock
+
+from services import roomService
+
+DELTA_HISTORY = 1000  # deltas kept for clients catching up after a reconnect
+
+# fields that change many times a second while printing. clients get them live from the socket events, so they
+# don't move the version: the etag holds while printers print and only structural changes produce deltas.
+# a snapshot picks them up when it's rebuilt, at most TELEMETRY_REFRESH seconds late
+TELEMETRY_FIELDS = {'progress', 'sent_lines', 'extruded', 'current_layer_height', 'max_layer_height'}
+TELEMETRY_REFRESH = 5
+
+_lock = RLock()
+_version = 0
+_jobs = {}  # job id -> serialized job
+_printers = {}  # printer id -> serialized printer, without its queue
+_orders = {}  # printer id -> job ids in queue order, as last published
+_deltas = deque(maxlen=DELTA_HISTORY)
+_snapshot = None  # (version, json body) of the last snapshot built
+_snapshot_built = 0.0  # monotonic time it was built
+_telemetry_stale = False  # telemetry fields changed since then
+_epoch = uuid.uuid4().hex[:8]  # versions restart at 0 with the server, so etags carry this too
+_forward = None  # API workers with a printer daemon: job/printer changes go to the daemon's store, see daemonService
+
+
+def getVersion():
+    return _version
+
+
+def etag(version):
+    return f"{_epoch}-{version}"
+
+
+def bump(delta):
+    # record one change; callers hold _lock
+    global _version, _snapshot
+    _version += 1
+    _snapshot = None
+    delta['version'] = _version
+    _deltas.append(delta)
+    return delta
+
+
+def serializeJob(job):
+    return {
+        "id": job.id,
+        "name": job.name,
+        "status": job.status,
+        "date": job.date.strftime('%a, %d %b %Y %H:%M:%S'),
+        "printerid": job.printer_id,
+        "errorid": job.error_id,
+        "file_name_original": job.file_name_original,
+        "progress": job.progress,
+        "sent_lines": job.sent_lines,
+        "favorite": job.favorite,
+        "released": job.released,
+        "file_pause": job.filePause,
+        "comments": job.comments,
+        "extruded": job.extruded,
+        "td_id": job.td_id,
+        "time_started": job.time_started,
+        "printer_name": job.printer_name,
+        "max_layer_height": job.max_layer_height,
+        "current_layer_height": job.current_layer_height,
+        "filament": job.filament,
+    }
+
+
+def serializePrinter(printer):
+    return {
+        "device": printer.device,
+        "description": printer.description,
+        "hwid": printer.hwid,
+        "name": printer.name,
+        "status": printer.status,
+        "id": printer.id,
+        "error": printer.error,
+        "canPause": printer.canPause,
+        "colorChangeBuffer": printer.colorbuff,
+        "filament": printer.filament,
+    }
+
+
+def jobInfo(job):
+    info = _jobs.get(job.id)
+    if info is None:
+        info = serializeJob(job)
+        _jobs[job.id] = info
+    return info
+
+
+def printerInfo(printer):
+    info = _printers.get(printer.id)
+    if info is None:
+        info = serializePrinter(printer)
+        _printers[printer.id] = info
+    return info
+
+
+def forwardTo(forward):
+    # forward(kind, id, printer id, fields) is called instead of changing the local store
+    global _forward
+    _forward = forward
+
+
+def jobChanged(job, **fields):
+    # fields use the serialized names, e.g. jobChanged(job, file_pause=1)
+    if _forward is not None:
+        return _forward('job', job.id, job.printer_id, fields)
+    return changeJob(job.id, job.printer_id, fields)
+
+
+def printerChanged(printer, **fields):
+    if _forward is not None:
+        return _forward('printer', printer.id, printer.id, fields)
+    return changePrinter(printer.id, fields)
+
+
+def changeJob(jobid, printerid, fields):
+    # cached dicts are replaced, not mutated, so a snapshot being dumped in another thread never sees a half-applied change.
+    # returns the delta, or None for telemetry, which isn't versioned
+    global _telemetry_stale
+    with _lock:
+        if jobid in _jobs:
+            _jobs[jobid] = {**_jobs[jobid], **fields}
+        if TELEMETRY_FIELDS.issuperset(fields):
+            _telemetry_stale = True
+            return None
+        return bump({'op': 'job', 'jobid': jobid, 'printerid': printerid, 'fields': fields})
+
+
+def changePrinter(printerid, fields):
+    with _lock:
+        if printerid in _printers:
+            _printers[printerid] = {**_printers[printerid], **fields}
+        return bump({'op': 'printer', 'printerid': printerid, 'fields': fields})
+
+
+def printersChanged():
+    # printer threads were added, removed or reset: clients should fetch a new snapshot
+    with _lock:
+        _printers.clear()
+        return bump({'op': 'printers'})
+
+
+def queueChanged(printerid, queue, emit=True):
+    # diff the queue against what was last published for this printer. returns the delta; emit=False when
+    # the caller sends its own consolidated event
+    with _lock:
+        order = [job.id for job in queue]
+        previous = _orders.get(printerid, [])
+        known = set(previous)
+        current = set(order)
+        added = [jobInfo(job) for job in queue if job.id not in known]
+        removed = [jobid for jobid in previous if jobid not in current]
+        if not added and not removed and order == previous:
+            return None
+        _orders[printerid] = order
+        for jobid in removed:
+            _jobs.pop(jobid, None)  # rebuilt on its next add, e.g. when it moves to another printer
+        delta = bump({'op': 'queue', 'printerid': printerid, 'added': added, 'removed': removed, 'order': order})
+    if emit:
+        roomService.emit("queue_delta", delta, printerid)
+    return delta
+
+
+def snapshot(printers):
+    # (version, json body) for every printer and its queue; rebuilt only when the version moved since the last call,
+    # or every TELEMETRY_REFRESH seconds while telemetry changes (same version, so its etag is weak)
+    global _snapshot, _snapshot_built, _telemetry_stale
+    with _lock:
+        now = time.monotonic()
+        if _snapshot is not None and _snapshot[0] == _version and not (_telemetry_stale and now - _snapshot_built >= TELEMETRY_REFRESH):
+            return _snapshot
+        body = []
+        for printer in printers:
+            body.append({**printerInfo(printer), "queue": [jobInfo(job) for job in printer.getQueue()]})
+        _snapshot = (_version, json.dumps(body))
+        _snapshot_built = now
+        _telemetry_stale = False
+        return _snapshot
+
+
+def deltasSince(version):
+    # deltas after the given version, or None if the history no longer reaches back that far
+    with _lock:
+        if version > _version:
+            return None
+        if version == _version:
+            return []
+        if not _deltas or _deltas[0]['version'] > version + 1:
+            return None
+        return [delta for delta in _deltas if delta['version'] > version]
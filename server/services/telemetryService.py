@@ -0,0 +1,239 @@
+# shared-memory telemetry table: with sharedTelemetry on in config, the process running the printers keeps one
+# fixed-layout row per printer (status, temps and the current job's progress/lines/layer/ETA) in a shared memory
+# segment, and any process on the host (the API workers when printerDaemon is on) reads the whole farm's status
+# straight from it, without a round trip to the daemon.
+# rows are written under a seqlock: the writer makes the row's sequence odd, writes, then makes it even again.
+# readers never lock; they copy the table and re-read any row whose sequence was odd or moved while copying
+import atexit
+import os
+import time
+from datetime import datetime
+from multiprocessing import resource_tracker, shared_memory
+from threading import Lock
+
+import numpy as np
+
+from models.config import Config
+
+CAPACITY = 512  # printer rows in the segment
+READ_RETRIES = 100  # attempts at a consistent copy of a row that's being written to
+
+# status codes stored in the table; anything not listed reads back as 'unknown'
+STATUSES = (
+    'unknown', 'configuring', 'ready', 'printing', 'paused', 'colorchange', 'complete', 'error', 'offline',
+    'cancelled',
+)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+HEADER = np.dtype([('pid', '<i8'), ('closed', 'u1'), ('capacity', '<u4')], align=True)
+HEADER_SIZE = 64
+ROW = np.dtype([
+    ('seq', '<u4'),
+    ('printer_id', '<i4'),  # 0 marks a free row
+    ('status', 'u1'),
+    ('extruder_temp', '<f4'),
+    ('bed_temp', '<f4'),
+    ('job_id', '<i4'),  # 0 when no job has reported yet
+    ('progress', '<f4'),
+    ('sent_lines', '<i4'),
+    ('current_layer_height', '<f4'),
+    ('max_layer_height', '<f4'),
+    ('eta', '<f8'),  # unix time, 0 when unknown
+], align=True)
+JOB_FIELDS = ('progress', 'sent_lines', 'current_layer_height', 'max_layer_height', 'eta')
+
+_segment = None
+_header = None
+_table = None
+_owner = False
+_slots = {}  # printer id -> row, in the writing process
+_lock = Lock()  # serializes writers; readers don't take it
+
+
+def enabled():
+    return bool(Config.get('shared_telemetry'))
+
+
+def create():
+    # in the process running the printers; replaces a segment left over from a previous run
+    global _segment, _header, _table, _owner
+    name = Config.get('telemetry_name')
+    try:
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+    except FileNotFoundError:
+        pass
+    _segment = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + CAPACITY * ROW.itemsize)
+    _header, _table = mapSegment(_segment)
+    _table[:] = np.zeros(CAPACITY, dtype=ROW)
+    _header['pid'], _header['closed'], _header['capacity'] = os.getpid(), 0, CAPACITY
+    _owner = True
+    atexit.register(close)
+
+
+def close():
+    # marks the table closed so attached readers let go of it, then removes it
+    global _segment, _header, _table
+    if _segment is None:
+        return
+    if _owner:
+        _header['closed'] = 1
+    segment = _segment
+    _segment = _header = _table = None
+    segment.close()
+    if _owner:
+        segment.unlink()
+
+
+def mapSegment(segment):
+    header = np.ndarray((), dtype=HEADER, buffer=segment.buf)
+    table = np.ndarray((CAPACITY,), dtype=ROW, buffer=segment.buf, offset=HEADER_SIZE)
+    return header, table
+
+
+def attach():
+    # in a reading process; True once the table is mapped. reattaches after the owner restarted
+    global _segment, _header, _table
+    if _segment is not None and (_owner or not stale()):
+        return True
+    if _segment is not None:
+        close()
+    try:
+        segment = shared_memory.SharedMemory(name=Config.get('telemetry_name'))
+    except FileNotFoundError:
+        return False
+    # only the owner removes the segment; without this the tracker would unlink it when this process exits
+    resource_tracker.unregister(segment._name, 'shared_memory')
+    _segment = segment
+    _header, _table = mapSegment(segment)
+    if stale():
+        close()  # left behind by a writer that was killed; the next one to start replaces it
+        return False
+    return True
+
+
+def stale():
+    if _header['closed']:
+        return True
+    try:
+        os.kill(int(_header['pid']), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def register(printer_id, status=None):
+    # gives a printer thread a row, cleared except for its id and status
+    if _table is None or not _owner:
+        return
+    with _lock:
+        slot = _slots.get(printer_id)
+        if slot is None:
+            used = set(_slots.values())
+            slot = next((index for index in range(CAPACITY) if index not in used), None)
+            if slot is None:
+                print(f"Telemetry table full, printer {printer_id} not added")
+                return
+            _slots[printer_id] = slot
+        write(slot, {
+            **{field: 0 for field in ROW.names if field != 'seq'},
+            'printer_id': printer_id, 'status': STATUS_CODES.get(status, 0),
+        })
+
+
+def unregister(printer_id):
+    if _table is None or not _owner:
+        return
+    with _lock:
+        slot = _slots.pop(printer_id, None)
+        if slot is not None:
+            write(slot, {'printer_id': 0})
+
+
+def write(slot, values):
+    # callers hold _lock
+    seq = int(_table['seq'][slot])
+    _table['seq'][slot] = (seq + 1) & 0xFFFFFFFF
+    for field, value in values.items():
+        _table[field][slot] = value
+    _table['seq'][slot] = (seq + 2) & 0xFFFFFFFF
+
+
+def printerUpdated(printer_id, status=None, extruder_temp=None, bed_temp=None):
+    if _table is None:
+        return
+    values = {}
+    if status is not None:
+        values['status'] = STATUS_CODES.get(status, 0)
+    if extruder_temp is not None:
+        values['extruder_temp'] = float(extruder_temp)
+    if bed_temp is not None:
+        values['bed_temp'] = float(bed_temp)
+    update(printer_id, None, values)
+
+
+def jobUpdated(printer_id, job_id, **fields):
+    # fields are JOB_FIELDS; eta is a datetime
+    if _table is None:
+        return
+    if 'eta' in fields:
+        eta = fields['eta']
+        fields['eta'] = eta.timestamp() if isinstance(eta, datetime) and eta != datetime.min else 0
+    update(printer_id, job_id, fields)
+
+
+def update(printer_id, job_id, values):
+    with _lock:
+        slot = _slots.get(printer_id)
+        if slot is None:
+            return
+        if job_id is not None and int(_table['job_id'][slot]) != job_id:
+            # another job started on this printer: its fields start over
+            values = {**{field: 0 for field in JOB_FIELDS}, **values, 'job_id': job_id}
+        write(slot, values)
+
+
+def readRow(slot):
+    for _ in range(READ_RETRIES):
+        seq = int(_table['seq'][slot])
+        if not seq & 1:
+            row = _table[slot].copy()
+            if int(_table['seq'][slot]) == seq:
+                return row
+        time.sleep(0)  # let a writer that was preempted mid-row finish
+    return None
+
+
+def read():
+    # every printer's row as a dict, or None when there's no table to read
+    if not attach():
+        return None
+    rows = _table.copy()
+    after = _table['seq'].copy()
+    unsettled = np.nonzero((rows['seq'] != after) | (rows['seq'] & 1 == 1))[0]
+    for slot in unsettled:
+        row = readRow(slot)
+        if row is None:
+            row = np.zeros((), dtype=ROW)  # still being written after every retry: left out this time
+        rows[slot] = row
+    return [rowInfo(row) for row in rows if row['printer_id'] != 0]
+
+
+def rowInfo(row):
+    eta = float(row['eta'])
+    status = int(row['status'])
+    return {
+        "id": int(row['printer_id']),
+        "status": STATUSES[status] if status < len(STATUSES) else 'unknown',
+        "extruder_temp": float(row['extruder_temp']),
+        "bed_temp": float(row['bed_temp']),
+        "job_id": int(row['job_id']) or None,
+        "progress": float(row['progress']),
+        "sent_lines": int(row['sent_lines']),
+        "current_layer_height": float(row['current_layer_height']),
+        "max_layer_height": float(row['max_layer_height']),
+        "eta": datetime.fromtimestamp(eta).isoformat() if eta else None,
+    }
@@ -0,0 +1,294 @@
+# handle gcode upload ingestion: format detection, streaming compression and the process pool that does it
+import bz2
+import gzip
+import io
+import lzma
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from models.config import Config
+from Classes import ArcFitter, BGCode, MotionAnalyzer
+
+CHUNK_SIZE = 1024 * 1024  # read/compress uploads 1 MiB at a time
+
+# magic bytes at the start of each supported compressed format
+MAGIC = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'lzma': b'\xfd7zXZ\x00',
+}
+
+# slicer comments we pick up while spooling so the scheduler knows a job's length before it prints
+TIME_PATTERNS = [
+    re.compile(rb';TIME:(\d+)'),  # Cura
+    re.compile(rb'; estimated printing time \(normal mode\) = ([^\r\n]+)'),  # PrusaSlicer
+]
+MODEL_PATTERNS = [
+    re.compile(rb'; printer_model = ([^\r\n]*)'),
+    re.compile(rb'M862\.3 P ?"?([A-Za-z0-9]+)'),
+]
+PROFILE_PATTERN = re.compile(rb'; print_settings_id = ([^\r\n]*)')  # slicer print profile, keys the ETA correction
+DURATION = re.compile(r'(\d+)\s*([dhms]?)')  # one "<number><unit>" part of a slicer time estimate
+DURATION_UNITS = {'d': 24 * 60 * 60, 'h': 60 * 60, 'm': 60, 's': 1, '': 1}
+SCAN_OVERLAP = 256  # bytes carried between chunks so a comment split across chunks is still found
+
+_pool = None
+_pool_lock = Lock()
+_pending = {}  # job id -> Future that resolves to (compressed blob, time profile, arc-fitted blob, lines it removed)
+_pending_lock = Lock()
+
+
+class Upload:
+    # result of ingesting a file: either the finished blob or a future for (blob, time profile), plus scanned slicer metadata
+    def __init__(self, blob, future, metadata):
+        self.blob = blob
+        self.future = future
+        self.metadata = metadata
+
+
+def detectCodec(head):
+    # returns the codec name if head starts with a known magic number, else None (plain text gcode)
+    for codec, magic in MAGIC.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def openCompressed(fileobj, codec, level):
+    # wrap fileobj in a writer for the given codec
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=level)
+    if codec == 'bz2':
+        return bz2.BZ2File(fileobj, mode='wb', compresslevel=max(level, 1))
+    if codec == 'lzma':
+        return lzma.LZMAFile(fileobj, mode='wb', preset=level)
+    raise ValueError(f"Unsupported compression codec: {codec}")
+
+
+def decompress(data):
+    # decompress a stored blob regardless of which codec it was written with; binary G-code comes back as text
+    if BGCode.isBGCode(data[:4]):
+        return ''.join(BGCode.readGcode(io.BytesIO(data))).encode('utf-8')
+    codec = detectCodec(data[:6])
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    if codec == 'bz2':
+        return bz2.decompress(data)
+    if codec == 'lzma':
+        return lzma.decompress(data)
+    return data
+
+
+def compressFile(path, codec, level):
+    # stream the spooled upload through the compressor and return the blob
+    with tempfile.SpooledTemporaryFile(max_size=64 * CHUNK_SIZE) as out:
+        with open(path, 'rb') as src, openCompressed(out, codec, level) as writer:
+            shutil.copyfileobj(src, writer, CHUNK_SIZE)
+        out.seek(0)
+        return out.read()
+
+
+def fitArcs(path, tolerance):
+    # arc-fitted copy of the spooled upload next to it; returns (its path, lines removed), or (None, 0) if it didn't help
+    fitted = f"{path}.arcs"
+    try:
+        removed = ArcFitter.fitFile(path, fitted, tolerance)
+    except Exception as e:
+        print(f"Error fitting arcs: {e}")
+        removed = 0
+    if removed <= 0:
+        if os.path.exists(fitted):
+            os.remove(fitted)
+        return None, 0
+    return fitted, removed
+
+
+def processUpload(path, codec, level, model, arc_tolerance=0):
+    # runs inside a pool worker: returns (compressed blob, per-line cumulative print time as float32 bytes,
+    # compressed arc-fitted variant or None, lines the fitting removed, model). the time profile is for the file that
+    # prints, with the limits of the printer model the slicer recorded: the likeliest printer, not necessarily the one
+    # the job ends up on (JobRuntime.getTimeProfile)
+    fitted = None
+    try:
+        blob = compressFile(path, codec, level)
+        removed = 0
+        if arc_tolerance:
+            fitted, removed = fitArcs(path, arc_tolerance)
+        arc_blob = compressFile(fitted, codec, level) if fitted else None
+        try:
+            time_profile = MotionAnalyzer.toBytes(MotionAnalyzer.analyzeFile(fitted or path, model))
+        except Exception as e:
+            print(f"Error analyzing gcode motion: {e}")
+            time_profile = None
+        return blob, time_profile, arc_blob, removed, model
+    finally:
+        os.remove(path)
+        if fitted:
+            os.remove(fitted)
+
+
+def processBGCode(path, model):
+    # runs inside a pool worker: binary G-code is kept as uploaded (it's already compact), only the time profile is computed
+    try:
+        with open(path, 'rb') as f:
+            blob = f.read()
+        try:
+            time_profile = MotionAnalyzer.toBytes(MotionAnalyzer.analyze(BGCode.Lines(path), model))
+        except Exception as e:
+            print(f"Error analyzing gcode motion: {e}")
+            time_profile = None
+        return blob, time_profile, None, 0, model
+    finally:
+        os.remove(path)
+
+
+def bgcodeMetadata(f):
+    # the same metadata scanMetadata finds in text gcode, plus filament/layer stats, from a binary G-code file's
+    # metadata blocks
+    blocks = BGCode.readMetadata(f)
+    printer, printed, slicer = blocks.get('printer', {}), blocks.get('print', {}), blocks.get('slicer', {})
+    values = {**slicer, **printer, **printed}
+    metadata = {}
+    estimate = values.get('estimated printing time (normal mode)')
+    if estimate:
+        metadata['estimated_time'] = parseDuration(estimate)
+    if values.get('printer_model'):
+        metadata['printer_model'] = values['printer_model']
+    if slicer.get('print_settings_id'):
+        metadata['profile'] = slicer['print_settings_id'][:100]
+    if values.get('filament_type'):
+        metadata['filament_type'] = values['filament_type']
+    for key, field in (('filament used [g]', 'filament_used_g'), ('filament used [mm]', 'filament_used_mm'),
+                       ('layer_height', 'layer_height'), ('max_layer_z', 'max_layer_height')):
+        try:
+            metadata[field] = float(values[key])
+        except (KeyError, ValueError):
+            pass
+    return metadata
+
+
+def parseDuration(text):
+    # "1d 2h 3m 4s" / "2h 3m" / "45s" -> seconds; a bare number is already seconds
+    return sum(int(value) * DURATION_UNITS[unit] for value, unit in DURATION.findall(text.lower()))
+
+
+def scanMetadata(chunk, metadata):
+    # fill metadata with whatever estimate/profile/model comments appear in this chunk
+    for pattern in TIME_PATTERNS:
+        match = pattern.search(chunk)
+        if match:
+            metadata['estimated_time'] = parseDuration(match.group(1).decode('utf-8', 'ignore'))
+    if not metadata.get('profile'):
+        match = PROFILE_PATTERN.search(chunk)
+        if match and match.group(1).strip():
+            metadata['profile'] = match.group(1).decode('utf-8', 'ignore').strip()[:100]
+    if not metadata.get('printer_model'):
+        for pattern in MODEL_PATTERNS:
+            match = pattern.search(chunk)
+            if match and match.group(1).strip():
+                metadata['printer_model'] = match.group(1).decode('utf-8', 'ignore').strip()
+                break
+
+
+def copyAndScan(stream, out, head, metadata):
+    # chunked copy of the rest of the upload that also scans plain gcode for slicer metadata
+    tail = head
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        out.write(chunk)
+        if metadata is not None:
+            scanMetadata(tail + chunk, metadata)
+        tail = chunk[-SCAN_OVERLAP:]
+    if metadata is not None:
+        scanMetadata(tail, metadata)
+
+
+def getPool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=Config.get('upload_workers'))
+        return _pool
+
+
+def spoolUpload(file):
+    # copy the upload to a temp file in chunks so it is never held in memory as a whole.
+    # returns (path, codec, metadata) where codec is the format the upload is already compressed with, if any.
+    stream = file.stream if hasattr(file, 'stream') else file
+    stream.seek(0)
+    head = stream.read(6)
+    codec = detectCodec(head)
+    metadata = {}
+    fd, path = tempfile.mkstemp(suffix='.gcode')
+    with os.fdopen(fd, 'wb') as out:
+        out.write(head)
+        copyAndScan(stream, out, head, None if codec or BGCode.isBGCode(head) else metadata)
+    return path, codec, metadata
+
+
+def ingest(file):
+    # returns an Upload. Already-compressed uploads come back as a blob right away;
+    # plain gcode is spooled to disk and compressed in the process pool, so blob is None and future is set.
+    # binary G-code (.bgcode) is kept as uploaded, but also goes through the pool for its time profile.
+    # metadata holds the slicer estimate/printer model found in plain or binary gcode ({} for compressed uploads).
+    if isinstance(file, Upload):
+        return file
+    metadata = {}
+    if isinstance(file, bytes):
+        if detectCodec(file[:6]):
+            return Upload(file, None, metadata)
+        if not BGCode.isBGCode(file[:4]):
+            scanMetadata(file, metadata)
+        fd, path = tempfile.mkstemp(suffix='.gcode')
+        with os.fdopen(fd, 'wb') as out:
+            out.write(file)
+    else:
+        path, codec, metadata = spoolUpload(file)
+        if codec:
+            with open(path, 'rb') as f:
+                blob = f.read()
+            os.remove(path)
+            return Upload(blob, None, metadata)
+
+    if BGCode.isFile(path):
+        # binary G-code is stored as is; its metadata blocks give the estimate and printer model right away
+        try:
+            with open(path, 'rb') as f:
+                metadata = bgcodeMetadata(f)
+        except Exception:
+            os.remove(path)
+            raise
+        future = getPool().submit(processBGCode, path, metadata.get('printer_model', ''))
+        return Upload(None, future, metadata)
+
+    arc_tolerance = Config.get('arc_tolerance') if Config.get('arc_fitting') else 0
+    future = getPool().submit(processUpload, path, Config.get('compression_codec'), Config.get('compression_level'), metadata.get('printer_model', ''), arc_tolerance)
+    return Upload(None, future, metadata)
+
+
+def trackUpload(job_ids, future):
+    # remember which jobs are waiting on this future so readers can block on it instead of seeing an empty file
+    with _pending_lock:
+        for job_id in job_ids:
+            _pending[job_id] = future
+
+
+def finishUpload(job_ids):
+    with _pending_lock:
+        for job_id in job_ids:
+            _pending.pop(job_id, None)
+
+
+def waitForUpload(job_id):
+    # returns processUpload's result for a job whose processing is still in flight, or None
+    with _pending_lock:
+        future = _pending.get(job_id)
+    if future is None:
+        return None
+    return future.result()
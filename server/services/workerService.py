@@ -0,0 +1,332 @@
+# print worker processes: with printWorkers > 0 in config, the per-line print loop (parseGcode and the serial
+# reads/writes) runs in a pool of worker processes instead of a thread per printer, so 40 busy printers don't
+# share one GIL with request handling and socket.io. printers are grouped onto workers by id.
+# the printer thread still owns the queue and the bookkeeping around a print; it hands the job to its worker
+# (printerworker.py, over ipcService) and waits for the verdict. the worker sends back the setter calls the loop
+# makes (status, progress, temps...) and they're replayed on the real printer/job objects here, which update the
+# state store and emit as usual. status changes made here (pause, resume, cancel) and resets go down as controls.
+# the pool restarts workers that exit; prints that were running on one fail with an error.
+import os
+import subprocess
+import sys
+import time
+import uuid
+from threading import Event, Lock, Thread, local
+
+from services import ipcService
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKER_SCRIPT = os.path.join(SERVER_DIR, 'printerworker.py')
+STARTUP_TIMEOUT = 30  # seconds for a worker to import the app and open its socket
+MONITOR_INTERVAL = 1
+RESTART_DELAY = 2
+VERDICT_POLL = 5  # seconds between asking the worker directly, in case the done event was lost
+
+# setter calls a worker may replay on the real objects
+PRINTER_CALLS = {'setStatus', 'setError', 'setTemps', 'setColorChangeBuffer'}
+JOB_CALLS = {
+    'setProgress', 'setSentLines', 'setExtruded', 'setFilePause', 'setMaxLayerHeight', 'setCurrentLayerHeight',
+    'setTimeStarted', 'setTime',
+}
+# latest-value calls the worker coalesces before sending
+TELEMETRY_CALLS = {'setProgress', 'setSentLines', 'setTemps', 'setCurrentLayerHeight'}
+FLUSH_INTERVAL = 0.1
+# fields a control may change in a running print
+CONTROLS = {'status', 'terminated'}
+# job fields the loop writes directly, copied back when the print ends
+JOB_RESULT_FIELDS = ('estimated_time', 'predicted_time', 'job_time', 'time_started', 'extruded', 'filePause')
+
+_applying = local()  # set while replaying a worker's call, so it isn't sent back down as a control
+
+
+def printerState(printer):
+    return {
+        "id": printer.id, "device": printer.device, "description": printer.description, "hwid": printer.hwid,
+        "name": printer.name, "status": printer.status, "filament": printer.filament, "colorbuff": printer.colorbuff,
+        "canPause": printer.canPause, "error": printer.error, "extruder_temp": printer.extruder_temp,
+        "bed_temp": printer.bed_temp,
+    }
+
+
+def jobState(job):
+    return {field: getattr(job, field) for field in type(job).__slots__}
+
+
+class Execution:
+    # one print handed to a worker
+    def __init__(self, printer, job):
+        self.id = uuid.uuid4().hex
+        self.printer = printer
+        self.job = job
+        self.verdict = None
+        self.done = Event()
+
+    def finish(self, verdict, job_fields=None):
+        if self.done.is_set():
+            return
+        for field, value in (job_fields or {}).items():
+            if field in JOB_RESULT_FIELDS:
+                setattr(self.job, field, value)
+        self.verdict = verdict
+        self.done.set()
+
+
+class PrintWorker:
+    # one worker process and the prints running in it
+    def __init__(self, index, path):
+        self.index = index
+        self.path = path
+        self.process = None
+        self.rpc = ipcService.RpcClient(path)
+        self.prints = {}  # execution id -> Execution
+        self.lock = Lock()
+        self.restarts = 0
+        self.reader = None
+
+    def start(self):
+        self.spawn()
+        return self.waitReady()
+
+    def spawn(self):
+        env = {**os.environ, 'QVIEW3D_ROLE': 'worker'}
+        self.process = subprocess.Popen([sys.executable, WORKER_SCRIPT, self.path], cwd=SERVER_DIR, env=env)
+        if self.reader is None:
+            # reconnects on its own after a restart
+            self.reader = Thread(target=self.rpc.events, args=(self.apply,), daemon=True)
+            self.reader.start()
+
+    def waitReady(self):
+        deadline = time.time() + STARTUP_TIMEOUT
+        while time.time() < deadline and self.alive():
+            try:
+                if self.rpc.call('subscribers') > 0:  # our event stream is connected, nothing can be missed
+                    return True
+            except (OSError, ipcService.RpcError):
+                pass
+            time.sleep(0.2)
+        print(f"Print worker {self.index} did not start")
+        return False
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, printer, job):
+        # blocks the printer thread until the worker returns the verdict
+        execution = Execution(printer, job)
+        with self.lock:
+            self.prints[execution.id] = execution
+        try:
+            self.rpc.call('start', execution.id, printerState(printer), jobState(job))
+            while not execution.done.wait(VERDICT_POLL):
+                result = self.rpc.call('verdict', execution.id)
+                if result is not None:
+                    execution.finish(result['verdict'], result['job'])
+            return execution.verdict
+        except Exception as e:
+            print(f"Error running print on worker {self.index}: {e}")
+            printer.setError(f"Print worker error: {e}")
+            return "error"
+        finally:
+            with self.lock:
+                self.prints.pop(execution.id, None)
+
+    def control(self, printer, field, value):
+        # a status change/reset made here, for the print loop running in the worker
+        if getattr(_applying, 'on', False):
+            return
+        with self.lock:
+            executions = [execution for execution in self.prints.values() if execution.printer is printer]
+        for execution in executions:
+            try:
+                self.rpc.call('control', execution.id, field, value)
+            except Exception as e:
+                print(f"Error sending {field} to print worker {self.index}: {e}")
+
+    def apply(self, frame):
+        # a setter call or verdict from the worker's event stream
+        with self.lock:
+            execution = self.prints.get(frame.get('print'))
+        if execution is None:
+            return
+        if 'done' in frame:
+            execution.finish(frame['done'], frame.get('job'))
+            return
+        target, method = frame['target'], frame['method']
+        if target == 'printer' and method in PRINTER_CALLS:
+            obj = execution.printer
+        elif target == 'job' and method in JOB_CALLS:
+            obj = execution.job
+        else:
+            return
+        _applying.on = True
+        try:
+            getattr(obj, method)(*frame['args'])
+        finally:
+            _applying.on = False
+
+    def crashed(self):
+        # fail whatever was running, then start a new process
+        code = self.process.returncode if self.process else None
+        print(f"Print worker {self.index} exited ({code}), restarting")
+        with self.lock:
+            executions = list(self.prints.values())
+        for execution in executions:
+            execution.printer.setError("Print worker process stopped")
+            execution.finish("error")
+        self.restarts += 1
+        time.sleep(RESTART_DELAY)
+        self.start()
+
+    def getStats(self):
+        with self.lock:
+            active = [execution.printer.id for execution in self.prints.values()]
+        return {
+            "index": self.index,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive(),
+            "restarts": self.restarts,
+            "printing": active,
+        }
+
+
+class PrintWorkerPool:
+    def __init__(self, size, path):
+        self.workers = [PrintWorker(index, f"{path}.worker{index}") for index in range(size)]
+        self.monitor = None
+        self.lock = Lock()
+
+    def start(self):
+        with self.lock:
+            if self.monitor is not None:
+                return
+            for worker in self.workers:
+                worker.spawn()
+            for worker in self.workers:
+                worker.waitReady()
+            self.monitor = Thread(target=self.supervise, daemon=True)
+            self.monitor.start()
+
+    def supervise(self):
+        while True:
+            time.sleep(MONITOR_INTERVAL)
+            for worker in self.workers:
+                if not worker.alive():
+                    try:
+                        worker.crashed()
+                    except Exception as e:
+                        print(f"Error restarting print worker {worker.index}: {e}")
+
+    def assign(self, printer_id):
+        # printers with the same id modulo the pool size share a worker
+        return self.workers[printer_id % len(self.workers)]
+
+    def getStats(self):
+        return [worker.getStats() for worker in self.workers]
+
+
+class WorkerLink:
+    # worker side: forwards one print's setter calls to the parent, keeping only the newest telemetry value of
+    # each kind between flushes. other calls flush what's pending first, so the order is kept
+    def __init__(self, print_id, publish):
+        self.print_id = print_id
+        self.publish = publish
+        self.pending = {}
+        self.flushed = 0
+        self.lock = Lock()
+
+    def forward(self, target, method, *args):
+        frame = {"print": self.print_id, "target": target, "method": method, "args": args}
+        with self.lock:
+            if method in TELEMETRY_CALLS:
+                self.pending[(target, method)] = frame
+                if time.monotonic() - self.flushed < FLUSH_INTERVAL:
+                    return
+                frame = None
+            self.flushPending()
+            if frame is not None:
+                self.publish(frame)
+
+    def flush(self):
+        with self.lock:
+            self.flushPending()
+
+    def flushPending(self):
+        for frame in self.pending.values():
+            self.publish(frame)
+        self.pending.clear()
+        self.flushed = time.monotonic()
+
+
+def serveWorker(app, path):
+    # worker side, run by printerworker.py: serves start/control/verdict calls from the parent until it exits
+    from models.db import db
+    from models.workerRuntime import WorkerJob, WorkerPrinter
+    from services import etaService
+
+    active = {}  # execution id -> (printer, job, link)
+    results = {}  # execution id -> {"verdict", "job"}, until the parent asks or it's pushed out
+    lock = Lock()
+    parent = os.getppid()
+
+    def run(execution_id, printer, job, link):
+        with app.app_context():
+            try:
+                verdict = printer.execute(job)
+                if verdict == "cancelled":
+                    printer.endingSequence(job)
+                printer.disconnect()
+            except Exception as e:
+                printer.setError(e)
+                verdict = "error"
+            finally:
+                db.session.remove()
+        link.flush()
+        result = {"verdict": verdict, "job": {field: getattr(job, field) for field in JOB_RESULT_FIELDS}}
+        with lock:
+            active.pop(execution_id, None)
+            results[execution_id] = result
+            while len(results) > 100:
+                results.pop(next(iter(results)))
+        server.publish({"print": execution_id, "done": verdict, "job": result["job"]})
+
+    def dispatch(method, args, kwargs):
+        if method == 'subscribers':
+            return len(server.subscribers)
+        if method == 'start':
+            execution_id, printer_state, job_state = args
+            link = WorkerLink(execution_id, server.publish)
+            printer = WorkerPrinter.fromState(printer_state, link)
+            job = WorkerJob.fromState(job_state, link)
+            with lock:
+                active[execution_id] = (printer, job, link)
+            Thread(target=run, args=(execution_id, printer, job, link), daemon=True).start()
+            return True
+        if method == 'control':
+            execution_id, field, value = args
+            if field not in CONTROLS:
+                raise ValueError(f"Unknown control: {field}")
+            with lock:
+                entry = active.get(execution_id)
+            if entry is not None:
+                setattr(entry[0], field, value)
+            return entry is not None
+        if method == 'verdict':
+            with lock:
+                return results.pop(args[0], None)
+        raise AttributeError(f"Unknown print worker command: {method}")
+
+    def housekeeping():
+        # flush coalesced telemetry, and exit if the parent went away
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            with lock:
+                links = [entry[2] for entry in active.values()]
+            for link in links:
+                link.flush()
+            if os.getppid() != parent:
+                os._exit(0)
+
+    server = ipcService.RpcServer(path, dispatch)
+    Thread(target=housekeeping, daemon=True).start()
+    etaService.start(app)  # the loop corrects the slicer estimate with the learned factors
+    server.serve_forever()
@@ -0,0 +1,28 @@
+# the server modules import each other from the server directory. the tests run them against a throwaway config,
+# database and working directory, since app.py clears ../uploads relative to wherever it's started
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+_root = tempfile.mkdtemp(prefix='qview3d-tests-')
+os.makedirs(os.path.join(_root, 'run'))
+with open(os.path.join(_root, 'config.json'), 'w') as f:
+    json.dump({"environment": "development", "databaseURI": os.path.join(_root, 'qview3d')}, f)
+os.environ['QVIEW3D_CONFIG'] = os.path.join(_root, 'config.json')
+os.chdir(os.path.join(_root, 'run'))
+
+
+@pytest.fixture(scope='session')
+def app():
+    # the Flask app with its tables created; no printers are registered, so it starts no printer threads
+    from app import app as flask_app
+    from models.db import db
+    with flask_app.app_context():
+        db.create_all()
+    return flask_app
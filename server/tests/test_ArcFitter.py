@@ -0,0 +1,109 @@
+import math
+import re
+
+from Classes import ArcFitter
+
+CENTER = (100.0, 100.0)
+RADIUS = 20.0
+TOLERANCE = 0.05
+
+
+def arcPoints(count, start=0.0, sweep=math.pi / 2):
+    # points along a counterclockwise arc around CENTER, rounded to the 3 decimals slicers print
+    return [
+        (round(CENTER[0] + RADIUS * math.cos(start + sweep * n / count), 3), round(CENTER[1] + RADIUS * math.sin(start + sweep * n / count), 3))
+        for n in range(count + 1)
+    ]
+
+
+def moves(points, e=0.0, relative=False, rate=0.05):
+    # G1 extrusion moves through points (after the first), with absolute or relative E; returns (lines, final E)
+    lines = []
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        step = round(math.hypot(x1 - x0, y1 - y0) * rate, 5)
+        e = round(e + step, 5)
+        lines.append(f"G1 X{x1:.3f} Y{y1:.3f} E{step if relative else e:.5f}\n")
+    return lines, e
+
+
+def fit(lines, tolerance=TOLERANCE):
+    fitter = ArcFitter.ArcFitter(tolerance)
+    out = [output for line in lines for output in fitter.feed(line)]
+    return out + fitter.flush()
+
+
+def words(line):
+    return {letter: float(value) for letter, value in ArcFitter.WORD.findall(line.split(';')[0].upper()[2:])}
+
+
+def extruded(lines, relative=False):
+    # filament an output pushes: the last absolute E (G92 E0 at the start), or the sum of relative ones
+    values = [words(line)['E'] for line in lines if re.match(r'G[0-3]\b', line) and 'E' in words(line)]
+    return sum(values) if relative else values[-1]
+
+
+def test_a_run_on_a_circle_becomes_one_arc_within_tolerance():
+    points = arcPoints(40)
+    body, _ = moves(points)
+    out = fit(["G90\n", "M82\n", "G92 E0\n", f"G0 X{points[0][0]:.3f} Y{points[0][1]:.3f} F6000\n", "G1 F1800\n"] + body)
+    arcs = [line for line in out if line.startswith(('G2', 'G3'))]
+    assert len(arcs) == 1 and arcs[0].startswith('G3')  # counterclockwise
+    assert not [line for line in out if line.startswith('G1 X')]
+    arc = words(arcs[0])
+    assert (arc['X'], arc['Y']) == points[-1]  # ends exactly where the last move did
+    center = (points[0][0] + arc['I'], points[0][1] + arc['J'])
+    for x, y in points:
+        assert abs(math.hypot(x - center[0], y - center[1]) - RADIUS) <= TOLERANCE
+
+
+def test_a_run_that_strays_past_the_tolerance_is_kept_as_lines():
+    points = arcPoints(40)
+    points[20] = (points[20][0] + 0.5, points[20][1])  # a bump no arc through the rest passes within 0.05 of
+    body, _ = moves(points)
+    out = fit(["G92 E0\n", f"G0 X{points[0][0]:.3f} Y{points[0][1]:.3f}\n"] + body)
+    for line in body[19:21]:
+        assert line in out
+
+
+def test_extrusion_is_unchanged():
+    points = arcPoints(30)
+    body, total = moves(points, e=0.0)
+    head = ["G92 E0\n", f"G0 X{points[0][0]:.3f} Y{points[0][1]:.3f}\n"]
+    out = fit(head + body)
+    assert len(out) < len(head + body)
+    assert abs(extruded(out) - total) < 1e-9
+
+    # relative extrusion (M83): the arc carries the sum of what its moves extruded
+    body, total = moves(points, relative=True)
+    out = fit(["M83\n"] + head[1:] + body)
+    assert len(out) < len(body)
+    assert abs(extruded(out, relative=True) - sum(words(line)['E'] for line in body)) < 1e-9
+
+
+def test_markers_comments_and_other_commands_pass_through():
+    first, second = arcPoints(20), arcPoints(20, start=math.pi, sweep=-math.pi / 2)
+    body1, e = moves(first)
+    body2, _ = moves(second, e=e - 0.8)
+    other = [
+        ";LAYER_CHANGE\n", ";Z:0.4\n", f"G1 E{e - 0.8:.5f} F2100 ; retract\n", "G1 Z0.4 F720\n", "M106 S255\n",
+        f"G0 X{second[0][0]:.3f} Y{second[0][1]:.3f} F6000\n", "; perimeter\n",
+    ]
+    lines = ["G92 E0\n", f"G0 X{first[0][0]:.3f} Y{first[0][1]:.3f}\n"] + body1 + other + body2 + ["M104 S0\n"]
+    out = fit(lines)
+    kept = [line for line in out if not line.startswith(('G2', 'G3'))]
+    assert kept == ["G92 E0\n", lines[1]] + other + ["M104 S0\n"]  # in order, byte for byte
+    assert [line[:2] for line in out if line.startswith(('G2', 'G3'))] == ['G3', 'G2']
+
+
+def test_relative_positioning_is_left_alone():
+    points = arcPoints(30)
+    relative = [
+        f"G1 X{x1 - x0:.3f} Y{y1 - y0:.3f} E0.05000\n" for (x0, y0), (x1, y1) in zip(points, points[1:])
+    ]
+    lines = ["G92 E0\n", f"G0 X{points[0][0]:.3f} Y{points[0][1]:.3f}\n", "G91\n"] + relative + ["G90\n"]
+    assert fit(lines) == lines
+
+    # back in absolute positioning, moves are only merged again once the position is known
+    out = fit(lines + ["G92 X0 Y0\n"] + [f"G1 X{x - points[0][0]:.3f} Y{y - points[0][1]:.3f} E{n * 0.05:.5f}\n" for n, (x, y) in enumerate(points[1:], 1)])
+    assert out[:len(lines) + 1] == lines + ["G92 X0 Y0\n"]
+    assert len(out) == len(lines) + 2
@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+from Classes import BGCode
+
+
+def pack(fields):
+    # (value, bit count) fields into MSB-first bytes, the last one padded with zeros
+    bits = "".join(format(value, f"0{count}b") for value, count in fields)
+    bits += "0" * (-len(bits) % 8)
+    return bytes(int(bits[i:i + 8], 2) for i in range(0, len(bits), 8))
+
+
+def test_bit_reader_reads_fields_across_bytes():
+    fields = [(1, 1), (0x61, 8), (0, 1), (1234, 11), (9, 4), (0x7f, 7), (3, 2)]
+    reader = BGCode.BitReader(pack(fields))
+    assert [reader.read(count) for _, count in fields] == [value for value, _ in fields]
+    assert reader.read(8) is None  # only the padding is left
+
+
+def test_heatshrink_literals_and_backreference():
+    # "ab" as literals, then 4 bytes copied from 2 back
+    data = pack([(1, 1), (ord("a"), 8), (1, 1), (ord("b"), 8), (0, 1), (1, 11), (3, 4)])
+    assert BGCode.heatshrinkDecode(data, 11, 4, 6) == b"ababab"
+
+
+def test_heatshrink_rejects_a_reference_before_the_start():
+    data = pack([(1, 1), (ord("a"), 8), (0, 1), (4, 11), (0, 4)])
+    with pytest.raises(ValueError):
+        BGCode.heatshrinkDecode(data, 11, 4, 2)
+
+
+@pytest.mark.parametrize("window, lookahead", BGCode.HEATSHRINK.values())
+def test_heatshrink_matches_the_c_decoder(window, lookahead):
+    heatshrink2 = pytest.importorskip("heatshrink2")
+    rng = random.Random(window)
+    text = "".join(f"G1 X{rng.randint(0, 200)} Y{rng.randint(0, 200)} E{rng.random():.4f}\n" for _ in range(2000)).encode()
+    compressed = heatshrink2.compress(text, window_sz2=window, lookahead_sz2=lookahead)
+    assert BGCode.heatshrinkDecode(compressed, window, lookahead, len(text)) == text
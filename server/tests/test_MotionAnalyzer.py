@@ -0,0 +1,60 @@
+import math
+
+import numpy as np
+import pytest
+
+from Classes import MotionAnalyzer
+
+PROGRAM = [
+    "; header", "", "G28 ; home", "G90", "M83", "G1 X10 Y0 F3000 E1", "G91", "G1 X5 E0.5", "  g1 y-2\t; lowercase",
+    "G90", "G92 X0 Y0", "G1 X1 Y1", "M204 P500", "M205 X4", "G0 Z2", "G4 P250 S1", "N10 G1 X50", "M117 X99 done",
+]
+
+
+def test_modal_state_is_carried_from_command_to_command():
+    delta, arc, extrude, feed, accels, jerks, fixed = MotionAnalyzer.parse("\n".join(PROGRAM), 1000.0, 8.0)
+    assert len(delta) == 16  # one entry per command the printer is sent: no comments or blank lines
+
+    moves = {index: tuple(delta[index]) for index in np.flatnonzero(np.any(delta != 0, axis=1))}
+    assert moves == {
+        3: (10, 0, 0),
+        5: (5, 0, 0),  # G91: relative
+        6: (0, -2, 0),
+        9: (1, 1, 0),  # from where G92 said the head was
+        12: (0, 0, 2),
+    }
+    assert list(extrude[[3, 5]]) == [1, 0.5] and extrude.sum() == 1.5  # M83: relative extrusion
+    assert list(feed[[3, 5, 6, 9, 12]]) == [3000] * 5  # the last F carries over
+    assert (accels[12], jerks[12]) == (500, 4) and (accels[3], jerks[3]) == (1000, 8)
+    assert (fixed[0], fixed[13]) == (MotionAnalyzer.HOMING_TIME, 1.25)
+    assert not fixed[[1, 2, 3, 14, 15]].any()  # N10 G1 and M117 text aren't moves
+    assert not arc.any()
+
+
+def test_arcs_are_measured_along_the_curve():
+    text = "G1 X10 Y0\nG3 X0 Y10 I-10 J0\nG1 X10 Y0\nG2 X0 Y10 I-10 J0\nG2 X10 Y0 R10\n"
+    delta, arc, *rest = MotionAnalyzer.parse(text, 1000.0, 8.0)
+    assert arc[1] == pytest.approx(10 * math.pi / 2)  # counterclockwise quarter
+    assert arc[3] == pytest.approx(10 * 3 * math.pi / 2)  # clockwise the long way round
+    assert arc[4] == pytest.approx(math.hypot(10, 10))  # R form: the chord
+
+
+def test_times_follow_the_limits():
+    text = "\n".join(["G28", "G90"] + [f"G1 X{x % 2 * 100} Y{x * 2} F9000" for x in range(50)])
+    cumulative = {family: MotionAnalyzer.analyze(text, family) for family in ('MK4', 'MK3S', 'ENDER3')}
+    assert len(cumulative['MK4']) == 52 and np.all(np.diff(cumulative['MK4']) >= 0)
+    assert cumulative['MK4'][-1] < cumulative['MK3S'][-1] < cumulative['ENDER3'][-1]  # higher acceleration, faster
+
+    # limits the file sets itself win over the family's
+    text = "M204 P2500\n" + text
+    assert MotionAnalyzer.analyze(text, 'ENDER3')[-1] == pytest.approx(MotionAnalyzer.analyze(text, 'MK4')[-1])
+
+
+def test_lines_text_and_files_give_the_same_profile(tmp_path):
+    text = "\r\n".join(PROGRAM) + "\r\n"
+    path = tmp_path / "part.gcode"
+    path.write_bytes(text.encode())
+    expected = MotionAnalyzer.analyze(text)
+    assert np.array_equal(MotionAnalyzer.analyze(text.splitlines(True)), expected)
+    assert np.array_equal(MotionAnalyzer.analyzeFile(str(path)), expected)
+    assert len(MotionAnalyzer.analyze("; nothing but comments\n\n")) == 0
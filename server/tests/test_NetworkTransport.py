@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+
+import pytest
+import simple_websocket
+from flask import Flask, Response, abort, jsonify, request
+from werkzeug.serving import make_server
+
+from Classes import NetworkTransport
+
+GCODE = ";FLAVOR:Marlin\n;TIME:3\nG28\n" + "".join(f"G1 X{n} Y{n} E{n * 0.1:.1f} ; move\n" for n in range(40))
+WAIT = 0.05  # seconds between the upload and the print starting
+DURATION = 0.4  # seconds the print takes
+
+
+class MockPrinter:
+    # a Moonraker-style printer: the uploaded file prints by the clock, and its status is answered over HTTP and
+    # pushed over the websocket
+    def __init__(self, websocket=True, drop_feed=False, fail=False):
+        self.websocket = websocket
+        self.drop_feed = drop_feed  # close the websocket right after the subscribe reply
+        self.fail = fail  # the print fails halfway through
+        self.started = None
+        self.size = 0
+        self.name = None
+        self.scripts = []
+        self.deleted = []
+        self.polls = 0
+
+    def status(self):
+        stats, card = {'state': 'standby', 'filename': self.name or '', 'message': ''}, {'file_position': 0, 'file_size': self.size, 'progress': 0, 'is_active': False}
+        elapsed = time.time() - self.started - WAIT if self.started else -1
+        done = min(elapsed / DURATION, 1)
+        if self.fail and done > 0.5:
+            stats.update(state='error', message='Heater extruder not heating at expected rate')
+        elif done >= 1:
+            stats['state'] = 'complete'
+            card.update(file_position=self.size, progress=1)
+        elif done >= 0:
+            stats['state'] = 'printing'
+            card.update(file_position=int(done * self.size), progress=done, is_active=True)
+        return {'print_stats': stats, 'virtual_sdcard': card, 'extruder': {'temperature': 215.0}, 'heater_bed': {'temperature': 60.0}}
+
+    def app(self):
+        app = Flask(__name__)
+
+        @app.get('/server/info')
+        def info():
+            return jsonify({'result': {'klippy_state': 'ready'}})
+
+        @app.post('/printer/gcode/script')
+        def script():
+            self.scripts.append(request.args['script'])
+            return jsonify({'result': 'ok'})
+
+        @app.post('/server/files/upload')
+        def upload():
+            upload = request.files['file']
+            self.name, self.size = upload.filename, len(upload.read())
+            if request.form.get('print') == 'true':
+                self.started = time.time()
+            return jsonify({'result': {'item': {'path': self.name}, 'print_started': self.started is not None}})
+
+        @app.delete('/server/files/gcodes/<name>')
+        def delete(name):
+            self.deleted.append(name)
+            return jsonify({'result': {'item': {'path': name}}})
+
+        @app.get('/printer/objects/query')
+        def query():
+            self.polls += 1
+            return jsonify({'result': {'eventtime': time.time(), 'status': self.status()}})
+
+        @app.route('/websocket', websocket=True)
+        def feed():
+            if not self.websocket:
+                abort(404)
+            ws = simple_websocket.Server(request.environ)
+            try:
+                subscribe = ws.receive(timeout=5)
+                ws.send(Response.json_module.dumps({'jsonrpc': '2.0', 'result': {'status': self.status()}, 'id': Response.json_module.loads(subscribe)['id']}))
+                while not self.drop_feed:
+                    time.sleep(0.02)
+                    ws.send(Response.json_module.dumps({'jsonrpc': '2.0', 'method': 'notify_status_update', 'params': [self.status(), time.time()]}))
+            except simple_websocket.ConnectionClosed:
+                pass
+            ws.close()
+
+            class Closed(Response):
+                def __call__(self, *args, **kwargs):
+                    raise ConnectionError()  # the socket belongs to the websocket now; werkzeug mustn't answer on it
+            return Closed()
+
+        return app
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setattr(NetworkTransport.NetworkTransport, 'poll_interval', 0.02)
+    servers = []
+
+    def start(printer):
+        server = make_server('127.0.0.1', 0, printer.app(), threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def makeJob(app):
+    from models.db import db
+    from models.jobs import Job, JobRuntime
+
+    row = Job(GCODE.encode(), 'network', None, 'inqueue', 'part.gcode', 0, 0, None)
+    row.ingest_status = 'ready'
+    db.session.add(row)
+    db.session.commit()
+    job = JobRuntime.load([row.id])[0]
+    db.session.remove()
+    job.setFileName(f"part_{job.id}.gcode")
+    job.setStatus('printing')
+    path = os.path.abspath(f"network_{job.id}.gcode")
+    with open(path, 'w', newline='') as f:
+        f.write(GCODE)
+    return job, path
+
+
+def printOverNetwork(app, device, monkeypatch, ready=None):
+    # runs the print and returns (verdict, printer, job, the positions the transport reported)
+    from models.printers import PrinterRuntime
+
+    positions = []
+    position = NetworkTransport.NetworkTransport.position
+
+    def recorded(self):
+        try:
+            positions.append(position(self))
+        except Exception as e:
+            positions.append(e)
+            raise
+        return positions[-1]
+
+    monkeypatch.setattr(NetworkTransport.NetworkTransport, 'position', recorded)
+    with app.app_context():
+        job, path = makeJob(app)
+        printer = PrinterRuntime(device, 'network', 'network', 'network', status='printing', id=1)
+        printer.setSer(NetworkTransport.NetworkTransport(device))
+        if ready:
+            ready(printer.ser)
+        try:
+            verdict = printer.printOverNetwork(path, job)
+        finally:
+            printer.disconnect()
+            os.remove(path)
+    return verdict, printer, job, positions
+
+
+def test_commands_are_answered_with_ok(app, serve):
+    from models.printers import PrinterRuntime
+
+    mock = MockPrinter(websocket=False)
+    printer = PrinterRuntime(serve(mock), 'network', 'network', 'network', status='ready', id=1)
+    printer.setSer(NetworkTransport.NetworkTransport(printer.device))
+    assert printer.sendGcode("M155 S5") is None  # got its "ok"
+    printer.ser.write(b"M104 S0\nM140 S0\n")
+    assert [printer.ser.readline(), printer.ser.readline(), printer.ser.readline()] == [b"ok\n", b"ok\n", b""]
+    printer.disconnect()
+    assert mock.scripts == ["M155 S5", "M104 S0", "M140 S0"]
+
+
+def test_print_follows_the_websocket_feed(app, serve, monkeypatch):
+    mock = MockPrinter()
+
+    def subscribed(transport):
+        deadline = time.time() + 5
+        while not transport.pushed and time.time() < deadline:
+            time.sleep(0.01)
+        assert transport.pushed, "the status feed never came up"
+        mock.polls = 0
+
+    verdict, printer, job, positions = printOverNetwork(app, serve(mock), monkeypatch, subscribed)
+    assert verdict == "complete"
+    assert mock.polls == 0  # everything came over the websocket
+    assert mock.name == f"qview3d-{job.id}.gcode" and mock.size == len(GCODE.encode())
+    assert mock.deleted == [mock.name]
+    assert positions[0][0] == 0  # uploaded, not printing yet
+    assert positions[-1] is None
+    printed = [value[0] for value in positions[:-1]]
+    assert printed == sorted(printed) and 0 < max(printed) <= mock.size
+    assert job.progress == 100 and job.sent_lines == GCODE.count("G1") + 1
+
+
+def test_print_falls_back_to_polling_when_the_feed_drops(app, serve, monkeypatch):
+    # the feed closes after its first message; the transport polls from then on instead of holding on to that state
+    mock = MockPrinter(drop_feed=True)
+    start = time.time()
+    verdict, printer, job, positions = printOverNetwork(app, serve(mock), monkeypatch)
+    assert verdict == "complete"
+    assert time.time() - start < NetworkTransport.RECONNECT_DELAY  # done before the feed would have been retried
+    assert mock.polls > 1
+    assert positions[-1] is None and job.progress == 100
+
+
+def test_print_stops_when_the_printer_reports_an_error(app, serve, monkeypatch):
+    mock = MockPrinter(websocket=False, fail=True)
+    verdict, printer, job, positions = printOverNetwork(app, serve(mock), monkeypatch)
+    assert verdict == "error"
+    assert printer.getStatus() == "error"
+    assert "not heating" in printer.error
+    assert isinstance(positions[-1], Exception)
+    assert mock.deleted == []  # left on the printer
@@ -0,0 +1,153 @@
+import random
+import threading
+from datetime import datetime
+
+from Classes.Queue import Queue
+from services import stateService
+
+THREADS = 16
+JOBS_PER_WRITER = 100
+PRINTER_ID = 9001  # only this test publishes for it
+
+
+class FakeJob:
+    # the fields stateService serializes for a queued job
+    def __init__(self, id):
+        self.id = id
+        self.name = f"job {id}"
+        self.status = 'inqueue'
+        self.date = datetime(2024, 1, 1)
+        self.printer_id = PRINTER_ID
+        self.printer_name = None
+        self.error_id = 0
+        self.file_name_original = f"job{id}.gcode"
+        self.progress = 0.0
+        self.sent_lines = 0
+        self.favorite = 0
+        self.released = 0
+        self.filePause = 0
+        self.comments = None
+        self.extruded = 0
+        self.td_id = 0
+        self.time_started = 0
+        self.max_layer_height = 0.0
+        self.current_layer_height = 0.0
+        self.filament = ''
+
+    def getJobId(self):
+        return self.id
+
+
+def run(threads):
+    errors = []
+
+    def guard(target):
+        def wrapped():
+            try:
+                target()
+            except Exception as e:
+                errors.append(e)
+        return wrapped
+
+    workers = [threading.Thread(target=guard(target)) for target in threads]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert errors == []
+
+
+def test_concurrent_add_remove_bump():
+    # 8 writers append their own jobs in order, 4 churners add, bump and delete jobs of their own, 4 readers
+    # iterate and serialize the whole time. nothing may be lost or duplicated, each writer's jobs keep the order
+    # they were added in (bumps only move the bumped job), and the last published order is the queue's
+    queue = Queue()
+    done = threading.Event()
+    writers = range(8)
+    churners = range(8, 12)
+
+    def writer(index):
+        def write():
+            for n in range(JOBS_PER_WRITER):
+                queue.addToBack(FakeJob(index * 10000 + n), PRINTER_ID)
+        return write
+
+    def churner(index):
+        def churn():
+            rng = random.Random(index)
+            for n in range(JOBS_PER_WRITER):
+                job = FakeJob(index * 10000 + n)
+                if n % 3 == 0:
+                    queue.addToFront(job, PRINTER_ID)
+                elif n % 3 == 1:
+                    queue.addJobs([(job, rng.random() < 0.5)], PRINTER_ID)
+                else:
+                    queue.addToBack(job, PRINTER_ID)
+                for _ in range(3):
+                    choice = rng.randrange(4)
+                    if choice < 2:
+                        queue.bump(choice == 0, job.id, PRINTER_ID)
+                    else:
+                        queue.bumpExtreme(choice == 2, job.id, PRINTER_ID)
+                assert queue.deleteJob(job.id, PRINTER_ID) is job
+        return churn
+
+    def reader():
+        while not done.is_set():
+            ids = [job.id for job in queue]
+            assert len(ids) == len(set(ids))
+            ids = [info['id'] for info in queue.convertQueueToJson()]
+            assert len(ids) == len(set(ids))
+
+    readers = [threading.Thread(target=reader) for _ in range(THREADS - len(writers) - len(churners))]
+    for thread in readers:
+        thread.start()
+    try:
+        run([writer(index) for index in writers] + [churner(index) for index in churners])
+    finally:
+        done.set()
+        for thread in readers:
+            thread.join()
+
+    ids = [job.id for job in queue]
+    assert len(ids) == len(set(ids))
+    assert sorted(ids) == sorted(index * 10000 + n for index in writers for n in range(JOBS_PER_WRITER))
+    for index in writers:
+        own = [job_id for job_id in ids if job_id // 10000 == index]
+        assert own == sorted(own)
+    assert stateService._orders[PRINTER_ID] == ids
+
+
+def test_concurrent_deltas_replay_to_the_final_queue():
+    # queue deltas are published under the queue's lock: applied in version order they rebuild the final queue
+    queue = Queue()
+    printer_id = PRINTER_ID + 1
+    start = stateService.getVersion()
+
+    def worker(index):
+        def work():
+            rng = random.Random(index)
+            mine = []
+            for n in range(15):
+                job = FakeJob(index * 10000 + n)
+                queue.addToBack(job, printer_id)
+                mine.append(job)
+                if rng.random() < 0.4:
+                    queue.deleteJob(mine.pop(rng.randrange(len(mine))).id, printer_id)
+                if mine:
+                    queue.bump(rng.random() < 0.5, rng.choice(mine).id, printer_id)
+        return work
+
+    run([worker(index) for index in range(THREADS)])
+
+    deltas = [delta for delta in stateService.deltasSince(start) or [] if delta.get('printerid') == printer_id and delta['op'] == 'queue']
+    assert deltas, "history should still reach back to the start of the test"
+    versions = [delta['version'] for delta in deltas]
+    assert versions == sorted(versions)
+    replayed = []
+    for delta in deltas:
+        known = set(replayed) | {job['id'] for job in delta['added']}
+        assert set(delta['order']) <= known
+        assert len(delta['order']) == len(set(delta['order']))
+        replayed = delta['order']
+    assert replayed == [job.id for job in queue]
@@ -0,0 +1,42 @@
+import math
+
+import pytest
+
+from services import etaService
+
+
+def test_many_samples_converge_on_the_printers_own_ratio():
+    records = [(1, 'fine', 3600, 3600 * 1.2)] * 200 + [(2, 'fine', 3600, 3600 * 0.9)] * 200
+    factors = etaService.fit(records)
+    assert factors['printer'][1] == pytest.approx(1.2, rel=0.01)
+    assert factors['printer'][2] == pytest.approx(0.9, rel=0.01)
+    assert factors['profile'][(1, 'fine')] == pytest.approx(1.2, rel=0.01)
+
+
+def test_few_samples_are_shrunk_towards_the_parent():
+    # printer 1 has a long history at 1.2; printer 2 has one print at 1.5, profile 'draft' on printer 1 one at 0.8
+    records = [(1, 'fine', 1000, 1200)] * 100 + [(2, 'fine', 1000, 1500), (1, 'draft', 1000, 800)]
+    factors = etaService.fit(records)
+    global_factor = factors['global']
+    weight = etaService.PRIOR_WEIGHT
+    assert factors['printer'][2] == pytest.approx(math.exp((math.log(1.5) + weight * math.log(global_factor)) / (1 + weight)))
+    assert global_factor < factors['printer'][2] < 1.5  # one sample moves it only part of the way
+    printer_1 = factors['printer'][1]
+    assert factors['profile'][(1, 'draft')] == pytest.approx(math.exp((math.log(0.8) + weight * math.log(printer_1)) / (1 + weight)))
+    assert 0.8 < factors['profile'][(1, 'draft')] < printer_1
+
+
+def test_without_records_every_factor_is_one_and_bad_records_are_ignored():
+    assert etaService.fit([]) == {'global': 1.0, 'printer': {}, 'profile': {}}
+    # cancelled early, left paused overnight, missing times
+    factors = etaService.fit([(1, '', 3600, 60), (1, '', 3600, 3600 * 5), (1, '', 0, 100), (1, '', 100, None)])
+    assert factors == {'global': 1.0, 'printer': {}, 'profile': {}}
+
+
+def test_predict_falls_back_from_profile_to_printer_to_global(monkeypatch):
+    monkeypatch.setattr(etaService, '_factors', etaService.fit([(1, 'fine', 1000, 1200)] * 50))
+    factors = etaService._factors
+    assert etaService.predict(1, 'fine', 100) == pytest.approx(100 * factors['profile'][(1, 'fine')])
+    assert etaService.predict(1, 'draft', 100) == pytest.approx(100 * factors['printer'][1])
+    assert etaService.predict(7, 'fine', 100) == pytest.approx(100 * factors['global'])
+    assert etaService.predict(1, 'fine', None) is None  # no slicer estimate, nothing to correct
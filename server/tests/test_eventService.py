@@ -0,0 +1,95 @@
+import threading
+from datetime import datetime, timedelta
+
+from services import eventService
+
+DAY = datetime(2020, 3, 1, 8, 0)
+
+
+def rollup(printer_id):
+    from models.jobevents import DailyRollup
+    row = DailyRollup.query.filter_by(day=DAY.date(), printer_id=printer_id).one()
+    return {counter: getattr(row, counter) for counter in DailyRollup.COUNTERS}
+
+
+def recordJob(job_id, printer_id, outcome='completed'):
+    eventService.setFilament(job_id, 'PLA')
+    eventService.record(job_id, 'queued', printer_id, when=DAY)
+    eventService.record(job_id, 'started', printer_id, when=DAY + timedelta(minutes=10))
+    eventService.record(job_id, outcome, printer_id, when=DAY + timedelta(minutes=70))
+
+
+def test_flushed_events_are_rolled_up_by_day_and_printer(app):
+    from models.jobevents import JobEvent
+
+    with app.app_context():
+        with eventService._lock:  # the app's own flusher shouldn't take these halfway
+            recordJob(9101, 901)
+            recordJob(9102, 901, 'failed')
+        eventService.flush()
+        assert [event['event'] for event in JobEvent.getJobEvents(9101)] == ['queued', 'started', 'completed']
+        totals = rollup(901)
+    assert totals['queued'] == 2 and totals['started'] == 2
+    assert totals['completed'] == 1 and totals['failed'] == 1
+    assert totals['wait_seconds'] == 2 * 600
+    assert totals['print_seconds'] == 2 * 3600
+    assert 9101 not in eventService._milestones  # finished jobs are forgotten
+
+
+def test_events_survive_a_failed_write(app, monkeypatch):
+    from models.jobevents import DailyRollup
+
+    apply = DailyRollup.apply
+
+    def broken(deltas):
+        raise RuntimeError("database is locked")
+
+    with app.app_context():
+        monkeypatch.setattr(DailyRollup, 'apply', broken)
+        with eventService._lock:
+            recordJob(9201, 902)
+        eventService.flush()
+        with eventService._lock:
+            pending = [event for event in eventService._buffer if event[0] == 9201]
+        assert [event[2] for event in pending] == ['queued', 'started', 'completed']
+        assert DailyRollup.query.filter_by(day=DAY.date(), printer_id=902).first() is None
+
+        monkeypatch.setattr(DailyRollup, 'apply', apply)
+        eventService.flush()
+        totals = rollup(902)
+    assert totals['completed'] == 1
+    assert totals['wait_seconds'] == 600 and totals['print_seconds'] == 3600  # the milestones weren't lost either
+
+
+def test_rollups_from_concurrent_writers_add_up(app):
+    # what several processes flushing the same day do: each adds to the row in its own transaction
+    from models.db import db
+    from models.jobevents import DailyRollup
+
+    writers, rounds = 4, 20
+    start = threading.Barrier(writers)
+    errors = []
+
+    def write():
+        with app.app_context():
+            start.wait()
+            for _ in range(rounds):
+                try:
+                    DailyRollup.apply({(DAY.date(), 903, 0, ''): {'queued': 1, 'wait_seconds': 1.5}})
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+            db.session.remove()
+
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with app.app_context():
+        totals = rollup(903)
+    assert totals['queued'] == writers * rounds
+    assert totals['wait_seconds'] == writers * rounds * 1.5
+    assert totals['completed'] == 0
@@ -0,0 +1,94 @@
+GCODE = b";FLAVOR:Marlin\n;TIME:60\nG28\nG1 X10 Y10 E1\n"
+
+
+def makeJobs(app, specs):
+    # queued runtime jobs for (name, filament, status) tuples
+    from models.db import db
+    from models.jobs import Job, JobRuntime
+
+    with app.app_context():
+        rows = []
+        for name, filament, status in specs:
+            row = Job(GCODE, name, None, 'inqueue', 'part.gcode', 0, 0, None)
+            row.ingest_status = 'ready'
+            rows.append(row)
+        db.session.add_all(rows)
+        db.session.commit()
+        jobs = JobRuntime.load([row.id for row in rows])
+        db.session.remove()
+    for job, (name, filament, status) in zip(jobs, specs):
+        job.filament = filament
+        job.status = status
+    return jobs
+
+
+def test_only_unstarted_jobs_move_once_the_grace_period_is_over(app, monkeypatch):
+    from models.config import Config
+    from models.db import db
+    from models.jobs import Job
+    from models.PrinterStatusService import PrinterStatusService, PrinterThread
+    from models.printers import PrinterRuntime
+
+    monkeypatch.setitem(Config, 'failover_error_grace', 300)
+    monkeypatch.setitem(Config, 'farm_queue', False)
+    service = PrinterStatusService(app)
+    faulted = PrinterRuntime('sim://a', 'a', 'SIM:A', 'a', status='error', id=701)
+    pla = PrinterRuntime('sim://b', 'b', 'SIM:B', 'b', status='ready', id=702)
+    petg = PrinterRuntime('sim://c', 'c', 'SIM:C', 'c', status='ready', id=703)
+    pla.filament, petg.filament = 'PLA', 'PETG'
+    for printer in (faulted, pla, petg):
+        service.registry.add(PrinterThread(printer))
+
+    printing, waiting, nowhere = makeJobs(app, [('printing', 'PLA', 'printing'), ('waiting', 'PLA', 'inqueue'), ('abs', 'ABS', 'inqueue')])
+    released = makeJobs(app, [('released', 'PLA', 'inqueue')])[0]
+    released.released = 1  # sent to the printer already, even if it hasn't started
+    faulted.getQueue().addJobs([(job, False) for job in (printing, waiting, nowhere, released)], faulted.id, emit=False)
+    try:
+        with app.app_context():
+            service.checkFailover(now=1000)
+            service.checkFailover(now=1000 + 299)
+            assert [job.id for job in faulted.getQueue()] == [printing.id, waiting.id, nowhere.id, released.id]
+            assert pla.getQueue().getSize() == 0
+
+            service.checkFailover(now=1300)
+            # the PLA job goes to the printer with PLA loaded; nothing can take the ABS one, so it stays
+            assert [job.id for job in pla.getQueue()] == [waiting.id]
+            assert petg.getQueue().getSize() == 0
+            assert sorted(job.id for job in faulted.getQueue()) == sorted([printing.id, nowhere.id, released.id])
+            assert db.session.get(Job, waiting.id).printer_id == pla.id
+
+            # a printer that recovers starts its grace period over the next time it faults
+            faulted.status = 'ready'
+            service.checkFailover(now=1400)
+            assert faulted.id not in service.fault_times
+    finally:
+        with app.app_context():
+            Job.query.filter(Job.id.in_([printing.id, waiting.id, nowhere.id, released.id])).delete()
+            db.session.commit()
+
+
+def test_with_the_farm_queue_on_jobs_go_back_to_it_unbound(app, monkeypatch):
+    from models.config import Config
+    from models.db import db
+    from models.jobs import Job
+    from models.PrinterStatusService import PrinterStatusService, PrinterThread
+    from models.printers import PrinterRuntime
+
+    monkeypatch.setitem(Config, 'failover_offline_grace', 60)
+    monkeypatch.setitem(Config, 'farm_queue', True)
+    service = PrinterStatusService(app)
+    offline = PrinterRuntime('sim://d', 'd', 'SIM:D', 'd', status='offline', id=704)
+    service.registry.add(PrinterThread(offline))
+    waiting = makeJobs(app, [('waiting', 'PLA', 'inqueue')])[0]
+    offline.getQueue().addJobs([(waiting, False)], offline.id, emit=False)
+    try:
+        with app.app_context():
+            service.checkFailover(now=1000)
+            service.checkFailover(now=1060)
+            assert offline.getQueue().getSize() == 0
+            assert [entry.job.id for entry in service.farm_queue] == [waiting.id]
+            assert db.session.get(Job, waiting.id).printer_id is None
+    finally:
+        with app.app_context():
+            Job.query.filter(Job.id == waiting.id).delete()
+            db.session.commit()
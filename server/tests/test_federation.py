@@ -0,0 +1,157 @@
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import pytest
+import requests
+import sqlalchemy
+from werkzeug.serving import make_server
+
+from conftest import SERVER_DIR
+
+TOKEN = 'farm-secret'
+GCODE = b";FLAVOR:Marlin\n;TIME:60\nG28\nG1 X10 Y10 E1\n"
+
+
+def freePort():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def waitFor(condition, timeout, what):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.1)
+    raise AssertionError(f"timed out waiting for {what}")
+
+
+def startNode(coordinator_url):
+    # a node server in its own process, with one simulated printer registered; returns (process, url, root)
+    from models.db import db
+    from models.printers import Printer
+
+    root = tempfile.mkdtemp(prefix='qview3d-node-')
+    os.makedirs(os.path.join(root, 'run'))
+    port = freePort()
+    url = f"http://127.0.0.1:{port}"
+    config = {
+        "environment": "development", "databaseURI": os.path.join(root, 'node'),
+        "federationRole": "node", "federationToken": TOKEN, "federationInterval": 0.2,
+        "coordinatorUrl": coordinator_url, "nodeName": "rack1", "nodeUrl": url,
+    }
+    with open(os.path.join(root, 'config.json'), 'w') as f:
+        json.dump(config, f)
+    engine = sqlalchemy.create_engine(f"sqlite:///{config['databaseURI']}.db")
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(Printer.__table__.insert(), {
+            "id": 1, "device": "sim://rack1?delay=0", "description": "rack1", "hwid": "SIM:RACK1", "name": "rack1 printer",
+            "date": datetime.now(),
+        })
+    engine.dispose()
+    process = subprocess.Popen(
+        [sys.executable, '-c', f"import sys; sys.path.insert(0, {SERVER_DIR!r})\nfrom app import app\napp.run(port={port}, threaded=True)"],
+        cwd=os.path.join(root, 'run'), env={**os.environ, 'QVIEW3D_CONFIG': os.path.join(root, 'config.json'), 'QVIEW3D_ROLE': 'api'},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,  # its upload pool goes with it
+    )
+    return process, url, root
+
+
+@pytest.fixture
+def coordinator(app, monkeypatch):
+    # the test app as the coordinator, served on a port the node reports to
+    from models.config import Config
+    from services import federationService
+
+    monkeypatch.setitem(Config, 'federation_role', 'coordinator')
+    monkeypatch.setitem(Config, 'federation_token', TOKEN)
+    monkeypatch.setitem(Config, 'federation_interval', 0.2)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    node = None
+    try:
+        node = startNode(f"http://127.0.0.1:{server.server_port}")
+        yield node
+    finally:
+        if node:
+            os.killpg(node[0].pid, signal.SIGTERM)
+            node[0].wait()
+        server.shutdown()
+        federationService._nodes.clear()
+
+
+def test_jobs_dispatched_by_the_coordinator_reach_the_node(app, coordinator, monkeypatch):
+    from services import federationService
+
+    process, node_url, node_root = coordinator
+    node = waitFor(lambda: federationService.getNode('rack1'), 60, "the node's first report")
+    assert node['url'] == node_url and node['online']
+    assert [printer['id'] for printer in node['printers']] == [1]
+    target = federationService.pickTarget()
+    assert target[0]['name'] == 'rack1' and target[1] == 1
+
+    posted = []  # the node routes the coordinator posted to
+    post = requests.post
+
+    def recorded(url, **kwargs):
+        posted.append(url.split('/federation/')[1].split('/')[0])
+        return post(url, **kwargs)
+
+    monkeypatch.setattr(federationService.requests, 'post', recorded)
+    client = app.test_client()
+    for name in ('first', 'second'):
+        response = client.post('/federation/dispatch', headers={federationService.TOKEN_HEADER: TOKEN}, data={
+            'file': (io.BytesIO(GCODE), 'part.gcode'), 'name': name, 'filament': '', 'priority': 'false',
+        })
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()['node'] == 'rack1' and response.get_json()['printer_id'] == 1
+    assert posted == ['blob', 'accept', 'accept']  # the second dispatch found the file on the node already
+    assert os.listdir(os.path.join(node_root, 'federation_blobs')) == [federationService.digest(GCODE)]
+
+    # both jobs show up in the printer's queue in the node's next reports
+    def queued():
+        queue = federationService.getNode('rack1')['printers'][0]['queue']
+        return [job['name'] for job in queue] if len(queue) == 2 else None
+
+    assert waitFor(queued, 10, "the queued jobs") == ['first', 'second']
+
+
+def test_federation_routes_need_the_token(app, coordinator):
+    from services import federationService
+
+    process, node_url, node_root = coordinator
+    client = app.test_client()
+    report = {"name": "intruder", "url": "http://attacker.invalid", "printers": []}
+    assert client.post('/federation/report', json=report).status_code == 403
+    assert client.post('/federation/report', json=report, headers={federationService.TOKEN_HEADER: 'guess'}).status_code == 403
+    assert federationService.getNode('intruder') is None
+
+    waitFor(lambda: federationService.getNode('rack1'), 60, "the node's first report")
+    content_hash = federationService.digest(GCODE)
+    accept = {"name": "x", "file_name_original": "x.gcode", "digest": content_hash, "printer_id": 1}
+    assert requests.post(f"{node_url}/federation/accept", json=accept, timeout=10).status_code == 403
+    requests.post(f"{node_url}/federation/blob/{content_hash}", data=GCODE, headers=federationService.authHeaders(), timeout=10).raise_for_status()
+    response = requests.post(f"{node_url}/federation/accept", json={**accept, "printer_id": 99}, headers=federationService.authHeaders(), timeout=10)
+    assert response.status_code == 400
+    assert "not registered" in response.json()['error']
+
+
+def test_a_federation_role_without_a_token_does_not_start(tmp_path):
+    config = tmp_path / 'config.json'
+    config.write_text(json.dumps({"environment": "development", "federationRole": "node"}))
+    run = subprocess.run([sys.executable, '-c', 'import models.config'], cwd=SERVER_DIR, capture_output=True, text=True,
+                         env={**os.environ, 'QVIEW3D_CONFIG': str(config)})
+    assert run.returncode != 0
+    assert "federationToken is required" in run.stderr
@@ -0,0 +1,53 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from services import ipcService
+
+
+def serve(dispatch):
+    path = os.path.join(tempfile.mkdtemp(), 'daemon.sock')
+    server = ipcService.RpcServer(path, dispatch)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, path
+
+
+def test_calls_and_events_reach_the_client():
+    server, path = serve(lambda method, args, kwargs: [method, *args])
+    client = ipcService.RpcClient(path)
+    assert client.call('echo', 1, 2) == ['echo', 1, 2]
+
+    received = []
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    ipcService.send(sock, {"method": ipcService.EVENTS})
+    while not server.subscribers:
+        time.sleep(0.01)
+    server.publish({"event": "a"})
+    server.publish({"event": "b"})
+    while len(received) < 2:
+        received += ipcService.recv(sock)
+    assert received == [{"event": "a"}, {"event": "b"}]
+    sock.close()
+    server.shutdown()
+
+
+def test_stream_ends_when_its_client_disconnects(monkeypatch):
+    # an idle stream notices the closed socket on its next check instead of waiting for an event forever
+    monkeypatch.setattr(ipcService, 'STREAM_CHECK', 0.05)
+    server, path = serve(lambda method, args, kwargs: None)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    ipcService.send(sock, {"method": ipcService.EVENTS})
+    while not server.subscribers:
+        time.sleep(0.01)
+    subscriber = next(iter(server.subscribers))
+    sock.close()
+    deadline = time.time() + 2
+    while server.subscribers and time.time() < deadline:
+        time.sleep(0.01)
+    assert not server.subscribers
+    assert subscriber.closed
+    server.shutdown()
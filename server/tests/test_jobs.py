@@ -0,0 +1,44 @@
+import io
+import json
+
+GCODE = b";FLAVOR:Marlin\n;TIME:60\nG28\nG1 X10 Y10 E1\n"
+
+
+def batch(client, targets):
+    return client.post('/batchqueue', data={
+        'file': (io.BytesIO(GCODE), 'part.gcode'), 'name': 'batch', 'favorite': 'false', 'td_id': 0, 'filament': '',
+        'targets': json.dumps(targets),
+    })
+
+
+def test_batch_queue_rejects_printers_that_are_not_running(app):
+    from app import printer_status_service
+    from models.db import db
+    from models.jobs import Job
+
+    printer_status_service.create_printer_threads([
+        {"id": 801, "device": "sim://batch?delay=0", "description": "batch", "hwid": "SIM:BATCH", "name": "batch"},
+    ])
+    client = app.test_client()
+    try:
+        with app.app_context():
+            before = Job.query.count()
+        for targets, message in (
+            ([{"printerid": 801, "count": 2}, {"printerid": 999, "count": 1}], "Printer 999 not found."),
+            ([{"printerid": "nope"}], "Invalid printer: nope"),
+        ):
+            response = batch(client, targets)
+            assert response.status_code == 400
+            assert response.get_json()['message'] == message
+        with app.app_context():
+            assert Job.query.count() == before  # nothing stored for a batch that's refused
+
+        response = batch(client, [{"printerid": "801", "count": 2}])  # form JSON may carry the id as a string
+        assert response.status_code == 200
+        ids = response.get_json()['ids']
+        assert [job.id for job in printer_status_service.registry.getPrinter(801).getQueue()] == ids
+    finally:
+        printer_status_service.deleteThread(801)
+        with app.app_context():
+            Job.query.filter(Job.printer_id == 801).delete()
+            db.session.commit()
@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+from conftest import SERVER_DIR
+from services import outboundService
+
+# a frame packed by pack() and the events it carries; the client's decoder test reads the same file
+FIXTURE = os.path.join(SERVER_DIR, '..', 'client', 'src', 'model', '__tests__', 'telemetry-frame.json')
+
+
+class RecordingSocketIO:
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, data, to=None):
+        self.sent.append((to, event, data))
+
+    def to(self, sid):
+        return [(event, data) for to, event, data in self.sent if to == sid]
+
+
+@pytest.fixture
+def outbound(monkeypatch):
+    # fresh client buffers, and the app's own flush loop (if it's running) leaves them to the test
+    monkeypatch.setattr(outboundService, '_pending', {})
+    monkeypatch.setattr(outboundService, '_binary', set())
+    flush = outboundService.flush
+    monkeypatch.setattr(outboundService, 'flush', lambda socketio: None)
+    return flush
+
+
+def progress(job_id, value):
+    return ('progress_update', {'job_id': job_id, 'progress': value}), ('progress_update', '1', job_id, None)
+
+
+def test_coalescing_keeps_the_latest_value_per_key(outbound):
+    socketio = RecordingSocketIO()
+    before = outboundService.getStats()['coalesced']
+    temp = {'printerid': 1, 'extruder_temp': 210.0, 'bed_temp': 60.0}
+    for value in (10.0, 20.0, 30.0):
+        (event, data), key = progress(5, value)
+        outboundService.enqueue(['a', 'b'], event, data, key)
+    outboundService.enqueue(['a', 'b'], 'temp_update', temp, ('temp_update', '1', None, None))
+    (event, data), key = progress(5, 40.0)
+    outboundService.enqueue(['a'], event, data, key)  # a newer value moves behind the ones queued since
+    assert outboundService.getStats()['coalesced'] - before == 5
+
+    outbound(socketio)
+    assert socketio.to('a') == [('temp_update', temp), ('progress_update', {'job_id': 5, 'progress': 40.0})]
+    assert socketio.to('b') == [('progress_update', {'job_id': 5, 'progress': 30.0}), ('temp_update', temp)]
+    outbound(socketio)
+    assert len(socketio.sent) == 4  # nothing left over to send twice
+
+
+def test_a_full_or_backed_up_client_keeps_only_the_newest(outbound, monkeypatch):
+    socketio = RecordingSocketIO()
+    monkeypatch.setattr(outboundService, 'MAX_PENDING', 2)
+    for job_id in (1, 2, 3):
+        (event, data), key = progress(job_id, 50.0)
+        outboundService.enqueue(['a'], event, data, key)
+
+    monkeypatch.setattr(outboundService, 'backlog', lambda socketio, sid: outboundService.HIGH_WATER)
+    outbound(socketio)
+    assert socketio.sent == []  # left to coalesce until the client's transport catches up
+    monkeypatch.setattr(outboundService, 'backlog', lambda socketio, sid: 0)
+    outbound(socketio)
+    assert [data['job_id'] for event, data in socketio.to('a')] == [2, 3]
+
+
+def test_packed_frames_match_what_the_client_decodes(outbound):
+    with open(FIXTURE) as f:
+        fixture = json.load(f)
+    frames = [tuple(frame) for frame in fixture['frames']]
+    frame, rest = outboundService.pack(frames)
+    assert rest == []
+    assert len(frame) == 1 + 7 * outboundService.RECORD.size == 1 + 7 * 13
+    assert frame.hex() == fixture['hex']
+
+    # through a flush: one binary frame for a client that asked for them, JSON for anything that doesn't pack
+    socketio = RecordingSocketIO()
+    outboundService.setBinary('a', True)
+    for index, (event, data) in enumerate(frames + [('set_time', {'job_id': 1234, 'new_time': [1, 2]})]):
+        outboundService.enqueue(['a', 'b'], event, data, (event, index))
+    outbound(socketio)
+    assert socketio.to('a') == [('telemetry', bytes.fromhex(fixture['hex'])), ('set_time', {'job_id': 1234, 'new_time': [1, 2]})]
+    assert [event for event, data in socketio.to('b')] == [event for event, data in frames] + ['set_time']
+
+    outboundService.forget('a')
+    assert 'a' not in outboundService._binary
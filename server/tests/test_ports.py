@@ -0,0 +1,29 @@
+def test_registered_printers_take_their_status_from_the_running_threads(app):
+    from app import printer_status_service
+    from models.db import db
+    from models.printers import Printer
+
+    with app.app_context():
+        row = Printer('sim://registered?delay=0', 'registered', 'SIM:REGISTERED', 'registered')
+        db.session.add(row)
+        db.session.commit()
+        printer_id = row.id
+    client = app.test_client()
+    try:
+        response = client.get('/getprinters')
+        assert response.status_code == 200
+        printers = [p for p in response.get_json()['printers'] if p['id'] == printer_id]
+        # no thread yet: the row alone says nothing about the printer's state
+        assert [p['status'] for p in printers] == ['offline']
+
+        printer_status_service.create_printer_threads(printers)
+        assert printer_status_service.registry.getPrinter(printer_id).hwid == 'SIM:REGISTERED'
+        response = client.get('/getprinters')
+        assert response.status_code == 200
+        statuses = {p['id']: p['status'] for p in response.get_json()['printers']}
+        assert statuses[printer_id] == 'configuring'
+    finally:
+        printer_status_service.deleteThread(printer_id)
+        with app.app_context():
+            db.session.delete(db.session.get(Printer, printer_id))
+            db.session.commit()
@@ -0,0 +1,165 @@
+import os
+import zlib
+
+from Classes import BGCode, MotionAnalyzer
+
+GCODE = "\n".join(
+    ["G28", "G90"]
+    + [line for z in range(1, 6) for line in (";LAYER_CHANGE", f";Z:{z * 0.2:.1f}", f"G1 Z{z * 0.2:.1f}", "G1 X10 Y10 E1", "G1 X0 Y0 E2")]
+    + ["M104 S0", ""]
+)
+COMMANDS = sum(1 for line in GCODE.splitlines() if line and not line.startswith(";"))
+
+
+def block(block_type, data, params=b"\x00\x00", compression=BGCode.NO_COMPRESSION):
+    stored = zlib.compress(data) if compression == BGCode.DEFLATE else data
+    header = BGCode.BLOCK_HEADER.pack(block_type, compression, len(data))
+    if compression != BGCode.NO_COMPRESSION:
+        header += BGCode.SIZE.pack(len(stored))
+    return header + params + stored
+
+
+def bgcode():
+    # a binary G-code file with no checksums: print metadata, then the G-code in one deflated block
+    return (
+        BGCode.FILE_HEADER.pack(BGCode.MAGIC, 1, 0)
+        + block(BGCode.PRINT_METADATA, b"estimated printing time (normal mode)=1m 30s\nmax_layer_z=1.0\n")
+        + block(BGCode.GCODE, GCODE.encode(), compression=BGCode.DEFLATE)
+    )
+
+
+def test_scan_gcode_counts_commands_and_finds_the_top_layer(app):
+    from models.printers import PrinterRuntime
+
+    lines = ["; estimated printing time (normal mode) = 1m 30s\n"] + GCODE.splitlines(True)
+    printer = PrinterRuntime('sim://scan', 'scan', 'scan', 'scan')
+    total_lines, max_layer_height, time_comments = printer.scanGcode(lines)
+    assert total_lines == COMMANDS
+    assert max_layer_height == 1.0
+    assert time_comments == [lines[0], ";LAYER_CHANGE\n"]  # the first two comments
+
+
+def test_binary_gcode_is_decoded_once_per_print(app, monkeypatch):
+    # with the estimate and top layer in the metadata and the upload's time profile in the row, the print
+    # decodes the G-code blocks only for the send loop
+    from models.db import db  # imported once the app fixture has loaded app.py, which they import back
+    from models.jobs import Job, JobRuntime
+    from models.printers import PrinterRuntime
+
+    passes = []
+    decode = BGCode.gcodeLines
+
+    def counted(path):
+        passes.append(path)
+        return decode(path)
+
+    monkeypatch.setattr(BGCode, 'gcodeLines', counted)
+    os.makedirs('../uploads', exist_ok=True)
+    with app.app_context():
+        row = Job(bgcode(), 'bgcode', None, 'inqueue', 'part.bgcode', 0, 0, None)
+        row.ingest_status = 'ready'
+        row.time_profile = MotionAnalyzer.toBytes(MotionAnalyzer.analyze(GCODE.splitlines(True)))
+        db.session.add(row)
+        db.session.commit()
+        job = JobRuntime.load([row.id])[0]
+        db.session.remove()
+
+        job.setFileName(f"part_{job.id}.bgcode")
+        job.setStatus('printing')
+        printer = PrinterRuntime('sim://bgcode?delay=0', 'bgcode', 'bgcode', 'bgcode', status='printing')
+        assert printer.execute(job) == "complete"
+        printer.disconnect()
+
+    assert len(passes) == 1
+    assert job.sent_lines == COMMANDS
+    assert job.max_layer_height == 1.0
+    assert job.estimated_time == 90
+
+
+def test_card_print_with_meatpack_tracks_the_file_as_stored(app, monkeypatch):
+    # sdPrint with MeatPack on: the simulator stores the lines without their spaces, and the M27 byte positions
+    # it reports while printing land on the offsets of those lines
+    from Classes import MeatPack, SimulatedSerial
+    from Classes.transports import CardControl
+    from models.config import Config
+    from models.db import db
+    from models.jobs import Job, JobRuntime
+    from models.printers import PrinterRuntime
+
+    monkeypatch.setitem(Config, 'sd_print', True)
+    monkeypatch.setitem(Config, 'meatpack', True)
+    monkeypatch.setattr(CardControl, 'poll_interval', 0.01)
+    received, positions, progress, cards = [], [], [], []
+    command = SimulatedSerial.SimulatedSerial.command
+    monkeypatch.setattr(SimulatedSerial.SimulatedSerial, 'command', lambda self, line: (received.append(line), command(self, line)))
+    position = CardControl.position
+    monkeypatch.setattr(CardControl, 'position', lambda self: positions.append(position(self)) or positions[-1])
+    os.makedirs('../uploads', exist_ok=True)
+    with app.app_context():
+        row = Job((";FLAVOR:Marlin\n;TIME:3\n" + GCODE).encode(), 'card', None, 'inqueue', 'part.gcode', 0, 0, None)
+        row.ingest_status = 'ready'
+        db.session.add(row)
+        db.session.commit()
+        job = JobRuntime.load([row.id])[0]
+        db.session.remove()
+
+        job.setFileName(f"part_{job.id}.gcode")
+        job.setStatus('printing')
+        setProgress = JobRuntime.setProgress
+        monkeypatch.setattr(JobRuntime, 'setProgress', lambda self, value: (progress.append(value), setProgress(self, value)))
+        printer = PrinterRuntime('sim://card?delay=0.005', 'card', 'card', 'card', status='printing')
+        connect = PrinterRuntime.connect
+        monkeypatch.setattr(PrinterRuntime, 'connect', lambda self: (connect(self), cards.append(self.ser)))
+        assert printer.execute(job) == "complete"
+        assert printer.meatpack
+        _, layout, _ = printer.storageLayout(GCODE.splitlines(True), stripped=True)
+        printer.disconnect()
+
+    name = f"QV{job.id % 1000000:06d}.GCO"
+    commands = [MeatPack.compact(line) for line in GCODE.splitlines() if line and not line.startswith(";")]
+    codes = [line.split(' ')[0] for line in received if line.split(' ')[0] in ('M28', 'M29', 'M23', 'M24', 'M27', 'M30')]
+    assert codes[:4] == ['M28', 'M29', 'M23', 'M24'] and codes[-1] == 'M30'
+    assert set(codes[4:-1]) == {'M27'}
+    stored = received[received.index(f"M28 {name}") + 1:received.index(f"M29 {name}")]
+    assert stored == commands and all(' ' not in line for line in stored)
+    assert name not in cards[0].files  # deleted once printed
+
+    offsets = [sum(len(line) + 1 for line in commands[:n]) for n in range(len(commands) + 1)]
+    printed = [value[0] for value in positions if value is not None]
+    assert layout == offsets[1:]  # what printFromStorage maps the positions back to lines with
+    assert printed and set(printed) <= set(offsets)  # every reported position is the end of a stored line
+    assert printed == sorted(printed) and positions[-1] is None
+    assert progress == sorted(progress) and progress[-1] == 100
+    assert job.sent_lines == COMMANDS
+
+
+def test_the_time_profile_uses_the_limits_of_the_printer_printing_it(app):
+    # the upload computed it for the printer model the slicer recorded; a printer of another family redoes it
+    import numpy as np
+    from models.db import db
+    from models.jobs import Job, JobRuntime
+    from models.printers import PrinterRuntime
+
+    lines = [";FLAVOR:Marlin\n", ";TIME:90\n"] + GCODE.splitlines(True)
+    stored = MotionAnalyzer.analyze(lines, 'MK4S')
+    with app.app_context():
+        row = Job(GCODE.encode(), 'limits', None, 'inqueue', 'part.gcode', 0, 0, None)
+        row.ingest_status = 'ready'
+        row.time_profile = MotionAnalyzer.toBytes(stored)
+        row.time_profile_model = 'MK4S'
+        db.session.add(row)
+        db.session.commit()
+        job = JobRuntime.load([row.id])[0]
+        db.session.remove()
+        try:
+            mk4 = PrinterRuntime('sim://mk4', 'mk4', 'USB VID:PID=2C99:000D', 'mk4')
+            cumulative, total_lines = mk4.prepareJob(lines, job)
+            assert np.array_equal(cumulative, stored) and total_lines == COMMANDS
+
+            ender = PrinterRuntime('sim://ender', 'ender', 'USB VID:PID=1A86:7523', 'ender')
+            cumulative, total_lines = ender.prepareJob(lines, job)
+            assert np.array_equal(cumulative, MotionAnalyzer.analyze(lines, 'Ender'))
+            assert cumulative[-1] > stored[-1] and total_lines == COMMANDS
+        finally:
+            Job.query.filter(Job.id == row.id).delete()
+            db.session.commit()
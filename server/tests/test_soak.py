@@ -0,0 +1,75 @@
+import gzip
+import os
+import threading
+import tracemalloc
+
+JOBS = 1000
+WARMUP = 200  # jobs run before the baseline, so caches and lazily imported modules are already in it
+MAX_GROWTH = 1024 * 1024  # bytes the last 800 jobs may add, about 1 KB a job
+
+GCODE = "\n".join(
+    ["; estimated printing time (normal mode) = 1m 30s", "G28", "G90"]
+    + [line for z in range(1, 6) for line in (";LAYER_CHANGE", f";Z:{z * 0.2:.1f}", f"G1 Z{z * 0.2:.1f}", "G1 X10 Y10 E1", "G1 X0 Y0 E2")]
+    + ["M104 S0"]
+).encode()
+
+
+class Response:
+    status_code = 200
+
+
+def test_memory_stays_flat_over_1000_jobs(app, monkeypatch):
+    # runs 1,000 small jobs through the same calls the printer thread makes for each print (load the runtime,
+    # connect, save the file, send it, record the verdict, drop the session) against a simulated printer, and
+    # checks that the jobs after the warm-up leave no memory behind: nothing may pile up per job
+    from models.db import db  # imported once the app fixture has loaded app.py, which they import back
+    from models.jobs import Job, JobRuntime
+    from models.printers import PrinterRuntime
+
+    monkeypatch.setattr('models.printers.requests.post', lambda *args, **kwargs: Response())
+    os.makedirs('../uploads', exist_ok=True)
+    with app.app_context():
+        rows = [Job(gzip.compress(GCODE), f"soak {n}", None, 'inqueue', 'soak.gcode', 0, 0, None) for n in range(JOBS)]
+        for row in rows:
+            row.ingest_status = 'ready'
+        db.session.add_all(rows)
+        db.session.commit()
+        job_ids = [row.id for row in rows]
+        db.session.remove()
+
+    printer = PrinterRuntime('sim://soak?delay=0', 'soak', 'soak', 'soak', status='ready', id=None)
+    errors = []
+    sizes = []
+
+    def run():
+        # the printer thread's loop, without its sleeps
+        try:
+            with app.app_context():
+                for n, job_id in enumerate(job_ids):
+                    if n == WARMUP:
+                        sizes.append(tracemalloc.get_traced_memory()[0])
+                    job = JobRuntime.load([job_id])[0]
+                    job.setFileName(f"soak_{job_id}.gcode")
+                    printer.getQueue().addToBack(job, printer.id)
+                    job.setStatus('printing')
+                    printer.handleVerdict(printer.execute(job), job)
+                    printer.getQueue().deleteJob(job.id, printer.id)
+                    assert len(db.session.identity_map) == 0, "the print left rows in the thread's session"
+                    db.session.remove()
+                    printer.setStatus('ready')
+                sizes.append(tracemalloc.get_traced_memory()[0])
+        except Exception as e:
+            errors.append(e)
+
+    tracemalloc.start()
+    try:
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    finally:
+        tracemalloc.stop()
+
+    assert errors == []
+    assert os.listdir('../uploads') == []
+    baseline, final = sizes
+    assert final - baseline < MAX_GROWTH, f"{(final - baseline) / (JOBS - WARMUP):.0f} bytes kept per job"
@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+from conftest import SERVER_DIR
+from services import telemetryService
+
+# the process running the printers: fills in the table, then applies one command per line from stdin
+WRITER = """
+import sys
+from datetime import datetime
+sys.path.insert(0, {server!r})
+from models.config import Config
+from services import telemetryService
+Config['telemetry_name'] = {name!r}
+telemetryService.create()
+telemetryService.register(1, 'configuring')
+telemetryService.register(2, 'ready')
+telemetryService.printerUpdated(1, status='printing', extruder_temp=215.5, bed_temp=60)
+telemetryService.jobUpdated(1, 41, progress=12.5, sent_lines=300, eta=datetime(2030, 1, 1, 12, 0))
+print('ready', flush=True)
+for line in sys.stdin:
+    exec(line)
+    print('done', flush=True)
+"""
+
+READER = """
+import json, sys
+sys.path.insert(0, {server!r})
+from models.config import Config
+from services import telemetryService
+Config['telemetry_name'] = {name!r}
+print(json.dumps(telemetryService.read()))
+"""
+
+
+class Writer:
+    def __init__(self, name):
+        self.process = subprocess.Popen(
+            [sys.executable, '-c', WRITER.format(server=SERVER_DIR, name=name)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        assert self.process.stdout.readline().strip() == 'ready'
+
+    def run(self, line):
+        self.process.stdin.write(line + '\n')
+        self.process.stdin.flush()
+        assert self.process.stdout.readline().strip() == 'done'
+
+    def stop(self):
+        self.process.stdin.close()
+        self.process.wait(10)
+
+
+@pytest.fixture
+def name(monkeypatch):
+    # a segment of the test's own, and this process back to not having one mapped afterwards
+    segment = f"qview3d-test-{os.getpid()}"
+    monkeypatch.setitem(telemetryService.Config, 'telemetry_name', segment)
+    yield segment
+    telemetryService.close()
+    for attribute in ('_segment', '_header', '_table'):
+        monkeypatch.setattr(telemetryService, attribute, None)
+    try:
+        os.unlink(f"/dev/shm/{segment}")
+    except FileNotFoundError:
+        pass
+
+
+def rows():
+    return {row['id']: row for row in telemetryService.read()}
+
+
+def test_another_process_reads_what_the_writer_put_in_the_table(name):
+    writer = Writer(name)
+    try:
+        table = rows()
+        assert table[1] == {
+            "id": 1, "status": 'printing', "extruder_temp": 215.5, "bed_temp": 60.0, "job_id": 41, "progress": 12.5,
+            "sent_lines": 300, "current_layer_height": 0.0, "max_layer_height": 0.0,
+            "eta": datetime(2030, 1, 1, 12, 0).isoformat(),
+        }
+        assert table[2]['status'] == 'ready' and table[2]['job_id'] is None
+
+        # readers see later writes in the same mapping; a new job on the printer starts its fields over
+        writer.run("telemetryService.jobUpdated(1, 42, current_layer_height=0.2)")
+        writer.run("telemetryService.unregister(2)")
+        table = rows()
+        assert list(table) == [1]
+        assert (table[1]['job_id'], table[1]['progress'], table[1]['sent_lines'], table[1]['eta']) == (42, 0.0, 0, None)
+        assert table[1]['current_layer_height'] == pytest.approx(0.2)
+
+        # a reader exiting doesn't take the segment with it: only the writer removes it
+        reader = subprocess.run([sys.executable, '-c', READER.format(server=SERVER_DIR, name=name)],
+                                capture_output=True, text=True, timeout=30)
+        assert reader.returncode == 0, reader.stderr
+        assert '"id": 1' in reader.stdout
+        assert rows()[1]['job_id'] == 42
+    finally:
+        writer.stop()
+
+    # the writer removed the segment on exit, and the reader lets go of it
+    assert not os.path.exists(f"/dev/shm/{name}")
+    assert telemetryService.read() is None
+
+
+def test_a_table_left_by_a_killed_writer_is_not_read(name):
+    writer = Writer(name)
+    assert 1 in rows()
+    writer.process.kill()
+    writer.process.wait()
+    assert os.path.exists(f"/dev/shm/{name}")  # nothing got to clean it up
+    assert telemetryService.read() is None
+    assert telemetryService.read() is None  # and it isn't picked up again on the next read
+
+    # the next writer replaces it
+    writer = Writer(name)
+    try:
+        assert sorted(rows()) == [1, 2]
+    finally:
+        writer.stop()
@@ -0,0 +1,17 @@
+from services.uploadService import parseDuration
+
+
+def test_full_duration():
+    assert parseDuration("1d 2h 3m 4s") == 86400 + 7200 + 180 + 4
+
+
+def test_partial_durations_keep_their_units():
+    assert parseDuration("2h 3m") == 2 * 3600 + 3 * 60
+    assert parseDuration("1d 5m") == 86400 + 300
+    assert parseDuration("4h") == 4 * 3600
+    assert parseDuration("12m 30s") == 12 * 60 + 30
+    assert parseDuration("45s") == 45
+
+
+def test_bare_number_is_seconds():
+    assert parseDuration("6010") == 6010